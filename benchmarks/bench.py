@@ -0,0 +1,326 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+# --- Scripted benchmarks ---
+# Runs the real scan, incremental scan, delete, unsubscribe and header parsing code against a fake IMAP
+# server in a child process, so peak RSS measures only the client side. Examples:
+#
+#   python -m benchmarks.bench scan --count 10000 --latency 0.02
+#   python -m benchmarks.bench incremental --count 50000 --new 200
+#   python -m benchmarks.bench delete --count 5000 --new 1000 --latency 0.05
+#   python -m benchmarks.bench unsubscribe --count 2000
+#   python -m benchmarks.bench parse --count 20000 --newsletter-kb 2
+#   python -m benchmarks.bench all --count 1000000 --newsletter-kb 2 --repeat 1
+#
+# Each scenario prints messages/s, wall-time percentiles over the repeats, server-side
+# per-command latency percentiles and the client's peak RSS. --json emits the same as JSON.
+
+ACCOUNT = 'bench@example.com'
+PASSWORD = 'bench-password'
+SCENARIOS = ('scan', 'incremental', 'delete', 'unsubscribe', 'parse')
+
+
+def serve(pipe, options):
+    """Child process: build the mailbox, serve it, and answer control messages from the parent."""
+    from benchmarks.fake_imap_server import FakeIMAPServer
+    from benchmarks.mailbox_gen import generate_mailbox, make_message, SenderPool
+
+    server = FakeIMAPServer(
+        latency=options['latency'], max_connections=options['max_connections'], gmail=options['gmail']
+    )
+    mailbox = generate_mailbox(
+        options['count'], days=options['days'], seed=options['seed'], gmail=options['gmail'],
+        newsletter_kb=options['newsletter_kb']
+    )
+    server.add_account(ACCOUNT, PASSWORD, mailbox)
+    server.start()
+    rng = random.Random(options['seed'] + 1)
+    senders = SenderPool(rng)
+    pipe.send(server.address)
+
+    while True:
+        command, *args = pipe.recv()
+        if command == 'stats':
+            pipe.send((dict(server.stats), list(server.timings)))
+        elif command == 'reset':
+            server.reset_stats()
+            pipe.send(True)
+        elif command == 'add':
+            folder_name, count = args
+            folder = mailbox.folder(folder_name)
+            now = datetime.now(timezone.utc)
+            for _ in range(count):
+                folder.append(make_message(rng, senders, now, newsletter_kb=options['newsletter_kb']), now)
+            pipe.send(True)
+        elif command == 'stop':
+            server.stop()
+            pipe.send(True)
+            return
+
+
+class ServerProcess:
+    def __init__(self, **options):
+        self._pipe, child = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=serve, args=(child, options), daemon=True)
+        self._process.start()
+        self.address = self._pipe.recv()
+
+    def call(self, *command):
+        self._pipe.send(command)
+        return self._pipe.recv()
+
+    def stop(self):
+        try:
+            self.call('stop')
+        finally:
+            self._process.join(5)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def connect(address):
+    from utilClean import create_connection
+    return create_connection(ACCOUNT, PASSWORD, address)
+
+
+def summarize(name, runs, messages, server, collected=None):
+    """
+    runs: wall seconds per repeat; messages: messages handled per repeat.
+    `collected` is a list of (stats, timings) snapshots for scenarios that reset the
+    server counters between rounds; otherwise the counters since the last reset are used.
+    """
+    if collected is None:
+        collected = [server.call('stats')]
+    stats, timings = {}, []
+    for snapshot_stats, snapshot_timings in collected:
+        for key, value in snapshot_stats.items():
+            stats[key] = stats.get(key, 0) + value
+        timings.extend(snapshot_timings)
+    by_command = defaultdict(list)
+    for command, seconds in timings:
+        by_command[command].append(seconds)
+    total_time = sum(runs)
+    return {
+        'scenario': name,
+        'repeats': len(runs),
+        'messages': sum(messages),
+        'throughput': sum(messages) / total_time if total_time else 0.0,
+        'wall_p50': percentile(runs, 50),
+        'wall_p95': percentile(runs, 95),
+        'wall_max': max(runs) if runs else 0.0,
+        'commands': {
+            command: {
+                'count': len(values),
+                'p50_ms': percentile(values, 50) * 1000,
+                'p95_ms': percentile(values, 95) * 1000,
+                'p99_ms': percentile(values, 99) * 1000,
+            }
+            for command, values in sorted(by_command.items(), key=lambda kv: -sum(kv[1]))
+        },
+        'server': stats,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def result_count(results):
+    return sum(len(results.get(group, [])) for group in ('unread', 'spam', 'junk', 'trash')) if results else 0
+
+
+def bench_scan(server, args):
+    """Cold full scan: no header cache, every matching header is fetched."""
+    from utilClean import scan_all_fast
+    from utilPool import close_all_pools
+    runs, messages = [], []
+    server.call('reset')
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        results = scan_all_fast(ACCOUNT, PASSWORD, server.address, args.days_back, use_cache=False, include_trash=True)
+        runs.append(time.perf_counter() - started)
+        messages.append(result_count(results))
+        close_all_pools()
+    return summarize('scan', runs, messages, server)
+
+
+def bench_incremental(server, args):
+    """Warm the header cache once, then time rescans after `--new` messages arrive each round."""
+    from utilClean import scan_all_fast
+    from utilPool import close_all_pools
+    scan_all_fast(ACCOUNT, PASSWORD, server.address, args.days_back, use_cache=True, include_trash=True)
+    close_all_pools()
+    runs, messages = [], []
+    server.call('reset')
+    for _ in range(args.repeat):
+        server.call('add', 'INBOX', args.new)
+        started = time.perf_counter()
+        results = scan_all_fast(ACCOUNT, PASSWORD, server.address, args.days_back, use_cache=True, include_trash=True)
+        runs.append(time.perf_counter() - started)
+        messages.append(result_count(results))
+        close_all_pools()
+    return summarize('incremental', runs, messages, server)
+
+
+def bench_delete(server, args):
+    """Time delete_emails on `--new` freshly delivered spam messages per round."""
+    from utilClean import delete_emails, scan_all_fast
+    from utilPool import close_all_pools
+    runs, messages, collected = [], [], []
+    for _ in range(args.repeat):
+        server.call('add', 'Spam', args.new)
+        results = scan_all_fast(ACCOUNT, PASSWORD, server.address, None, use_cache=False, include_trash=False)
+        close_all_pools()
+        server.call('reset')
+        targets = results['spam'] + results['junk'] if results else []
+        started = time.perf_counter()
+        deleted = delete_emails('spam', targets, results['folders'] if results else [], permanent=True)
+        runs.append(time.perf_counter() - started)
+        messages.append(deleted)
+        close_all_pools()
+        collected.append(server.call('stats'))
+    return summarize('delete', runs, messages, server, collected)
+
+
+def bench_unsubscribe(server, args):
+    """
+    Time subscription discovery as the Subscriptions page runs it: a cold subscriptions scan
+    (list headers plus the BODY "unsubscribe" search), then body lookups for senders without a link.
+    """
+    from util import subscription_senders, fill_unsubscribe_links
+    from utilClean import scan_all_fast
+    from utilPool import IMAPSession, close_all_pools
+    mail = connect(server.address)
+    mail.select('inbox', readonly=True)
+    _, data = mail.uid('SEARCH', None, 'ALL')
+    inbox_size = len(data[0].split()) if data and data[0] else 0
+    mail.logout()
+
+    runs, messages = [], []
+    server.call('reset')
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        results = scan_all_fast(ACCOUNT, PASSWORD, server.address, None, use_cache=False, include_trash=False,
+                                groups={'subscriptions'})
+        subscriptions = subscription_senders(results['subscriptions'] + results['unsubscribe_mentions'])
+        session = IMAPSession(connect(server.address))
+        fill_unsubscribe_links(session, subscriptions)
+        runs.append(time.perf_counter() - started)
+        messages.append(inbox_size)
+        session.logout()
+        close_all_pools()
+    return summarize('unsubscribe', runs, messages, server)
+
+
+def bench_parse(server, args):
+    """Header parsing alone: fetch INBOX headers once, then time parse_header_items over them."""
+    from utilClean import HEADER_FETCH, parse_header_items, get_date_parse_stats, reset_date_parse_stats
+    from utilClean import decode_mime_words
+    mail = connect(server.address)
+    mail.select('INBOX', readonly=True)
+    _, data = mail.uid('SEARCH', None, 'ALL')
+    uids = data[0].split() if data and data[0] else []
+    responses = []
+    for i in range(0, len(uids), 500):
+        _, msg_data = mail.uid('FETCH', b','.join(uids[i:i + 500]).decode(), HEADER_FETCH)
+        responses.append(msg_data)
+    mail.logout()
+
+    runs, messages = [], []
+    server.call('reset')
+    reset_date_parse_stats()
+    decode_mime_words.cache_clear()
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        parsed = sum(len(parse_header_items(msg_data)) for msg_data in responses)
+        runs.append(time.perf_counter() - started)
+        messages.append(parsed)
+    report = summarize('parse', runs, messages, server)
+    report['dates'] = get_date_parse_stats()
+    info = decode_mime_words.cache_info()
+    report['decode_cache'] = {'hits': info.hits, 'misses': info.misses, 'size': info.currsize}
+    return report
+
+
+BENCHMARKS = {
+    'scan': bench_scan,
+    'incremental': bench_incremental,
+    'delete': bench_delete,
+    'unsubscribe': bench_unsubscribe,
+    'parse': bench_parse,
+}
+
+
+def print_report(report):
+    print(f"\n== {report['scenario']} ==")
+    print(f"  {report['messages']} messages in {report['repeats']} run(s): {report['throughput']:.0f} msg/s")
+    print(f"  wall p50 {report['wall_p50']:.3f}s  p95 {report['wall_p95']:.3f}s  max {report['wall_max']:.3f}s")
+    server = report['server']
+    print(f"  server: {server['logins']} logins, {server['commands']} commands, "
+          f"{server['bytes_out'] / 1e6:.1f} MB out, {server['throttled']} throttled")
+    for command, values in list(report['commands'].items())[:8]:
+        print(f"    {command:<14} x{values['count']:<6} p50 {values['p50_ms']:8.1f}ms  "
+              f"p95 {values['p95_ms']:8.1f}ms  p99 {values['p99_ms']:8.1f}ms")
+    if 'dates' in report:
+        print(f"  dates: {report['dates']}")
+        print(f"  header decode cache: {report['decode_cache']}")
+    print(f"  peak RSS (client) {report['peak_rss_mb']:.1f} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the IMAP scanners against a local fake server.')
+    parser.add_argument('scenario', choices=SCENARIOS + ('all',))
+    parser.add_argument('--count', type=int, default=5000, help='messages in the synthetic mailbox')
+    parser.add_argument('--days', type=int, default=365, help='spread of message dates')
+    parser.add_argument('--days-back', type=int, default=None, help='scan window passed to scan_all_fast')
+    parser.add_argument('--new', type=int, default=100, help='messages delivered per round (incremental, delete)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every command')
+    parser.add_argument('--max-connections', type=int, default=15, help='per-account connection limit')
+    parser.add_argument('--newsletter-kb', type=int, default=40, help='upper size of HTML newsletters')
+    parser.add_argument('--gmail', action='store_true', help='Gmail folder layout and X-GM-EXT-1')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', action='store_true', help='print the reports as JSON')
+    args = parser.parse_args(argv)
+
+    # Scans write storage/header_cache.sqlite relative to the working directory; keep it out of the repo
+    workdir = tempfile.mkdtemp(prefix='emailcleaner-bench-')
+    os.chdir(workdir)
+
+    print(f"Generating {args.count} messages...", file=sys.stderr)
+    server = ServerProcess(
+        count=args.count, days=args.days, seed=args.seed, latency=args.latency,
+        max_connections=args.max_connections, gmail=args.gmail, newsletter_kb=args.newsletter_kb
+    )
+    reports = []
+    try:
+        for name in (SCENARIOS if args.scenario == 'all' else (args.scenario,)):
+            report = BENCHMARKS[name](server, args)
+            reports.append(report)
+            if not args.json:
+                print_report(report)
+    finally:
+        server.stop()
+    if args.json:
+        print(json.dumps(reports, indent=2))
+
+
+if __name__ == '__main__':
+    main()
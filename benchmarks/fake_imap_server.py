@@ -0,0 +1,761 @@
+import re
+import socketserver
+import threading
+import time
+import email
+from collections import deque
+from datetime import datetime, timezone
+
+# --- Local IMAP stand-in ---
+# Speaks just enough IMAP4rev1 for utilClean, util and the pages: LOGIN, CAPABILITY,
+# LIST, SELECT/EXAMINE, STATUS, SEARCH/FETCH/STORE/COPY/MOVE/EXPUNGE (plain and UID),
+# CONDSTORE, UIDPLUS, MOVE and the Gmail X-GM-* extensions. Latency and throttling
+# are configurable so benchmarks can model a slow or rate-limited provider.
+# Plain TCP only; connect with imap_server="imap://127.0.0.1:<port>".
+
+class Message:
+    __slots__ = ('uid', 'flags', 'internaldate', 'raw', 'modseq', 'gm_msgid', 'labels', '_parsed')
+
+    def __init__(self, uid, raw, internaldate, flags=(), modseq=1, gm_msgid=0, labels=()):
+        self.uid = uid
+        self.raw = raw
+        self.internaldate = internaldate
+        self.flags = set(flags)
+        self.modseq = modseq
+        self.gm_msgid = gm_msgid
+        self.labels = set(labels)
+        self._parsed = None
+
+    @property
+    def parsed(self):
+        if self._parsed is None:
+            self._parsed = email.message_from_bytes(self.raw)
+        return self._parsed
+
+
+class Folder:
+    def __init__(self, name, uidvalidity=1, special_use=None):
+        self.name = name
+        self.uidvalidity = uidvalidity
+        self.uidnext = 1
+        self.highestmodseq = 1
+        self.messages = []
+        self.special_use = special_use
+
+    def append(self, raw, internaldate=None, flags=(), gm_msgid=0, labels=()):
+        self.highestmodseq += 1
+        msg = Message(self.uidnext, raw, internaldate or datetime.now(timezone.utc), flags,
+                      self.highestmodseq, gm_msgid, labels)
+        self.uidnext += 1
+        self.messages.append(msg)
+        return msg
+
+    def bump(self, msg):
+        self.highestmodseq += 1
+        msg.modseq = self.highestmodseq
+
+
+class Mailbox:
+    """All folders of one account. Guarded by a single lock shared by every connection."""
+
+    def __init__(self, folders=None):
+        self.lock = threading.RLock()
+        self.folders = {}
+        for name in folders or ('INBOX',):
+            self.add_folder(name)
+
+    def add_folder(self, name, special_use=None):
+        folder = Folder(name, uidvalidity=int(time.time()) % 100000 + len(self.folders), special_use=special_use)
+        self.folders[name] = folder
+        return folder
+
+    def folder(self, name):
+        if name.upper() == 'INBOX':
+            name = 'INBOX'
+        return self.folders.get(name)
+
+
+# --- Protocol parsing ---
+
+def tokenize(line):
+    """Split an IMAP command line into atoms, quoted strings and nested lists."""
+    pos = 0
+    n = len(line)
+
+    def parse_list(pos, closer):
+        items = []
+        while pos < n:
+            c = line[pos]
+            if c == ' ':
+                pos += 1
+            elif c == closer:
+                return items, pos + 1
+            elif c == '(':
+                sub, pos = parse_list(pos + 1, ')')
+                items.append(sub)
+            elif c == '"':
+                end = pos + 1
+                buf = []
+                while end < n and line[end] != '"':
+                    if line[end] == '\\':
+                        end += 1
+                    buf.append(line[end])
+                    end += 1
+                items.append(''.join(buf))
+                pos = end + 1
+            else:
+                end = pos
+                depth = 0
+                while end < n:
+                    ch = line[end]
+                    if ch == '[':
+                        depth += 1
+                    elif ch == ']':
+                        depth -= 1
+                    elif depth == 0 and (ch == ' ' or ch == ')' or ch == '('):
+                        break
+                    end += 1
+                items.append(line[pos:end])
+                pos = end
+        return items, pos
+
+    items, _ = parse_list(pos, None)
+    return items
+
+
+def parse_set(spec, maximum):
+    """Expand an IMAP sequence/UID set like '1:5,9,20:*' into a set of ints."""
+    result = set()
+    for part in str(spec).split(','):
+        if ':' in part:
+            a, b = part.split(':', 1)
+            a = maximum if a == '*' else int(a)
+            b = maximum if b == '*' else int(b)
+            if a > b:
+                a, b = b, a
+            result.update(range(a, b + 1))
+        elif part == '*':
+            result.add(maximum)
+        elif part:
+            result.add(int(part))
+    return result
+
+
+def quote(s):
+    return '"' + str(s).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def imap_date(dt):
+    return dt.strftime('%d-%b-%Y %H:%M:%S %z')
+
+
+def parse_search_date(s):
+    return datetime.strptime(s, '%d-%b-%Y').date()
+
+
+def bodystructure(part):
+    if part.is_multipart():
+        subs = ''.join(bodystructure(p) for p in part.get_payload())
+        return f'({subs} {quote(part.get_content_subtype())})'
+    payload = part.get_payload()
+    if isinstance(payload, list):
+        payload = ''
+    body = payload.encode('utf-8', 'replace') if isinstance(payload, str) else bytes(payload)
+    charset = part.get_content_charset() or 'us-ascii'
+    encoding = part.get('Content-Transfer-Encoding', '7bit')
+    lines = body.count(b'\n')
+    maintype, subtype = part.get_content_maintype(), part.get_content_subtype()
+    fields = f'{quote(maintype)} {quote(subtype)} ("charset" {quote(charset)}) NIL NIL {quote(encoding)} {len(body)}'
+    if maintype == 'text':
+        fields += f' {lines}'
+    return f'({fields})'
+
+
+def body_part(msg, section):
+    part = msg
+    for index in section.split('.'):
+        if not part.is_multipart():
+            if index == '1':
+                continue
+            return b''
+        payloads = part.get_payload()
+        i = int(index) - 1
+        if i >= len(payloads):
+            return b''
+        part = payloads[i]
+    payload = part.get_payload()
+    if isinstance(payload, list):
+        return part.as_bytes()
+    return payload.encode('utf-8', 'replace') if isinstance(payload, str) else bytes(payload)
+
+
+def header_fields(raw, names, exclude=False):
+    head = raw.split(b'\r\n\r\n', 1)[0].split(b'\n\n', 1)[0]
+    wanted = {n.upper() for n in names}
+    out = []
+    keep = False
+    for line in head.splitlines(True):
+        if line[:1] in (b' ', b'\t'):
+            if keep:
+                out.append(line)
+            continue
+        name = line.split(b':', 1)[0].decode('ascii', 'ignore').strip().upper()
+        keep = (name in wanted) != exclude
+        if keep:
+            out.append(line)
+    data = b''.join(out)
+    if data and not data.endswith(b'\r\n'):
+        data = data.rstrip(b'\r\n') + b'\r\n'
+    return data + b'\r\n'
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.srv = self.server
+        self.user = None
+        self.folder = None
+        self.readonly = False
+        self.condstore = False
+        self.srv.stats['connections'] += 1
+
+    def send(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.srv.stats['bytes_out'] += len(data)
+        self.wfile.write(data)
+
+    def handle(self):
+        self.send('* OK [CAPABILITY %s] fake IMAP ready\r\n' % self.srv.capabilities)
+        try:
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    break
+                self.srv.stats['bytes_in'] += len(line)
+                line = line.rstrip(b'\r\n')
+                # Literals ({n}) from the client
+                while line.endswith(b'}') and b'{' in line:
+                    size = int(line[line.rindex(b'{') + 1:-1].rstrip(b'+'))
+                    self.send('+ go ahead\r\n')
+                    literal = self.rfile.read(size)
+                    rest = self.rfile.readline().rstrip(b'\r\n')
+                    line = line[:line.rindex(b'{')] + b'"' + literal.replace(b'"', b'\\"') + b'"' + rest
+                text = line.decode('utf-8', 'replace')
+                if not text.strip():
+                    continue
+                tag, _, rest = text.partition(' ')
+                cmd, _, args = rest.partition(' ')
+                started = time.perf_counter()
+                if self.srv.latency:
+                    time.sleep(self.srv.latency)
+                self.srv.stats['commands'] += 1
+                try:
+                    keep_going = self.dispatch(tag, cmd.upper(), args)
+                except Exception as e:
+                    self.send(f'{tag} BAD {type(e).__name__}: {e}\r\n')
+                    keep_going = True
+                name = cmd.upper() + (' ' + args.split(' ', 1)[0].upper() if cmd.upper() == 'UID' else '')
+                self.srv.timings.append((name, time.perf_counter() - started))
+                if not keep_going:
+                    break
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.srv.release_user(self.user)
+
+    def dispatch(self, tag, cmd, args):
+        if cmd == 'UID':
+            sub, _, rest = args.partition(' ')
+            return self.dispatch_uid(tag, sub.upper(), rest)
+        handler = getattr(self, 'cmd_' + cmd.replace('-', '_'), None)
+        if handler is None:
+            self.send(f'{tag} BAD unknown command {cmd}\r\n')
+            return True
+        if cmd not in ('CAPABILITY', 'LOGIN', 'LOGOUT', 'NOOP', 'AUTHENTICATE') and self.user is None:
+            self.send(f'{tag} NO not authenticated\r\n')
+            return True
+        return handler(tag, args) is not False
+
+    def dispatch_uid(self, tag, sub, args):
+        handler = getattr(self, 'cmd_' + sub, None)
+        if handler is None or sub not in ('FETCH', 'SEARCH', 'STORE', 'COPY', 'MOVE', 'EXPUNGE'):
+            self.send(f'{tag} BAD unknown UID command {sub}\r\n')
+            return True
+        return handler(tag, args, uid=True) is not False
+
+    # --- state ---
+    def mailbox(self):
+        return self.srv.mailboxes[self.user]
+
+    def selected(self):
+        return self.mailbox().folder(self.folder) if self.folder else None
+
+    # --- commands ---
+    def cmd_CAPABILITY(self, tag, args):
+        self.send(f'* CAPABILITY {self.srv.capabilities}\r\n{tag} OK CAPABILITY completed\r\n')
+
+    def cmd_NOOP(self, tag, args):
+        self.send(f'{tag} OK NOOP completed\r\n')
+
+    def cmd_LOGIN(self, tag, args):
+        user, password = tokenize(args)[:2]
+        if user not in self.srv.mailboxes or self.srv.passwords.get(user, password) != password:
+            self.send(f'{tag} NO [AUTHENTICATIONFAILED] Invalid credentials\r\n')
+            return
+        if not self.srv.claim_user(user):
+            self.send(f'{tag} NO [LIMIT] Too many simultaneous connections\r\n')
+            return
+        self.srv.stats['logins'] += 1
+        self.user = user
+        self.send(f'{tag} OK [CAPABILITY {self.srv.capabilities}] {user} authenticated\r\n')
+
+    def cmd_LOGOUT(self, tag, args):
+        self.send(f'* BYE logging out\r\n{tag} OK LOGOUT completed\r\n')
+        return False
+
+    def cmd_ENABLE(self, tag, args):
+        enabled = [a for a in tokenize(args) if a.upper() in ('CONDSTORE', 'QRESYNC') and a.upper() in self.srv.capabilities]
+        if enabled:
+            self.condstore = True
+        self.send(f'* ENABLED {" ".join(enabled)}\r\n{tag} OK ENABLE completed\r\n')
+
+    def cmd_LIST(self, tag, args):
+        with self.mailbox().lock:
+            for name, folder in self.mailbox().folders.items():
+                attrs = '\\HasNoChildren' + (' ' + folder.special_use if folder.special_use else '')
+                self.send(f'* LIST ({attrs}) "/" {quote(name)}\r\n')
+        self.send(f'{tag} OK LIST completed\r\n')
+
+    def cmd_STATUS(self, tag, args):
+        tokens = tokenize(args)
+        folder = self.mailbox().folder(tokens[0])
+        if folder is None:
+            self.send(f'{tag} NO no such mailbox\r\n')
+            return
+        with self.mailbox().lock:
+            values = {
+                'MESSAGES': len(folder.messages),
+                'UIDNEXT': folder.uidnext,
+                'UIDVALIDITY': folder.uidvalidity,
+                'UNSEEN': sum(1 for m in folder.messages if '\\Seen' not in m.flags),
+                'HIGHESTMODSEQ': folder.highestmodseq,
+            }
+        items = ' '.join(f'{k} {values[k.upper()]}' for k in tokens[1] if k.upper() in values)
+        self.send(f'* STATUS {quote(folder.name)} ({items})\r\n{tag} OK STATUS completed\r\n')
+
+    def cmd_SELECT(self, tag, args, readonly=False):
+        tokens = tokenize(args)
+        folder = self.mailbox().folder(tokens[0])
+        if folder is None:
+            self.folder = None
+            self.send(f'{tag} NO [NONEXISTENT] no such mailbox\r\n')
+            return
+        if len(tokens) > 1 and isinstance(tokens[1], list) and any(str(t).upper() in ('CONDSTORE', 'QRESYNC') for t in tokens[1]):
+            self.condstore = True
+        self.folder = folder.name
+        self.readonly = readonly
+        with self.mailbox().lock:
+            self.send(
+                f'* FLAGS (\\Answered \\Flagged \\Deleted \\Seen \\Draft)\r\n'
+                f'* {len(folder.messages)} EXISTS\r\n'
+                f'* 0 RECENT\r\n'
+                f'* OK [UIDVALIDITY {folder.uidvalidity}] UIDs valid\r\n'
+                f'* OK [UIDNEXT {folder.uidnext}] Predicted next UID\r\n'
+            )
+            if 'CONDSTORE' in self.srv.capabilities:
+                self.send(f'* OK [HIGHESTMODSEQ {folder.highestmodseq}] Highest\r\n')
+        mode = 'READ-ONLY' if readonly else 'READ-WRITE'
+        self.send(f'{tag} OK [{mode}] SELECT completed\r\n')
+
+    def cmd_EXAMINE(self, tag, args):
+        return self.cmd_SELECT(tag, args, readonly=True)
+
+    def cmd_CLOSE(self, tag, args):
+        folder = self.selected()
+        if folder is not None and not self.readonly:
+            with self.mailbox().lock:
+                folder.messages = [m for m in folder.messages if '\\Deleted' not in m.flags]
+        self.folder = None
+        self.send(f'{tag} OK CLOSE completed\r\n')
+
+    def cmd_UNSELECT(self, tag, args):
+        self.folder = None
+        self.send(f'{tag} OK UNSELECT completed\r\n')
+
+    def require_selected(self, tag):
+        folder = self.selected()
+        if folder is None:
+            self.send(f'{tag} BAD no mailbox selected\r\n')
+        return folder
+
+    def resolve(self, folder, spec, uid):
+        """Return (seq, message) pairs addressed by a sequence or UID set."""
+        msgs = folder.messages
+        if not msgs:
+            return []
+        if uid:
+            wanted = parse_set(spec, msgs[-1].uid)
+            return [(i + 1, m) for i, m in enumerate(msgs) if m.uid in wanted]
+        wanted = parse_set(spec, len(msgs))
+        return [(i, msgs[i - 1]) for i in sorted(wanted) if 1 <= i <= len(msgs)]
+
+    # --- SEARCH ---
+    def cmd_SEARCH(self, tag, args, uid=False):
+        folder = self.require_selected(tag)
+        if folder is None:
+            return
+        tokens = tokenize(args)
+        if tokens and str(tokens[0]).upper() == 'CHARSET':
+            tokens = tokens[2:]
+        with self.mailbox().lock:
+            msgs = folder.messages
+            hits = [(i + 1, m) for i, m in enumerate(msgs) if self.match_all(tokens, i + 1, m, len(msgs))]
+        numbers = ' '.join(str(m.uid if uid else i) for i, m in hits)
+        self.send(f'* SEARCH {numbers}\r\n'.replace('SEARCH \r\n', 'SEARCH\r\n'))
+        self.send(f'{tag} OK SEARCH completed\r\n')
+
+    def match_all(self, tokens, seq, msg, total):
+        tokens = list(tokens)
+        while tokens:
+            if not self.match_one(tokens, seq, msg, total):
+                return False
+        return True
+
+    def match_one(self, tokens, seq, msg, total):
+        tok = tokens.pop(0)
+        if isinstance(tok, list):
+            return self.match_all(tok, seq, msg, total)
+        key = tok.upper()
+        if key == 'ALL':
+            return True
+        if key == 'NOT':
+            return not self.match_one(tokens, seq, msg, total)
+        if key == 'OR':
+            a = self.match_one(tokens, seq, msg, total)
+            b = self.match_one(tokens, seq, msg, total)
+            return a or b
+        flag_keys = {'SEEN': '\\Seen', 'DELETED': '\\Deleted', 'FLAGGED': '\\Flagged', 'ANSWERED': '\\Answered'}
+        if key in flag_keys:
+            return flag_keys[key] in msg.flags
+        if key.startswith('UN') and key[2:] in flag_keys:
+            return flag_keys[key[2:]] not in msg.flags
+        if key in ('SINCE', 'BEFORE', 'ON'):
+            day = parse_search_date(tokens.pop(0))
+            internal = msg.internaldate.date()
+            return {'SINCE': internal >= day, 'BEFORE': internal < day, 'ON': internal == day}[key]
+        if key in ('SENTSINCE', 'SENTBEFORE'):
+            day = parse_search_date(tokens.pop(0))
+            sent = email.utils.parsedate_to_datetime(msg.parsed.get('Date', '')).date() if msg.parsed.get('Date') else msg.internaldate.date()
+            return sent >= day if key == 'SENTSINCE' else sent < day
+        if key in ('FROM', 'TO', 'SUBJECT', 'CC'):
+            needle = tokens.pop(0).lower()
+            return needle in str(msg.parsed.get(key.capitalize(), '')).lower()
+        if key == 'HEADER':
+            name = tokens.pop(0)
+            needle = tokens.pop(0).lower()
+            value = msg.parsed.get(name)
+            return value is not None and needle in str(value).lower()
+        if key in ('BODY', 'TEXT'):
+            needle = tokens.pop(0).lower().encode()
+            return needle in msg.raw.lower()
+        if key == 'LARGER':
+            return len(msg.raw) > int(tokens.pop(0))
+        if key == 'SMALLER':
+            return len(msg.raw) < int(tokens.pop(0))
+        if key == 'UID':
+            return msg.uid in parse_set(tokens.pop(0), msg.uid if not total else 10 ** 12)
+        if key == 'MODSEQ':
+            return msg.modseq > int(tokens.pop(0))
+        if key == 'X-GM-RAW':
+            return self.match_gm_raw(tokens.pop(0), msg)
+        if re.match(r'^[\d:*,]+$', key):
+            return seq in parse_set(key, total)
+        raise ValueError(f'unsupported search key {key}')
+
+    def match_gm_raw(self, query, msg):
+        for term in query.split():
+            negate = term.startswith('-')
+            term = term.lstrip('-')
+            name, _, value = term.partition(':')
+            name = name.lower()
+            if name == 'category':
+                ok = any(l.lower().lstrip('\\') in (value.lower(), 'category' + value.lower()) for l in msg.labels)
+            elif name == 'label':
+                ok = value.lower() in {l.lower().lstrip('\\') for l in msg.labels}
+            elif name == 'from':
+                ok = value.lower() in str(msg.parsed.get('From', '')).lower()
+            elif name in ('older_than', 'newer_than'):
+                amount, unit = int(value[:-1]), value[-1]
+                days = amount * {'d': 1, 'm': 30, 'y': 365}[unit]
+                age = (datetime.now(timezone.utc) - msg.internaldate).days
+                ok = age >= days if name == 'older_than' else age < days
+            elif name == 'is':
+                ok = {'unread': '\\Seen' not in msg.flags, 'read': '\\Seen' in msg.flags}.get(value, False)
+            elif name == 'in' and value == 'anywhere':
+                ok = True
+            else:
+                ok = term.lower().encode() in msg.raw.lower()
+            if ok == negate:
+                return False
+        return True
+
+    # --- FETCH ---
+    def cmd_FETCH(self, tag, args, uid=False):
+        folder = self.require_selected(tag)
+        if folder is None:
+            return
+        tokens = tokenize(args)
+        spec, items = tokens[0], tokens[1]
+        if not isinstance(items, list):
+            items = [items]
+        items = [i.upper() if isinstance(i, str) and '[' not in i else i for i in items]
+        expanded = []
+        macros = {'ALL': ['FLAGS', 'INTERNALDATE', 'RFC822.SIZE'], 'FAST': ['FLAGS', 'INTERNALDATE', 'RFC822.SIZE']}
+        for item in items:
+            expanded.extend(macros.get(item, [item]))
+        items = expanded
+        changedsince = None
+        if len(tokens) > 2 and isinstance(tokens[2], list) and len(tokens[2]) >= 2 and tokens[2][0].upper() == 'CHANGEDSINCE':
+            changedsince = int(tokens[2][1])
+            if 'MODSEQ' not in items:
+                items.append('MODSEQ')
+        if uid and 'UID' not in items:
+            items.insert(0, 'UID')
+        with self.mailbox().lock:
+            targets = self.resolve(folder, spec, uid)
+            out = []
+            for seq, msg in targets:
+                if changedsince is not None and msg.modseq <= changedsince:
+                    continue
+                out.append(self.fetch_response(seq, msg, items))
+                if not self.readonly and any(str(i).upper().startswith(('BODY[', 'RFC822')) and str(i).upper() not in ('RFC822.SIZE', 'RFC822.HEADER') for i in items):
+                    if '\\Seen' not in msg.flags:
+                        msg.flags.add('\\Seen')
+                        folder.bump(msg)
+        for chunk in out:
+            self.send(chunk)
+        self.send(f'{tag} OK FETCH completed\r\n')
+
+    def fetch_response(self, seq, msg, items):
+        parts = []
+        for item in items:
+            name = item if isinstance(item, str) else str(item)
+            upper = name.upper()
+            if upper == 'UID':
+                parts.append(f'UID {msg.uid}'.encode())
+            elif upper == 'FLAGS':
+                parts.append(f'FLAGS ({" ".join(sorted(msg.flags))})'.encode())
+            elif upper == 'INTERNALDATE':
+                parts.append(f'INTERNALDATE "{imap_date(msg.internaldate)}"'.encode())
+            elif upper == 'RFC822.SIZE':
+                parts.append(f'RFC822.SIZE {len(msg.raw)}'.encode())
+            elif upper == 'MODSEQ':
+                parts.append(f'MODSEQ ({msg.modseq})'.encode())
+            elif upper == 'X-GM-MSGID':
+                parts.append(f'X-GM-MSGID {msg.gm_msgid}'.encode())
+            elif upper == 'X-GM-LABELS':
+                parts.append(f'X-GM-LABELS ({" ".join(quote(l) if " " in l else l for l in sorted(msg.labels))})'.encode())
+            elif upper == 'BODYSTRUCTURE':
+                parts.append(f'BODYSTRUCTURE {bodystructure(msg.parsed)}'.encode())
+            elif upper in ('RFC822', 'RFC822.HEADER'):
+                data = msg.raw if upper == 'RFC822' else header_fields(msg.raw, [], exclude=True)
+                parts.append(upper.encode() + b' {%d}\r\n' % len(data) + data)
+            elif upper.startswith('BODY'):
+                parts.append(self.fetch_body(msg, name))
+            else:
+                raise ValueError(f'unsupported fetch item {name}')
+        return b'* %d FETCH (' % seq + b' '.join(parts) + b')\r\n'
+
+    def fetch_body(self, msg, item):
+        m = re.match(r'BODY(?:\.PEEK)?\[([^\]]*)\](?:<(\d+)(?:\.(\d+))?>)?', item, re.I)
+        if not m:
+            raise ValueError(f'bad body item {item}')
+        section, offset, length = m.group(1), m.group(2), m.group(3)
+        upper = section.upper()
+        if upper == '':
+            data = msg.raw
+        elif upper == 'HEADER':
+            data = header_fields(msg.raw, [], exclude=True)
+        elif upper.startswith('HEADER.FIELDS'):
+            names = re.findall(r'[\w-]+', section[section.index('(') + 1:section.rindex(')')])
+            data = header_fields(msg.raw, names, exclude='.NOT' in upper)
+        elif upper == 'TEXT':
+            sep = msg.raw.find(b'\r\n\r\n')
+            data = msg.raw[sep + 4:] if sep >= 0 else b''
+        else:
+            data = body_part(msg.parsed, section)
+        label = f'BODY[{section}]'
+        if offset is not None:
+            start = int(offset)
+            data = data[start:start + int(length)] if length else data[start:]
+            label += f'<{start}>'
+        return label.encode() + b' {%d}\r\n' % len(data) + data
+
+    # --- STORE / COPY / MOVE / EXPUNGE ---
+    def cmd_STORE(self, tag, args, uid=False):
+        folder = self.require_selected(tag)
+        if folder is None:
+            return
+        if self.readonly:
+            self.send(f'{tag} NO mailbox is read-only\r\n')
+            return
+        tokens = tokenize(args)
+        spec, op = tokens[0], tokens[1].upper()
+        flags = tokens[2] if isinstance(tokens[2], list) else [tokens[2]]
+        silent = op.endswith('.SILENT')
+        with self.mailbox().lock:
+            out = []
+            for seq, msg in self.resolve(folder, spec, uid):
+                if op.startswith('+'):
+                    msg.flags.update(flags)
+                elif op.startswith('-'):
+                    msg.flags.difference_update(flags)
+                else:
+                    msg.flags = set(flags)
+                folder.bump(msg)
+                if not silent:
+                    uid_part = f'UID {msg.uid} ' if uid else ''
+                    out.append(f'* {seq} FETCH ({uid_part}FLAGS ({" ".join(sorted(msg.flags))}))\r\n')
+        self.send(''.join(out) + f'{tag} OK STORE completed\r\n')
+
+    def copy_to(self, folder, spec, uid, target_name):
+        target = self.mailbox().folder(target_name)
+        if target is None:
+            return None, None
+        moved = self.resolve(folder, spec, uid)
+        pairs = []
+        for seq, msg in moved:
+            copy = target.append(msg.raw, msg.internaldate, msg.flags - {'\\Deleted'}, msg.gm_msgid, msg.labels)
+            pairs.append((msg.uid, copy.uid))
+        return target, (moved, pairs)
+
+    def copyuid(self, target, pairs):
+        if not pairs:
+            return ''
+        src = ','.join(str(a) for a, _ in pairs)
+        dst = ','.join(str(b) for _, b in pairs)
+        return f'[COPYUID {target.uidvalidity} {src} {dst}] '
+
+    def cmd_COPY(self, tag, args, uid=False):
+        folder = self.require_selected(tag)
+        if folder is None:
+            return
+        tokens = tokenize(args)
+        with self.mailbox().lock:
+            target, result = self.copy_to(folder, tokens[0], uid, tokens[1])
+        if target is None:
+            self.send(f'{tag} NO [TRYCREATE] no such mailbox\r\n')
+            return
+        self.send(f'{tag} OK {self.copyuid(target, result[1])}COPY completed\r\n')
+
+    def cmd_MOVE(self, tag, args, uid=False):
+        if 'MOVE' not in self.srv.capabilities.split():
+            self.send(f'{tag} BAD MOVE not supported\r\n')
+            return
+        folder = self.require_selected(tag)
+        if folder is None:
+            return
+        tokens = tokenize(args)
+        with self.mailbox().lock:
+            target, result = self.copy_to(folder, tokens[0], uid, tokens[1])
+            if target is None:
+                self.send(f'{tag} NO [TRYCREATE] no such mailbox\r\n')
+                return
+            moved, pairs = result
+            self.send(f'* OK {self.copyuid(target, pairs)}Moved\r\n')
+            self.send(self.expunge(folder, {m.uid for _, m in moved}))
+        self.send(f'{tag} OK MOVE completed\r\n')
+
+    def expunge(self, folder, only_uids=None):
+        """Remove \\Deleted messages, or exactly `only_uids` when moving, and report EXPUNGEs."""
+        out = []
+        kept = []
+        removed = 0
+        for i, msg in enumerate(folder.messages):
+            gone = msg.uid in only_uids if only_uids is not None else '\\Deleted' in msg.flags
+            if gone:
+                out.append(f'* {i + 1 - removed} EXPUNGE\r\n')
+                removed += 1
+            else:
+                kept.append(msg)
+        folder.messages = kept
+        if removed:
+            folder.highestmodseq += 1
+        return ''.join(out)
+
+    def cmd_EXPUNGE(self, tag, args, uid=False):
+        folder = self.require_selected(tag)
+        if folder is None:
+            return
+        with self.mailbox().lock:
+            if uid:
+                if 'UIDPLUS' not in self.srv.capabilities.split():
+                    self.send(f'{tag} BAD UID EXPUNGE not supported\r\n')
+                    return
+                wanted = {m.uid for _, m in self.resolve(folder, tokenize(args)[0], True) if '\\Deleted' in m.flags}
+                self.send(self.expunge(folder, wanted))
+            else:
+                self.send(self.expunge(folder))
+        self.send(f'{tag} OK EXPUNGE completed\r\n')
+
+
+class FakeIMAPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 256
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, max_connections=15,
+                 gmail=False, capabilities=None):
+        super().__init__((host, port), Handler)
+        self.latency = latency
+        self.max_connections = max_connections
+        caps = 'IMAP4rev1 LITERAL+ UIDPLUS MOVE CONDSTORE QRESYNC ENABLE UNSELECT ID IDLE'
+        if gmail:
+            caps += ' X-GM-EXT-1'
+        self.capabilities = capabilities or caps
+        self.mailboxes = {}
+        self.passwords = {}
+        self.active = {}
+        self._active_lock = threading.Lock()
+        self.stats = {'connections': 0, 'logins': 0, 'commands': 0, 'bytes_in': 0, 'bytes_out': 0, 'throttled': 0}
+        self.timings = deque(maxlen=200000)  # (command, seconds) per command, including injected latency
+        self._thread = None
+
+    def add_account(self, user, password, mailbox=None):
+        self.mailboxes[user] = mailbox or Mailbox()
+        self.passwords[user] = password
+        return self.mailboxes[user]
+
+    def claim_user(self, user):
+        with self._active_lock:
+            if self.active.get(user, 0) >= self.max_connections:
+                self.stats['throttled'] += 1
+                return False
+            self.active[user] = self.active.get(user, 0) + 1
+            return True
+
+    def release_user(self, user):
+        if user is None:
+            return
+        with self._active_lock:
+            self.active[user] = max(0, self.active.get(user, 0) - 1)
+
+    @property
+    def address(self):
+        host, port = self.server_address[:2]
+        return f'imap://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def reset_stats(self):
+        for key in self.stats:
+            self.stats[key] = 0
+        self.timings.clear()
@@ -0,0 +1,136 @@
+import random
+from datetime import datetime, timedelta, timezone
+from email.header import Header
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import format_datetime
+
+from benchmarks.fake_imap_server import Mailbox
+
+# --- Synthetic mailboxes ---
+# Deterministic (seeded) generator for realistic-looking mail: a long tail of personal
+# senders, a few hundred bulk senders that send most of the volume with List-Unsubscribe
+# headers and heavy HTML newsletters, encoded (RFC 2047) display names and a spread of
+# Date header formats.
+
+FIRST = ['Ana', 'Ben', 'Carla', 'Dan', 'Eli', 'Faye', 'Gio', 'Hana', 'Ivan', 'Jules', 'Kai', 'Lea', 'Mara', 'Noel']
+LAST = ['Reyes', 'Santos', 'Cruz', 'Garcia', 'Lim', 'Tan', 'Bautista', 'Ocampo', 'Mendoza', 'Ramos']
+DOMAINS = ['gmail.com', 'yahoo.com', 'outlook.com', 'company.ph', 'school.edu']
+BRANDS = ['Shopee', 'Lazada', 'Grab', 'Netflix', 'Spotify', 'Medium', 'LinkedIn', 'Canva', 'Zalora', 'Klook',
+          'Agoda', 'Booking', 'Udemy', 'Coursera', 'GitHub', 'Figma', 'Notion', 'Slack', 'Steam', 'Nike']
+SUBJECTS = ['Your weekly digest', 'Flash sale ends tonight', 'New login to your account', 'Invoice #{n}',
+            'Meeting notes {n}', 'Re: project update', 'Welcome aboard!', 'Your order has shipped',
+            'Limited offer: {n}% off', 'Reminder: appointment tomorrow', 'Fwd: photos', 'Quarterly report']
+DATE_FORMATS = [
+    lambda d: format_datetime(d),
+    lambda d: format_datetime(d) + ' (UTC)',
+    lambda d: d.strftime('%d %b %Y %H:%M:%S +0000'),
+    lambda d: d.strftime('%a, %d %b %Y %H:%M:%S GMT'),
+    lambda d: d.strftime('%a, %-d %b %Y %H:%M:%S +0800'),
+]
+
+
+def newsletter_html(rng, brand, sender, size_kb):
+    rows = []
+    filler = '<tr><td style="padding:12px;font-family:Arial">%s</td></tr>' % ('Deal of the day ' * 20)
+    while sum(len(r) for r in rows) < size_kb * 1024:
+        rows.append(filler)
+        rows.append('<tr><td><a href="https://%s.example/p/%d">View product</a></td></tr>' % (brand.lower(), rng.randint(1, 10 ** 6)))
+    footer = ('<p style="font-size:10px">You received this because you subscribed. '
+              '<a href="https://%s.example/unsubscribe?u=%d">Unsubscribe</a> | '
+              '<a href="https://%s.example/prefs">Manage preferences</a></p>' % (brand.lower(), rng.randint(1, 10 ** 9), brand.lower()))
+    return '<html><body><table>%s</table>%s</body></html>' % (''.join(rows), footer)
+
+
+def cached_newsletter(rng, senders, brand, sender, size_kb):
+    """Reuse a few bodies per brand so million-message mailboxes generate in minutes, not hours."""
+    key = (brand, size_kb, rng.randrange(3))
+    html = senders.templates.get(key)
+    if html is None:
+        html = senders.templates[key] = newsletter_html(rng, brand, sender, size_kb)
+    return html
+
+
+class SenderPool:
+    def __init__(self, rng, personal=2000, bulk=300):
+        self.rng = rng
+        self.templates = {}
+        self.personal = []
+        for i in range(personal):
+            first, last = rng.choice(FIRST), rng.choice(LAST)
+            address = f'{first.lower()}.{last.lower()}{i}@{rng.choice(DOMAINS)}'
+            name = f'{first} {last}'
+            if rng.random() < 0.15:
+                name = Header(f'{first} {last} ñ', 'utf-8').encode()
+            self.personal.append((name, address))
+        self.bulk = []
+        for i in range(bulk):
+            brand = BRANDS[i % len(BRANDS)] + ('' if i < len(BRANDS) else f' {i}')
+            domain = brand.lower().replace(' ', '') + '.example'
+            with_header = rng.random() < 0.85
+            self.bulk.append((brand, f'news@{domain}', domain, with_header))
+
+    def personal_sender(self):
+        return self.personal[int(self.rng.paretovariate(1.2)) % len(self.personal)]
+
+    def bulk_sender(self):
+        return self.bulk[int(self.rng.paretovariate(1.1)) % len(self.bulk)]
+
+
+def make_message(rng, senders, when, recipient='me@example.com', bulk_ratio=0.6, newsletter_kb=40):
+    n = rng.randint(1, 99999)
+    if rng.random() < bulk_ratio:
+        brand, address, domain, with_header = senders.bulk_sender()
+        msg = MIMEMultipart('alternative')
+        msg.attach(MIMEText(f'{brand} newsletter. Unsubscribe: https://{domain}/unsubscribe', 'plain', 'utf-8'))
+        size_kb = max(1, newsletter_kb // 4 * rng.randint(1, 4))
+        msg.attach(MIMEText(cached_newsletter(rng, senders, brand, address, size_kb), 'html', 'utf-8'))
+        msg['From'] = f'{brand} <{address}>'
+        if with_header:
+            msg['List-Unsubscribe'] = f'<https://{domain}/u/{n}>, <mailto:unsubscribe@{domain}?subject=unsub>'
+            msg['List-Unsubscribe-Post'] = 'List-Unsubscribe=One-Click'
+            msg['List-Id'] = f'{brand} <news.{domain}>'
+        msg['Precedence'] = 'bulk'
+    else:
+        name, address = senders.personal_sender()
+        msg = MIMEText('Hi,\n\nJust following up on this.\n\nThanks!\n', 'plain', 'utf-8')
+        msg['From'] = f'{name} <{address}>'
+    msg['To'] = recipient
+    msg['Subject'] = rng.choice(SUBJECTS).format(n=n % 90 + 10)
+    msg['Date'] = rng.choice(DATE_FORMATS)(when)
+    msg['Message-ID'] = f'<{n}.{int(when.timestamp())}@{address.split("@")[1]}>'
+    return msg.as_bytes().replace(b'\n', b'\r\n').replace(b'\r\r\n', b'\r\n')
+
+
+def generate_mailbox(count=1000, days=365, seed=7, unread_ratio=0.3, spam=0.05, trash=0.05,
+                     gmail=False, bulk_ratio=0.6, newsletter_kb=40, mailbox=None):
+    """
+    Build a Mailbox with `count` messages spread over the last `days` days.
+    `spam` and `trash` are the fractions that land in those folders instead of INBOX.
+    Messages are kept in memory, so lower `newsletter_kb` for the 100k-1M message sizes.
+    """
+    rng = random.Random(seed)
+    senders = SenderPool(rng)
+    if gmail:
+        names = ['INBOX', '[Gmail]/All Mail', '[Gmail]/Spam', '[Gmail]/Trash']
+    else:
+        names = ['INBOX', 'Spam', 'Trash']
+    mailbox = mailbox or Mailbox(names)
+    inbox = mailbox.folder('INBOX')
+    spam_folder = mailbox.folder(names[-2])
+    trash_folder = mailbox.folder(names[-1])
+    all_mail = mailbox.folder('[Gmail]/All Mail') if gmail else None
+    now = datetime.now(timezone.utc)
+    stamps = sorted(now - timedelta(seconds=rng.randint(0, days * 86400)) for _ in range(count))
+    for i, when in enumerate(stamps):
+        raw = make_message(rng, senders, when, bulk_ratio=bulk_ratio, newsletter_kb=newsletter_kb)
+        roll = rng.random()
+        target = spam_folder if roll < spam else trash_folder if roll < spam + trash else inbox
+        flags = () if rng.random() < unread_ratio else ('\\Seen',)
+        labels = ()
+        if gmail:
+            labels = ('\\Inbox', '\\Category' + rng.choice(['Promotions', 'Social', 'Updates', 'Personal'])) if target is inbox else ()
+        target.append(raw, when, flags, gm_msgid=10 ** 15 + i, labels=labels)
+        if all_mail is not None and target is inbox:
+            all_mail.append(raw, when, flags, gm_msgid=10 ** 15 + i, labels=labels)
+    return mailbox
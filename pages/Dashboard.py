@@ -3,7 +3,7 @@ import base64
 
 st.set_page_config(page_title="Dashboard", layout="wide", initial_sidebar_state="collapsed")
 
-from util import load_css, background, load_session_state
+from util import load_css, background, load_session_state, logout
 load_css("assets/style2.css")
 background("assets/bg2.png")
 load_session_state()
@@ -72,7 +72,6 @@ with st.container():
     st.markdown('</div>', unsafe_allow_html=True)
 
 if st.button("Log out"):
-    st.session_state.logged_in = False
-    st.session_state.email = ""
+    logout()
     st.success("You have been logged out.")
-    st.switch_page("main.py")
+    st.switch_page("Main.py")
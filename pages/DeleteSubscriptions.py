@@ -1,11 +1,16 @@
 import streamlit as st
-import re
-from email import message_from_bytes
 
+from utilClean import scan_all_fast
+from utilPool import CONNECTION_ERRORS
 from util import (
     load_session_state,
-    get_imap_connection,
-    extract_unsubscribe_link,
+    imap_session,
+    subscription_senders,
+    fill_unsubscribe_links,
+    IMAP_SERVER,
+    get_cached_result,
+    cache_result,
+    scan_result_key,
     load_unsubscribed_emails,
     save_unsubscribed_email,
 )
@@ -18,47 +23,35 @@ if "logged_in" not in st.session_state or not st.session_state.logged_in:
     st.stop()
 
 email_address = st.session_state.get("email", "Unknown User")
-mail = get_imap_connection()
-if not mail:
-    st.error("IMAP connection not found. Please log in again.")
-    st.stop()
 
 if "subscriptions" not in st.session_state:
-    with st.spinner("Loading your subscriptions..."):
-        unsubscribed_emails = load_unsubscribed_emails(email_address)
-
-        mail.select("inbox")
-        result, data = mail.search(None, '(BODY "unsubscribe")')
-        email_ids = data[0].split()
-
-        seen_emails = set()
-        subscriptions = []
-
-        for e_id in email_ids[:100]:  
-            _, msg_data = mail.fetch(e_id, '(RFC822)')
-            raw_email = msg_data[0][1]
-            msg = message_from_bytes(raw_email)
-
-            from_header = msg.get('From', '')
-            name_email_match = re.search(r'([^<]+)<([^>]+)>', from_header)
-            if name_email_match:
-                name = name_email_match.group(1).strip()
-                sender_email = name_email_match.group(2)
-
-                if sender_email in seen_emails or sender_email in unsubscribed_emails:
-                    continue
-                seen_emails.add(sender_email)
-
-                unsub_type, unsub_link = extract_unsubscribe_link(msg)
-
-                subscriptions.append({
-                    "name": name,
-                    "email": sender_email,
-                    "unsub_type": unsub_type,
-                    "unsub_link": unsub_link,
-                })
-
-        st.session_state.subscriptions = subscriptions
+    subscriptions, _ = get_cached_result("INBOX", "subscriptions")
+    if subscriptions is None:
+        # The regular scan tags list mail from its headers and finds the rest with a server-side
+        # BODY "unsubscribe" search, so reuse the Scan page's result when there is one; only
+        # senders without a List-Unsubscribe link need one body lookup on the shared connection
+        with st.spinner("Loading your subscriptions..."):
+            results = st.session_state.get("scan_results")
+            if results is None:
+                results, _ = get_cached_result(scan_result_key(False), None)
+            if results is None:
+                try:
+                    results = scan_all_fast(email_address, st.session_state.get("app_password"), IMAP_SERVER,
+                                            include_trash=False)
+                except CONNECTION_ERRORS:
+                    results = None
+                if results is None:
+                    st.error("IMAP connection not found. Please log in again.")
+                    st.stop()
+                cache_result(scan_result_key(False), None, results)
+            unsubscribed_emails = load_unsubscribed_emails(email_address)
+            subscriptions = subscription_senders(results['subscriptions'] + results['unsubscribe_mentions'],
+                                                 unsubscribed_emails)
+            with imap_session() as mail:
+                if mail:
+                    fill_unsubscribe_links(mail, subscriptions)
+        cache_result("INBOX", "subscriptions", subscriptions)
+    st.session_state.subscriptions = subscriptions
 
 # Display and handle unsubscribes
 subs = st.session_state.subscriptions
@@ -81,6 +74,8 @@ for sub in subs:
                         f'<a href="{sub["unsub_link"]}" target="_blank">👉 Click here to unsubscribe</a>',
                         unsafe_allow_html=True
                     )
+                    if sub.get("one_click"):
+                        st.caption("This sender supports one-click unsubscribe.")
                 elif sub["unsub_type"] == "mailto":
                     st.markdown(
                         f'<a href="{sub["unsub_link"]}" target="_blank">📧 Send unsubscribe email</a>',
@@ -95,6 +90,8 @@ for sub in subs:
         else:
             updated_subs.append(sub) 
 
+if len(updated_subs) != len(subs):
+    cache_result("INBOX", "subscriptions", updated_subs)
 st.session_state.subscriptions = updated_subs
 
 st.markdown("---")
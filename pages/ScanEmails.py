@@ -1,7 +1,8 @@
 import streamlit as st
-from utilClean import scan_all_fast, delete_emails
+from utilClean import scan_all_iter, delete_emails, scan_mailbox_usage, delete_from_sender
+from utilPool import CONNECTION_ERRORS
 from datetime import datetime, timedelta
-from util import background, load_session_state
+from util import background, load_session_state, render_email_table, filter_emails, get_cached_result, cache_result, invalidate_results, scan_result_key, IMAP_SERVER
 import pytz
 
 st.set_page_config(
@@ -21,7 +22,7 @@ if not st.session_state.get("logged_in"):
 
 email_address = st.session_state.get("email")
 password = st.session_state.get("app_password")
-imap_server = "imap.gmail.com"
+imap_server = IMAP_SERVER
 
 # Scan Settings
 st.subheader("Scan Settings")
@@ -36,6 +37,7 @@ with col1:
 
 with col2:
     include_trash = st.checkbox("Include Trash Folder in Scan", value=True)
+    fresh_scan = st.checkbox("Ignore results from the last few minutes", value=False)
 
 if scan_option == "Last 7 days":
     days_back = 7
@@ -58,19 +60,64 @@ else:
     st.info("🗓️ Scanning all emails")
 
 # Scan Trigger
+scan_folders = scan_result_key(include_trash)
 col1, col2 = st.columns([1,0.3])
 
 with col1:
     if st.button("🔍 Scan Mailbox"):
-        with st.spinner("Scanning mailbox, please wait..."):
-            results = scan_all_fast(email_address, password, imap_server, days_back)
+        cached, cached_age = (None, None) if fresh_scan else get_cached_result(scan_folders, days_back)
+        if cached is not None:
+            # Same folders and window scanned a few minutes ago: reuse it without logging in
+            results = cached
+        else:
+            # Results stream in per batch, so show live counts instead of a blind spinner
+            progress_bar = st.progress(0.0, text="Connecting to your mailbox...")
+            live_col1, live_col2, live_col3 = st.columns(3)
+            live_unread, live_spam, live_trash = live_col1.empty(), live_col2.empty(), live_col3.empty()
+            live_latest = st.empty()
+            found = {'unread': 0, 'spam': 0, 'junk': 0, 'trash': 0}
+            folder_progress = {}
+            results = None
+
+            for event in scan_all_iter(email_address, password, imap_server, days_back, include_trash=include_trash):
+                if event.get('done'):
+                    results = event['results']
+                    break
+                found[event['group']] += len(event['emails'])
+                folder_progress[event['folder']] = (event['fetched'], event['total'])
+                fetched = sum(f for f, _ in folder_progress.values())
+                total = sum(t for _, t in folder_progress.values())
+                progress_bar.progress(
+                    min(fetched / total, 1.0) if total else 0.0,
+                    text=f"Scanning {event['folder']}: {event['fetched']:,} / {event['total']:,}"
+                )
+                live_unread.metric("📥 Unread Emails", found['unread'])
+                live_spam.metric("🚫 Spam Emails", found['spam'])
+                live_trash.metric("🗑️ Trash Emails", found['trash'])
+                if event['emails']:
+                    latest = event['emails'][-1]
+                    live_latest.caption(f"Latest: {latest['subject']} — {latest['sender']}")
+
+            progress_bar.empty()
+            live_latest.empty()
+            for placeholder in (live_unread, live_spam, live_trash):
+                placeholder.empty()
             if results:
-                st.session_state.scan_results = results
-                st.session_state.scan_date_range = scan_option
-                st.session_state.include_trash = include_trash
-                st.success(f"Scan completed in {results['scan_time']:.2f} seconds!")
+                cache_result(scan_folders, days_back, results)
+                # The Subscriptions page builds its sender list from this scan next time
+                invalidate_results("INBOX")
+                st.session_state.pop("subscriptions", None)
+
+        if results:
+            st.session_state.scan_results = results
+            st.session_state.scan_date_range = scan_option
+            st.session_state.include_trash = include_trash
+            if cached is not None:
+                st.success(f"Showing the scan from {cached_age / 60:.0f} minutes ago.")
             else:
-                st.error("Scan failed. Please check your credentials or try again later.")
+                st.success(f"Scan completed in {results['scan_time']:.2f} seconds!")
+        else:
+            st.error("Scan failed. Please check your credentials or try again later.")
 
 with col2:
     if st.button("Back to Dashboard"):
@@ -101,23 +148,8 @@ if results is not None:
         if not results['unread']:
             st.info("No unread emails found in the selected time range.")
         else:
-            sort_by = st.selectbox("Sort by:", ["Date (Newest first)", "Date (Oldest first)", "Sender", "Subject"])
-            sorted_emails = results['unread'].copy()
-
-            if sort_by == "Date (Newest first)":
-                sorted_emails.sort(key=lambda x: x.get('datetime') or datetime.min.replace(tzinfo=pytz.UTC), reverse=True)
-            elif sort_by == "Date (Oldest first)":
-                sorted_emails.sort(key=lambda x: x.get('date', ''))
-            elif sort_by == "Sender":
-                sorted_emails.sort(key=lambda x: x.get('sender', '').lower())
-            elif sort_by == "Subject":
-                sorted_emails.sort(key=lambda x: x.get('subject', '').lower())
-
-            for email in sorted_emails:
-                with st.expander(f"📧 {email['subject']}"):
-                    st.markdown(f"**From:** {email['sender']}")
-                    st.markdown(f"**Date:** {email['date']}")
-                    st.markdown(f"**Message ID:** {email['message_id']}")
+            sorted_emails = filter_emails(results['unread'], "unread")
+            render_email_table(sorted_emails, "unread")
 
     # SPAM TAB (formerly SPAM/JUNK TAB)
     with tab2:
@@ -137,11 +169,7 @@ if results is not None:
                     st.markdown(f"**{i+1}.** {email['subject']} - From: {email['sender']}")
 
             if st.checkbox(f"Show all spam email details"): # Updated text
-                for email in selected_emails:
-                    with st.expander(email['subject']):
-                        st.markdown(f"**From:** {email['sender']}")
-                        st.markdown(f"**Date:** {email['date']}")
-                        st.markdown(f"**Message ID:** {email['message_id']}")
+                render_email_table(filter_emails(selected_emails, "spam"), "spam")
 
         st.markdown("---")
         col1, col2 = st.columns(2)
@@ -158,6 +186,7 @@ if results is not None:
                         permanent = delete_mode == "Permanent Delete"
 
                         deleted_count = delete_emails(folder_key, selected_emails, results['folders'], permanent=permanent)
+                        invalidate_results()
                         st.success(f"Deleted {deleted_count} spam emails.") # Updated success message
 
                         st.session_state.confirm_delete = False
@@ -178,17 +207,8 @@ if results is not None:
         else:
             st.success(f"Found {len(trash_emails)} emails in Trash")
 
-            filter_term = st.text_input("🔍 Filter by sender or subject")
-            filtered = [
-                e for e in trash_emails
-                if filter_term.lower() in e['sender'].lower() or filter_term.lower() in e['subject'].lower()
-            ] if filter_term else trash_emails
-
-            for email in filtered:
-                with st.expander(email['subject']):
-                    st.markdown(f"**From:** {email['sender']}")
-                    st.markdown(f"**Date:** {email['date']}")
-                    st.markdown(f"**Message ID:** {email['message_id']}")
+            filtered = filter_emails(trash_emails, "trash")
+            render_email_table(filtered, "trash")
 
             st.markdown("---")
             col1, col2 = st.columns(2)
@@ -203,6 +223,7 @@ if results is not None:
                         with st.spinner(f"Deleting {len(trash_emails)} trash emails..."):
                             permanent = True  # Always permanent in Trash
                             deleted_count = delete_emails("trash", trash_emails, results['folders'], permanent=permanent)
+                            invalidate_results()
                             st.success(f"Permanently deleted {deleted_count} trash emails.")
                             st.session_state.confirm_delete = False
                             st.session_state.delete_folder = None
@@ -211,4 +232,78 @@ if results is not None:
                     if st.button("❌ Cancel", key="cancel_trash"):
                         st.session_state.confirm_delete = False
                         st.session_state.delete_folder = None
-                        st.rerun()
\ No newline at end of file
+                        st.rerun()
+
+# TOP SENDERS
+st.markdown("---")
+st.subheader("📊 Top Senders")
+st.caption("Find who is filling your mailbox: message count and size per sender across Inbox, Spam and Trash.")
+
+if st.button("📊 Analyze Mailbox Usage"):
+    usage, _ = get_cached_result("usage", days_back) if not fresh_scan else (None, None)
+    if usage is None:
+        with st.spinner("Measuring your mailbox..."):
+            try:
+                usage = scan_mailbox_usage(email_address, password, imap_server, days_back)
+            except CONNECTION_ERRORS:
+                usage = None
+        if usage:
+            cache_result("usage", days_back, usage)
+    if usage:
+        st.session_state.usage_results = usage
+    else:
+        st.error("Usage scan failed. Please check your credentials or try again later.")
+
+usage = st.session_state.get("usage_results")
+if usage:
+    index = usage['index']
+    st.info(f"{index.messages:,} emails, {index.bytes / 1e6:,.1f} MB (scanned in {usage['scan_time']:.1f}s)")
+    group_by = st.radio("Group by", ["Sender", "Domain"], horizontal=True)
+    rank_by = st.radio("Rank by", ["Size", "Count"], horizontal=True)
+    by = 'bytes' if rank_by == "Size" else 'count'
+    top = index.top_senders(25, by) if group_by == "Sender" else index.top_domains(25, by)
+
+    st.dataframe([
+        {
+            "Sender" if group_by == "Sender" else "Domain": s.name or s.key if group_by == "Sender" else s.key,
+            "Emails": s.count,
+            "Size (MB)": round(s.bytes / 1e6, 2),
+            "Oldest": s.oldest.strftime("%Y-%m-%d") if s.oldest else "",
+            "Newest": s.newest.strftime("%Y-%m-%d") if s.newest else "",
+        }
+        for s in top
+    ], width="stretch")
+
+    if top:
+        choice = st.selectbox("Delete everything from:", [s.key for s in top])
+        target = choice if group_by == "Sender" else "@" + choice
+        if st.button(f"🗑️ Delete all mail from {choice}", key="delete_sender"):
+            st.session_state.confirm_delete = True
+            st.session_state.delete_folder = f"sender:{target}"
+
+        if st.session_state.get("confirm_delete") and st.session_state.get("delete_folder") == f"sender:{target}":
+            delete_mode = st.session_state.get("delete_mode", "Move to Trash (Recommended)")
+            permanent = delete_mode == "Permanent Delete"
+            window = f"the last {usage['days_back']} days" if usage.get('days_back') else "all time"
+            st.warning(
+                f"{'Permanently delete' if permanent else 'Move to Trash'} all mail from {choice} "
+                f"received in {window}?"
+            )
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("✅ Confirm Delete", type="secondary", key="confirm_sender"):
+                    with st.spinner(f"Deleting mail from {choice}..."):
+                        deleted_count = delete_from_sender(
+                            usage['account'], target, usage['folders'], folders=list(usage['scanned']),
+                            permanent=permanent, days_back=usage.get('days_back')
+                        )
+                    st.success(f"Deleted {deleted_count} emails from {choice}.")
+                    invalidate_results()
+                    st.session_state.usage_results = None
+                    st.session_state.confirm_delete = False
+                    st.session_state.delete_folder = None
+            with col2:
+                if st.button("❌ Cancel", key="cancel_sender"):
+                    st.session_state.confirm_delete = False
+                    st.session_state.delete_folder = None
+                    st.rerun()
\ No newline at end of file
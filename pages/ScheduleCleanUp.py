@@ -1,15 +1,12 @@
 import streamlit as st
-import json
-import os
 import datetime
-from util import load_session_state
+from util import load_session_state, render_email_table
+from utilPolicy import run_cleanup
+from utilStore import get_state_store
 
-def save_schedule_to_json(email, schedule_config):
-    os.makedirs("config", exist_ok=True)
-    user_config_path = f"config/schedule_{email.replace('@', '_at_')}.json"
-    with open(user_config_path, "w") as f:
-        json.dump(schedule_config, f, indent=4)
-    return user_config_path
+def save_schedule(email, schedule_config):
+    """Store the config for the scheduler; saving an unchanged config writes nothing."""
+    return get_state_store().put_schedule(email, schedule_config)
 
 st.set_page_config(page_title="Schedule Clean Up", layout="wide", initial_sidebar_state="collapsed")
 load_session_state()
@@ -44,8 +41,14 @@ if enabled:
     # 🕒 Time Input
     schedule_time = st.text_input("⏰ Setup Schedule Time (24hr format, HH:MM)", value="21:00")
 
+    # 📮 Mail server
+    imap_server = st.text_input("📮 IMAP server", value=st.session_state.get("imap_server", "imap.gmail.com"))
+
     # 🟢 Run once today (optional override)
-    run_once = st.toggle("📅 Run once today (override regular schedule)", value=False)
+    run_once = st.toggle(
+        "📅 Run once today (override regular schedule)", value=False,
+        help="Runs at the time below instead of today's regular run. The regular schedule resumes tomorrow."
+    )
     run_once_time = None
     run_once_datetime_str = None
 
@@ -71,6 +74,7 @@ if enabled:
     # ✨ Separate Spam and Trash
     include_spam = st.checkbox("🗑️ Include Spam", value=False)
     move_to_trash = st.checkbox("♻️ Move to Trash instead of deleting permanently", value=False)
+    include_trash = False
     if not move_to_trash:
         include_trash = st.checkbox("🗂️ Include Trash", value=False)
 
@@ -86,6 +90,7 @@ if enabled:
         "email": email,
         "frequency": frequency,
         "time": schedule_time,
+        "imap_server": imap_server.strip() or "imap.gmail.com",
         "delete_options": internal_options,
         "enabled": enabled,
     }
@@ -98,8 +103,8 @@ if enabled:
         schedule_config["run_date"] = run_once_datetime_str
 
     # 💾 Save
-    path = save_schedule_to_json(email, schedule_config)
-    st.success(f"Saved schedule config to `{path}`")
+    save_schedule(email, schedule_config)
+    st.success("Saved your schedule.")
 
     # 📊 Preview
     st.markdown("### 📊 What Will Be Cleaned:")
@@ -110,6 +115,19 @@ if enabled:
     if include_trash:
         st.markdown("- 🧹 Trash")
 
+    # Same server-side searches the scheduled run uses; only the newest matches' headers are fetched
+    if st.button("🔎 Preview matching emails"):
+        with st.spinner("Searching your mailbox..."):
+            st.session_state.cleanup_preview = run_cleanup(
+                email, st.session_state.get("app_password"), schedule_config["imap_server"], internal_options,
+                preview=True
+            )
+        if st.session_state.cleanup_preview is None:
+            st.error("Could not search your mailbox. Please check the IMAP server and try again.")
+    for option, found in (st.session_state.get("cleanup_preview") or {}).items():
+        st.markdown(f"**{option}:** {found['count']:,} emails would be deleted")
+        render_email_table(found['sample'], f"preview_{option}")
+
     if run_once and run_once_datetime_str:
         st.info(f"One-time cleanup scheduled **today at {run_once_datetime_str[-5:]}**")
     elif frequency == "Custom":
@@ -123,9 +141,8 @@ else:
         "email": email,
         "enabled": False
     }
-    path = save_schedule_to_json(email, schedule_config)
+    save_schedule(email, schedule_config)
     st.warning("Scheduled cleanup is currently disabled. No cleanup will run.")
-    st.caption(f"(Saved config path: `{path}`)")
 
 # 🔙 Back button
 if st.button("Back to Clean Up Settings"):
@@ -1,89 +1,141 @@
 import os
-import json
+import sys
+import threading
+import concurrent.futures
 from datetime import datetime
-import pytz
-from utilClean import scan_all_fast, delete_emails
+from utilPolicy import run_cleanup
+from utilPool import close_all_pools, close_pool
+from utilSchedule import ScheduleStore, FireQueue, runs_on, run_once_at, TIMEZONE
+from utilStore import get_state_store
 
 def get_current_schedule_time():
-    now = datetime.now(pytz.timezone("Asia/Manila"))
+    now = datetime.now(TIMEZONE)
     return now.strftime("%H:%M"), now.strftime("%A"), now.day
 
-def load_all_schedules(config_dir="config"):
-    configs = []
-    for file in os.listdir(config_dir):
-        if file.startswith("schedule_") and file.endswith(".json"):
-            with open(os.path.join(config_dir, file), "r") as f:
-                configs.append(json.load(f))
-    return configs
+def load_all_schedules(store=None):
+    return list((store or get_state_store()).schedules().values())
 
-def clean_email(email, password, imap_server, delete_option, permanent=False):
-    print(f"Running cleanup for {email} - {delete_option}")
-    results = scan_all_fast(email, password, imap_server, days_back=30)
-
-    if not results:
-        print("Scan failed or returned no emails.")
+def clean_account(email, password, imap_server, delete_options, permanent=True):
+    """Run the selected options as server-side searches and bulk deletes (see utilPolicy)."""
+    print(f"Running cleanup for {email} - {', '.join(delete_options)}")
+    report = run_cleanup(email, password, imap_server, delete_options, permanent=permanent)
+    if report is None:
+        print("Cleanup failed: could not connect or search the mailbox.")
+        return
+    for delete_option, cleaned_count in report.items():
+        print(f"✅ {delete_option}: deleted {cleaned_count} emails for {email}")
+
+DEFAULT_IMAP_SERVER = "imap.gmail.com"
+ACCOUNT_WORKERS = 8  # accounts cleaned at once; utilPool's global cap bounds their connections
+
+def run_config(config):
+    """Run one schedule config now (password comes from the environment)."""
+    email = config["email"]
+    password = os.environ.get("EMAIL_PASSWORD_" + email.replace("@", "_at_"))
+    if not password:
+        print(f"⚠️ No password set for {email}. Skipping.")
         return
 
-    all_folders = results['folders']
-    cleaned_count = 0
-
-    if delete_option == "Unread Emails":
-        cleaned_count = delete_emails("INBOX", results["unread"], all_folders, permanent=True)
-
-    elif delete_option == "Old Emails":
-        all_old = []
-        for group in ['unread', 'spam', 'junk', 'trash']:
-            for e in results[group]:
-                if e['datetime'] and (datetime.now(pytz.timezone('Asia/Manila')) - e['datetime']).days > 30:
-                    all_old.append(e)
-        cleaned_count = delete_emails("INBOX", all_old, all_folders, permanent=True)
-
-    elif delete_option == "Spam":
-        cleaned_count = delete_emails("Spam", results["spam"], all_folders, permanent=True)
-
-    elif delete_option == "Trash":
-        cleaned_count = delete_emails("Trash", results["trash"], all_folders, permanent=True)
-    
-    elif delete_option == "Subscription Emails":
-        cleaned_count = delete_emails("INBOX", results["subscriptions"], all_folders, permanent=True)
-
-    print(f"✅ Deleted {cleaned_count} emails for {email}")
+    imap_server = config.get("imap_server") or DEFAULT_IMAP_SERVER
+    try:
+        clean_account(email, password, imap_server, config["delete_options"])
+    finally:
+        # Give this account's connections back to the global budget for the next one
+        close_pool(email, imap_server)
 
 def run_scheduled_cleanups():
     current_time, current_day, current_day_number = get_current_schedule_time()
     print(f"🕒 Running checks for {current_time} on {current_day}")
+    today = datetime.now(TIMEZONE).date()
 
     configs = load_all_schedules()
+    due = []
     for config in configs:
         if not config.get("enabled", False):  # 👈 Skip if disabled or missing
             print(f"🚫 Skipping {config['email']} – schedule disabled.")
             continue
 
+        once = run_once_at(config)
+        if once is not None and once.date() == today:
+            # The one-off run replaces today's regular run
+            if once.strftime("%H:%M") == current_time:
+                due.append(config)
+            else:
+                print(f"⏭️ {config['email']} – runs once today at {once:%H:%M} instead")
+            continue
+
         if config["time"] != current_time:
             print(f"⏭️ {config['email']} – not scheduled at {current_time}")
             continue
 
-        freq = config["frequency"]
-        should_run = (
-            freq == "Every day"
-            or (freq == "Every Monday" and current_day == "Monday")
-            or (freq == "Every 1st of the Month" and current_day_number == 1)
-            or (freq == "Custom" and current_day in config.get("custom_days", []))
-        )
-
-        if should_run:
-            email = config["email"]
-            password = os.environ.get("EMAIL_PASSWORD_" + email.replace("@", "_at_"))
-            if not password:
-                print(f"⚠️ No password set for {email}. Skipping.")
-                continue
-
-            imap_server = "imap.gmail.com"
-            for delete_option in config["delete_options"]:
-                clean_email(email, password, imap_server, delete_option)
+        if runs_on(config, today):
+            due.append(config)
         else:
             print(f"⏭️ {config['email']} – does not match frequency rule.")
 
+    with concurrent.futures.ThreadPoolExecutor(max_workers=ACCOUNT_WORKERS) as executor:
+        futures = {executor.submit(run_config, config): config["email"] for config in due}
+        for future in concurrent.futures.as_completed(futures):
+            if future.exception():
+                print(f"❌ Cleanup for {futures[future]} failed: {future.exception()}")
+
+    close_all_pools()
+
+# --- Daemon mode ---
+# One long-running process instead of an hourly cron: configs are loaded once and
+# reloaded on change, fire times come off a heap, and due jobs go to a bounded pool.
+
+DAEMON_WORKERS = ACCOUNT_WORKERS
+POLL_SECONDS = 30  # how often to look for config changes while waiting for the next fire
+
+def run_daemon(state_store=None, workers=DAEMON_WORKERS, poll=POLL_SECONDS, stop_event=None):
+    stop_event = stop_event or threading.Event()
+    store = ScheduleStore(state_store)
+    fire_queue = FireQueue()
+    running = {}  # account -> future; one run per config at a time
+
+    print(f"🕒 Scheduler daemon watching saved schedules with {workers} workers")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            while not stop_event.is_set():
+                now = datetime.now(TIMEZONE)
+                changed = store.refresh()
+                for account, config in changed.items():
+                    fire_queue.schedule(account, config, now)
+                if changed:
+                    print(f"🔁 Reloaded {len(changed)} config(s); {len(fire_queue)} scheduled")
+
+                for account, future in list(running.items()):
+                    if future.done():
+                        del running[account]
+                        if future.exception():
+                            print(f"❌ Cleanup for {account} failed: {future.exception()}")
+
+                while len(running) < workers:
+                    item = fire_queue.pop_due(now)
+                    if item is None:
+                        break
+                    account, fire = item
+                    config = store.configs.get(account)
+                    fire_queue.schedule(account, config, fire)
+                    if config is None:
+                        continue
+                    if account in running:
+                        print(f"⏭️ {account} is still running; skipping the {fire:%H:%M} run")
+                        continue
+                    running[account] = executor.submit(run_config, config)
+
+                next_due = fire_queue.next_due()
+                wait = poll if next_due is None else min(poll, max(0.0, (next_due - now).total_seconds()))
+                if len(running) >= workers:
+                    wait = min(wait, 1.0)  # a worker will free up soon; due jobs stay queued meanwhile
+                stop_event.wait(wait)
+        finally:
+            close_all_pools()
+
 # You can now schedule this with GitHub Actions
 if __name__ == "__main__":
-    run_scheduled_cleanups()
+    if "--daemon" in sys.argv[1:]:
+        run_daemon()
+    else:
+        run_scheduled_cleanups()
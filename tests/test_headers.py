@@ -0,0 +1,34 @@
+from utilCache import HeaderCache
+from utilClean import parse_header_items
+
+HEADERS = (
+    b'From: Shop <news@shop.example>\r\n'
+    b'Subject: Sale\r\n'
+    b'Date: Sat, 17 Oct 2026 10:00:00 +0800\r\n'
+    b'List-Unsubscribe: <mailto:u@shop.example>, <https://shop.example/u/1>\r\n'
+    b'List-Unsubscribe-Post: List-Unsubscribe=One-Click\r\n\r\n'
+)
+
+
+def fetch_item(uid, headers):
+    prefix = f'{uid} (UID {uid} INTERNALDATE "17-Oct-2026 10:00:00 +0800" RFC822.SIZE 2048 BODY[HEADER.FIELDS (FROM)] {{{len(headers)}}}'
+    return (prefix.encode(), headers)
+
+
+def test_list_headers_are_classified_in_the_header_pass():
+    plain = b'From: Alice <alice@mail.example>\r\nSubject: Lunch\r\n\r\n'
+    one_click, personal = parse_header_items([fetch_item(7, HEADERS), b')', fetch_item(8, plain), b')'])
+
+    assert (one_click.uid, one_click.bulk, one_click.unsubscribe, one_click.one_click) == \
+        ('7', True, 'https://shop.example/u/1', True)
+    assert (personal.bulk, personal.unsubscribe, personal.one_click) == (False, None, False)
+
+
+def test_header_cache_round_trips_list_fields(tmp_path):
+    cache = HeaderCache(str(tmp_path / 'headers.sqlite'))
+    records = parse_header_items([fetch_item(7, HEADERS), b')'])
+    cache.put('me@example.com', 'INBOX', 1, records)
+
+    cached = cache.get('me@example.com', 'INBOX', 1, ['7'])[7]
+    assert (cached.bulk, cached.unsubscribe, cached.one_click, cached.size) == \
+        (True, 'https://shop.example/u/1', True, 2048)
@@ -0,0 +1,11 @@
+from utilImap import gmail_query, quote_folder, quote_string
+
+
+def test_quote_string_escapes_a_leading_quote():
+    assert quote_string('"a\\b') == '"\\"a\\\\b"'
+    assert gmail_query('"from:x', 'is:unread') == 'X-GM-RAW "\\"from:x is:unread"'
+
+
+def test_quote_folder_keeps_names_list_returned_quoted():
+    assert quote_folder('"[Gmail]/Spam"') == '"[Gmail]/Spam"'
+    assert quote_folder('Old "Stuff"') == '"Old \\"Stuff\\""'
@@ -0,0 +1,30 @@
+from datetime import datetime
+
+import pytz
+
+from utilPolicy import POLICIES, SUBSCRIPTION_CRITERIA, Rule, compile_rule, plan_cleanup
+
+NOW = pytz.timezone('Asia/Manila').localize(datetime(2026, 10, 18, 9, 0))
+FOLDERS = ['INBOX', '[Gmail]/Spam', '[Gmail]/Trash', 'Receipts']
+
+
+def test_rules_compile_to_uid_search_criteria():
+    assert compile_rule(POLICIES["Old Emails"][0], NOW) == '(SEEN BEFORE 18-Sep-2026)'
+    assert compile_rule(POLICIES["Unread Emails"][0], NOW) == '(UNSEEN BEFORE 11-Oct-2026)'
+    assert compile_rule(POLICIES["Spam"][0], NOW) == 'ALL'
+    assert compile_rule(POLICIES["Subscription Emails"][0], NOW) == SUBSCRIPTION_CRITERIA
+    assert compile_rule(Rule(['INBOX'], sender='@shop.example'), NOW) == 'FROM "@shop.example"'
+
+
+def test_plan_touches_only_the_folders_each_option_names():
+    plan = plan_cleanup(["Spam", "Trash", "Old Emails", "No Such Option"], FOLDERS, NOW)
+    assert [(option, folder) for option, folder, _, _ in plan] == [
+        ("Spam", '[Gmail]/Spam'), ("Trash", '[Gmail]/Trash'), ("Old Emails", 'INBOX'),
+    ]
+
+
+def test_gmail_rules_match_list_mail_on_the_same_headers():
+    assert compile_rule(POLICIES["Subscription Emails"][0], gmail=True) == SUBSCRIPTION_CRITERIA
+    assert compile_rule(Rule(['INBOX'], seen=True, older_than=30, subscription=True), gmail=True) == \
+        f'(X-GM-RAW "is:read older_than:30d" {SUBSCRIPTION_CRITERIA})'
+    assert compile_rule(POLICIES["Spam"][0], gmail=True) == 'ALL'
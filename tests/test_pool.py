@@ -0,0 +1,133 @@
+import imaplib
+
+import utilPool
+from utilPool import IMAPPool
+
+
+class FakeConnection:
+    """Logs in fine; SELECT fails the way a dropped connection does."""
+
+    def __init__(self):
+        self.logged_out = False
+
+    def select(self, folder='INBOX', readonly=False):
+        raise imaplib.IMAP4.abort('socket error: [Errno 32] Broken pipe')
+
+    def noop(self):
+        return 'OK', [b'']
+
+    def close(self):
+        pass
+
+    def logout(self):
+        self.logged_out = True
+
+
+def free_global_slots():
+    return utilPool._global_slots._value
+
+
+def test_failed_select_releases_pool_and_global_slots():
+    connections = []
+
+    def connect(email_address, password, imap_server):
+        connections.append(FakeConnection())
+        return connections[-1]
+
+    pool = IMAPPool('me@example.com', 'pw', 'imap://127.0.0.1:1', connect, size=2)
+    before = free_global_slots()
+    for _ in range(5):
+        assert pool.acquire('Spam') is None
+
+    assert len(connections) == 5
+    assert all(conn.logged_out for conn in connections)
+    assert pool.open_count == 0
+    assert free_global_slots() == before
+    # The pool's own slots came back too: a working acquire does not block
+    assert pool._slots.acquire(blocking=False) and pool._slots.acquire(blocking=False)
+
+
+def test_failed_login_releases_global_slot():
+    pool = IMAPPool('me@example.com', 'pw', 'imap://127.0.0.1:1', lambda *args: None, size=2)
+    before = free_global_slots()
+    for _ in range(5):
+        assert pool.acquire() is None
+    assert pool.open_count == 0
+    assert free_global_slots() == before
+
+
+class RecordingConnection(FakeConnection):
+    def __init__(self):
+        super().__init__()
+        self.selected = []
+
+    def select(self, folder='INBOX', readonly=False):
+        self.selected.append(folder)
+        return 'OK', [b'3']
+
+
+def test_session_select_quotes_folder_names():
+    conn = RecordingConnection()
+    session = utilPool.IMAPSession(conn)
+    assert session.select('Deleted Items')[0] == 'OK'
+    assert session.select('Deleted Items')[0] == 'OK'  # already selected: no second SELECT
+    assert conn.selected == ['"Deleted Items"']
+    assert session.folder == 'Deleted Items'
+
+
+class LiveConnection(RecordingConnection):
+    def __init__(self, *args):
+        super().__init__()
+
+
+def test_pool_is_replaced_only_once_nothing_is_checked_out():
+    before = free_global_slots()
+    pool = utilPool.get_pool('swap@example.com', 'pw', 'imap://127.0.0.1:1', LiveConnection, size=1)
+    session = pool.acquire()
+
+    assert utilPool.get_pool('swap@example.com', 'pw', 'imap://127.0.0.1:1', LiveConnection, size=4) is pool
+    pool.release(session)
+    bigger = utilPool.get_pool('swap@example.com', 'pw', 'imap://127.0.0.1:1', LiveConnection, size=4)
+    assert bigger is not pool and bigger.size == 4
+    assert session.conn.logged_out and free_global_slots() == before
+    utilPool.close_pool('swap@example.com', 'imap://127.0.0.1:1')
+
+
+def test_closing_a_busy_pool_logs_sessions_out_when_they_come_back():
+    before = free_global_slots()
+    pool = IMAPPool('me@example.com', 'pw', 'imap://127.0.0.1:1', LiveConnection, size=2)
+    session = pool.acquire()
+    pool.close()
+    assert free_global_slots() == before - 1
+
+    pool.release(session)
+    assert session.conn.logged_out and pool.open_count == 0
+    assert free_global_slots() == before
+
+
+def test_ui_user_scans_share_the_adopted_login_connection():
+    from utilSession import SessionManager
+
+    logins = []
+
+    def connect(*args):
+        logins.append(LiveConnection())
+        return logins[-1]
+
+    manager = SessionManager(connect, sweep_every=3600)
+    login_conn = LiveConnection()
+    manager.adopt('ui@example.com', 'pw', 'imap://127.0.0.1:1', login_conn)
+    # A page scan asks for the provider's full budget but gets the user's one connection
+    pool = utilPool.get_pool('ui@example.com', 'pw', 'imap://127.0.0.1:1', connect, size=5)
+    assert pool.size == 1
+    with pool.session() as mail:
+        assert mail.conn is login_conn
+    with manager.connection('ui@example.com', 'pw', 'imap://127.0.0.1:1') as mail:
+        assert mail.conn is login_conn
+    assert logins == []
+
+    manager.logout('ui@example.com', 'imap://127.0.0.1:1')
+    assert login_conn.logged_out
+    assert utilPool.get_pool('ui@example.com', 'pw', 'imap://127.0.0.1:1', connect, size=5).size == 5
+    utilPool.close_pool('ui@example.com', 'imap://127.0.0.1:1')
+    manager.close()
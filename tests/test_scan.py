@@ -0,0 +1,46 @@
+import imaplib
+
+import pytest
+
+from utilClean import from_sender, plan_folder
+from utilRecords import EmailRecord
+
+
+class FakeMail:
+    def __init__(self, search):
+        self.search = search
+
+    def select(self, folder='INBOX', readonly=False):
+        return 'OK', [b'2']
+
+    def uid(self, command, *args):
+        return self.search()
+
+
+def test_folder_the_server_rejects_is_skipped():
+    def bad():
+        raise imaplib.IMAP4.error('UID command error: BAD [b"Could not parse command"]')
+
+    assert plan_folder(FakeMail(bad), 'trash', 'Deleted Items', 'ALL') is None
+    assert plan_folder(FakeMail(lambda: ('NO', [b'SEARCH failed'])), 'trash', 'Trash', 'ALL') is None
+
+
+def test_dropped_connection_still_fails_the_scan():
+    def dropped():
+        raise imaplib.IMAP4.abort('socket error: EOF')
+
+    with pytest.raises(imaplib.IMAP4.abort):
+        plan_folder(FakeMail(dropped), 'spam', 'Spam', 'ALL')
+
+
+def test_plan_folder_returns_searched_uids_in_order():
+    job = plan_folder(FakeMail(lambda: ('OK', [b'10 2 3'])), 'spam', 'Spam', 'ALL')
+    assert list(job.pending) == [b'2', b'3', b'10'] and job.total == 3
+
+
+def test_from_sender_matches_whole_addresses_and_domains_only():
+    records = [EmailRecord(str(uid), 's', sender, '', '', None) for uid, sender in enumerate([
+        'Shop <deals@shop.com>', 'Shop <news@shop.company.com>', 'DEALS@SHOP.COM', 'x@myshop.com',
+    ])]
+    assert [r.uid for r in from_sender(records, '@shop.com')] == ['0', '2']
+    assert [r.uid for r in from_sender(records, 'deals@shop.com')] == ['0', '2']
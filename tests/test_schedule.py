@@ -0,0 +1,14 @@
+from datetime import datetime
+
+from utilSchedule import next_fire_time, TIMEZONE
+
+
+def test_run_once_replaces_that_days_regular_run():
+    config = {'enabled': True, 'frequency': 'Every day', 'time': '21:00',
+              'run_once': True, 'run_date': '2026-10-18 10:30'}
+    after = TIMEZONE.localize(datetime(2026, 10, 18, 8, 0))
+
+    once = next_fire_time(config, after)
+    assert once == TIMEZONE.localize(datetime(2026, 10, 18, 10, 30))
+    # No 21:00 run that day; the regular schedule resumes the next day
+    assert next_fire_time(config, once) == TIMEZONE.localize(datetime(2026, 10, 19, 21, 0))
@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta, timezone
+
+from utilRecords import EmailRecord
+from utilSearch import EmailIndex
+
+START = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def record(uid, sender, subject, days, folder='INBOX'):
+    return EmailRecord(str(uid), subject, sender, '', '', START + timedelta(days=days), 1000, folder)
+
+
+def build():
+    return EmailIndex([
+        record(1, 'Shop <deals@shop.example>', 'Weekend sale', 0),
+        record(2, 'Alice <alice@mail.example>', 'Lunch on Friday?', 1),
+        record(3, 'Shop <news@shop.example>', 'Your order shipped', 2, folder='Spam'),
+        record(4, 'Bob <bob@mail.example>', 'Re: weekend plans', 3),
+    ])
+
+
+def test_text_domain_and_folder_filters_intersect():
+    index = build()
+    assert list(index.search(text='weekend')) == [3, 0]
+    assert list(index.search(domain='@shop.example')) == [2, 0]
+    assert list(index.search(domain='shop.example', folder='Spam')) == [2]
+    assert list(index.search(sender='shi', prefix=True)) == []
+    assert list(index.search(text='ship', prefix=True)) == [2]
+
+
+def test_sort_orders_and_datetime_range():
+    index = build()
+    assert list(index.order('oldest')) == [0, 1, 2, 3]
+    assert list(index.search(sort='sender')) == [1, 3, 0, 2]
+    assert list(index.search(since=START + timedelta(days=1), until=START + timedelta(days=2), sort='oldest')) == [1, 2]
+
+
+def test_date_range_uses_manila_calendar_days():
+    # 2026-03-01 20:00 UTC is already 2 March in Manila (UTC+8)
+    index = EmailIndex([
+        EmailRecord('1', 'late', 'a@x.example', '', '', datetime(2026, 3, 1, 15, 59, tzinfo=timezone.utc), 1, 'INBOX'),
+        EmailRecord('2', 'next day', 'b@x.example', '', '', datetime(2026, 3, 1, 20, 0, tzinfo=timezone.utc), 1, 'INBOX'),
+    ])
+    march_2 = START.date() + timedelta(days=1)
+    assert list(index.search(since=march_2, until=march_2)) == [1]
+    assert list(index.search(until=START.date())) == [0]
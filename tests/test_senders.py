@@ -0,0 +1,19 @@
+from utilRecords import EmailRecord
+from utilSenders import SenderIndex
+
+
+def record(sender, size):
+    return EmailRecord('1', 'subject', sender, '', '', None, size)
+
+
+def test_large_sender_with_few_messages_survives_eviction_when_ranked_by_size():
+    index = SenderIndex(address_capacity=3, domain_capacity=3)
+    index.add(record('big@attachments.example', 40_000_000))
+    for n in range(50):
+        for _ in range(5):
+            index.add(record(f'alert{n}@alerts{n}.example', 1_000))
+
+    assert index.top_senders(1, by='bytes')[0].key == 'big@attachments.example'
+    assert index.top_domains(1, by='bytes')[0].key == 'attachments.example'
+    assert index.top_senders(1, by='count')[0].count >= 5
+    assert index.messages == 251
@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+from utilStore import StateStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # legacy JSON files are looked up relative to the working directory
+    return StateStore(str(tmp_path / 'state.sqlite'))
+
+
+def test_unsubscribed_senders_are_per_account(store):
+    store.add_unsubscribed('me@example.com', ['news@shop.example', 'news@shop.example', ''])
+    store.add_unsubscribed('you@example.com', ['deals@shop.example'])
+
+    assert store.unsubscribed('me@example.com') == {'news@shop.example'}
+    assert store.is_unsubscribed('you@example.com', 'deals@shop.example')
+    assert not store.is_unsubscribed('me@example.com', 'deals@shop.example')
+
+
+def test_schedule_versions_only_move_on_real_changes(store):
+    config = {'email': 'me@example.com', 'enabled': True, 'time': '21:00'}
+    assert store.put_schedule('me@example.com', config)
+    assert not store.put_schedule('me@example.com', dict(config))
+    version, changed = store.schedules_since(0)
+    assert changed == {'me@example.com': config}
+
+    assert store.delete_schedule('me@example.com')
+    latest, changed = store.schedules_since(version)
+    assert latest > version and changed == {'me@example.com': None}
+    assert store.schedules() == {}
+
+
+def test_legacy_json_files_are_imported_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'storage' / 'unsubscribed').mkdir(parents=True)
+    (tmp_path / 'storage' / 'unsubscribed' / 'me_at_example_dot_com.json').write_text(json.dumps(['a@b.example']))
+    (tmp_path / 'config').mkdir()
+    (tmp_path / 'config' / 'schedule_me.json').write_text(json.dumps({'email': 'me@example.com', 'time': '08:00'}))
+
+    store = StateStore(str(tmp_path / 'state.sqlite'))
+    assert store.unsubscribed('me@example.com') == {'a@b.example'}
+    assert store.get_schedule('me@example.com')['time'] == '08:00'
+
+    (tmp_path / 'config' / 'schedule_me.json').write_text(json.dumps({'email': 'me@example.com', 'time': '09:00'}))
+    assert StateStore(str(tmp_path / 'state.sqlite')).get_schedule('me@example.com')['time'] == '08:00'
@@ -0,0 +1,32 @@
+from utilImap import AdaptiveBatcher, compress_uids, uid_ranges, uid_set_batches
+
+
+def expand(uid_set):
+    uids = []
+    for part in uid_set.split(','):
+        first, _, last = part.partition(':')
+        uids.extend(range(int(first), int(last or first) + 1))
+    return uids
+
+
+def test_compress_uids_collapses_runs_and_accepts_bytes():
+    assert compress_uids([b'9', b'1', b'2', b'3', b'7', b'10', b'2']) == '1:3,7,9:10'
+    assert uid_ranges(['5']) == [[5, 5]]
+
+
+def test_uid_set_batches_respect_count_and_length_limits():
+    uids = list(range(1, 12001)) + list(range(20000, 40000, 2))
+    batches = list(uid_set_batches(uids, max_count=5000, max_length=1000))
+
+    assert all(len(expand(b)) <= 5000 and len(b) <= 1000 for b in batches)
+    assert [uid for b in batches for uid in expand(b)] == uids
+
+
+def test_adaptive_batcher_grows_when_fast_and_halves_when_slow():
+    batcher = AdaptiveBatcher(initial=20, minimum=10, maximum=80)
+    batcher.record(20, 0.1, 1000)
+    assert batcher.next_size() == 40
+    batcher.record(5, 10.0, 1000)  # a short tail batch is ignored
+    assert batcher.next_size() == 40
+    batcher.record(40, 10.0, 1000)
+    assert batcher.next_size() == 20
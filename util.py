@@ -4,11 +4,18 @@ import base64
 import json
 import os
 import re
-from bs4 import BeautifulSoup
+from contextlib import contextmanager
+import html as html_lib
+import quopri
+from email.utils import parseaddr
 import streamlit as st
+from utilClean import create_connection
+from utilSession import SessionManager
+from utilStore import get_state_store
+from utilImap import find_bodystructure, body_parts
 
 SESSION_FILE = "session.json"
-UNSUB_DIR = os.path.join("storage", "unsubscribed")
+IMAP_SERVER = "imap.gmail.com"
 
 # --- Saves which emails you Unsub from ---
 def is_valid_email(email):
@@ -16,9 +23,11 @@ def is_valid_email(email):
 
 def handle_login(email, password):
     """Handle IMAP login and session storage."""
+    mail = imaplib.IMAP4_SSL(IMAP_SERVER)
     try:
-        mail = imaplib.IMAP4_SSL('imap.gmail.com')
         mail.login(email, password)
+        # The pages reuse this connection instead of logging in again
+        get_session_manager().adopt(email, password, IMAP_SERVER, mail)
 
         # Set Streamlit session state
         st.session_state.logged_in = True
@@ -35,109 +44,160 @@ def handle_login(email, password):
         return True, f"Logged in as {email}!", mail
 
     except imaplib.IMAP4.error as e:
+        try:
+            mail.shutdown()
+        except Exception:
+            pass
         return False, f"Login failed: {e}", None
     
-def _get_user_file(email):
-    os.makedirs(UNSUB_DIR, exist_ok=True)
-    safe_email = email.replace("@", "_at_").replace(".", "_dot_")
-    return os.path.join(UNSUB_DIR, f"{safe_email}.json")
-
 def load_unsubscribed_emails(email):
-    path = _get_user_file(email)
-    try:
-        with open(path, "r") as f:
-            return set(json.load(f))
-    except (FileNotFoundError, json.JSONDecodeError):
-        return set()
+    return get_state_store().unsubscribed(email)
 
 def save_unsubscribed_email(user_email, target_email):
-    unsubscribed = load_unsubscribed_emails(user_email)
-    unsubscribed.add(target_email)
-    with open(_get_user_file(user_email), "w") as f:
-        json.dump(list(unsubscribed), f)
+    get_state_store().add_unsubscribed(user_email, [target_email])
 
 # --- Unsub from emails ---
-def extract_unsubscribe_link(msg):
-    """
-    Extract unsubscribe link and type ('http' or 'mailto') from an email.message.Message object.
-    Returns tuple (type, link) or (None, None) if not found.
-    """
-    keywords = [
-        'unsubscribe', 'subscription', 'optout', 'notifications',
-        'abmelden', 'désabonnement', 'cancel', 'manage preferences'
-    ]
-    unsubscribe_link = None
-    unsubscribe_type = None
-
-    def check_text_for_mailto(text):
-        mailtos = re.findall(r'(mailto:\S+)', text, re.I)
-        for mailto in mailtos:
-            if any(kw in mailto.lower() for kw in keywords):
-                return 'mailto', mailto
-        return None, None
-
-    def check_html_for_link(html):
-        soup = BeautifulSoup(html, 'html.parser')
-        anchors = soup.find_all('a')
-        for a in anchors:
-            href = a.get('href', '')
-            if href:
-                href_lower = href.lower()
-                text_lower = a.get_text(strip=True).lower()
-                if any(kw in href_lower for kw in keywords) or any(kw in text_lower for kw in keywords):
-                    if href_lower.startswith('mailto:'):
-                        return 'mailto', href
-                    elif href_lower.startswith('http'):
-                        return 'http', href
-                    else:
-                        return 'unknown', href
-        return None, None
-
-    if msg.is_multipart():
-        for part in msg.walk():
-            content_type = part.get_content_type()
-            payload = part.get_payload(decode=True)
-
-            if not payload:
-                continue
+UNSUBSCRIBE_KEYWORDS = [
+    'unsubscribe', 'subscription', 'optout', 'notifications',
+    'abmelden', 'désabonnement', 'cancel', 'manage preferences'
+]
+# Precompiled scanners: one regex pass over the markup instead of a BeautifulSoup tree
+KEYWORD_RE = re.compile('|'.join(re.escape(kw) for kw in UNSUBSCRIBE_KEYWORDS), re.I)
+ANCHOR_RE = re.compile(
+    r'<a\b[^>]*?\bhref\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))[^>]*>(.*?)</a\s*>', re.I | re.S
+)
+TAG_RE = re.compile(r'<[^>]+>')
+MAILTO_RE = re.compile(r'(mailto:\S+)', re.I)
+TAIL_BYTES = 16384
 
-            try:
-                content = payload.decode('utf-8', errors='ignore')
-            except Exception:
-                content = str(payload)
+def find_mailto_link(text):
+    for mailto in MAILTO_RE.findall(text):
+        if KEYWORD_RE.search(mailto):
+            return 'mailto', mailto
+    return None, None
 
-            if content_type == 'text/html':
-                unsubscribe_type, unsubscribe_link = check_html_for_link(content)
-            elif content_type == 'text/plain':
-                unsubscribe_type, unsubscribe_link = check_text_for_mailto(content)
+def find_html_link(html):
+    for match in ANCHOR_RE.finditer(html):
+        href = html_lib.unescape(match.group(1) or match.group(2) or match.group(3) or '').strip()
+        if not href:
+            continue
+        text = ' '.join(html_lib.unescape(TAG_RE.sub('', match.group(4))).split())
+        if KEYWORD_RE.search(href) or KEYWORD_RE.search(text):
+            href_lower = href.lower()
+            if href_lower.startswith('mailto:'):
+                return 'mailto', href
+            elif href_lower.startswith('http'):
+                return 'http', href
+            else:
+                return 'unknown', href
+    return None, None
 
-            if unsubscribe_link:
-                return unsubscribe_type, unsubscribe_link
+def decode_part(data, encoding, charset, partial=False):
+    """Decode a (possibly truncated) MIME part body fetched with BODY.PEEK[n]<offset.len>."""
+    if encoding == 'base64':
+        if partial:
+            data = data.split(b'\n', 1)[-1]  # resync on a line boundary
+        compact = re.sub(rb'[^A-Za-z0-9+/]', b'', data)
+        data = base64.b64decode(compact[:len(compact) // 4 * 4])
+    elif encoding == 'quoted-printable':
+        data = quopri.decodestring(data)
+    try:
+        return data.decode(charset, errors='ignore')
+    except LookupError:
+        return data.decode('utf-8', errors='ignore')
 
-    else:
-        payload = msg.get_payload(decode=True)
-        if payload:
-            try:
-                text = payload.decode('utf-8', errors='ignore')
-            except Exception:
-                text = str(payload)
-            return check_text_for_mailto(text)
+def fetch_unsubscribe_link(mail, uid):
+    """
+    Unsubscribe link of one message without downloading all of it: BODYSTRUCTURE picks the
+    HTML (then plain text) part and only its last TAIL_BYTES are fetched, since that is where
+    footers keep the link. The whole part is fetched only if the tail has nothing.
+    """
+    typ, data = mail.uid('FETCH', uid, '(BODYSTRUCTURE)')
+    structure = find_bodystructure(data) if typ == 'OK' and data else None
+    parts = body_parts(structure) if structure else []
+    candidates = [p for p in parts if p['type'] == 'text/html'] + [p for p in parts if p['type'] == 'text/plain']
 
+    for part in candidates[:2]:
+        scan = find_html_link if part['type'] == 'text/html' else find_mailto_link
+        offset = max(0, part['size'] - TAIL_BYTES)
+        for start in ([offset, 0] if offset else [0]):
+            item = f"BODY.PEEK[{part['section']}]" + (f'<{start}.{TAIL_BYTES}>' if start else '')
+            typ, data = mail.uid('FETCH', uid, f'({item})')
+            body = next((d[1] for d in data or [] if isinstance(d, tuple)), None) if typ == 'OK' else None
+            if not body:
+                continue
+            found = scan(decode_part(body, part['encoding'], part['charset'], partial=start > 0))
+            if found[1]:
+                return found
     return None, None
 
+# --- Find subscriptions ---
+def subscription_senders(emails, unsubscribed_emails=()):
+    """
+    Group the records of a scan's 'subscriptions' and 'unsubscribe_mentions' groups by sender:
+    {name, email, unsub_type, unsub_link, one_click}. Each entry also keeps the UID of the sender's latest message for fill_unsubscribe_links.
+    """
+    senders = {}
+    for e in sorted(emails, key=lambda e: int(e['uid'] or 0)):  # later messages win
+        name, sender_email = parseaddr(e['sender'] or '')
+        if not sender_email or sender_email in unsubscribed_emails:
+            continue
+        entry = senders.get(sender_email)
+        if entry is None:
+            entry = senders[sender_email] = {
+                "name": name or sender_email,
+                "email": sender_email,
+                "unsub_type": None,
+                "unsub_link": None,
+                "one_click": False,
+                "uid": None,
+            }
+        entry["uid"] = e['uid']
+        if e['unsubscribe']:
+            entry["unsub_type"] = 'http' if e['unsubscribe'].lower().startswith('http') else 'mailto'
+            entry["unsub_link"] = e['unsubscribe']
+            entry["one_click"] = e['one_click']
+    return list(senders.values())
+
+def fill_unsubscribe_links(mail, subscriptions, folder="INBOX"):
+    """Look in the latest message body of senders whose list headers carried no unsubscribe link."""
+    missing = [entry for entry in subscriptions if not entry["unsub_link"] and entry.get("uid")]
+    if missing and mail.select(folder, readonly=True)[0] == 'OK':
+        for entry in missing:
+            entry["unsub_type"], entry["unsub_link"] = fetch_unsubscribe_link(mail, entry["uid"])
+    return subscriptions
+
 # --- Connect to IMAP ---
-def get_imap_connection():
+@st.cache_resource
+def get_session_manager():
+    """One SessionManager per server process, shared by every browser session and rerun."""
+    return SessionManager(create_connection)
+
+@contextmanager
+def imap_session():
+    """This user's logged-in connection, held so another tab of the same user waits; None if there is none."""
     email = st.session_state.get("email")
     password = st.session_state.get("app_password")
     if not (email and password):
-        return None
-    try:
-        mail = imaplib.IMAP4_SSL('imap.gmail.com')
-        mail.login(email, password)
-        return mail
-    except Exception as e:
-        st.error(f"IMAP login failed: {e}")
-        return None
+        yield None
+        return
+    with get_session_manager().connection(email, password, IMAP_SERVER) as mail:
+        yield mail
+
+# --- Cached scan results ---
+def scan_result_key(include_trash):
+    """Cache key of a full scan; the Scan and Subscriptions pages share the result."""
+    return "unread+spam+trash" if include_trash else "unread+spam"
+
+def get_cached_result(folder, window=None):
+    """(result, age in seconds) of this user's last scan of `folder` over `window`, or (None, None)."""
+    return get_session_manager().get_result(st.session_state.get("email"), IMAP_SERVER, folder, window)
+
+def cache_result(folder, window, value):
+    get_session_manager().put_result(st.session_state.get("email"), IMAP_SERVER, folder, window, value)
+
+def invalidate_results(folder=None):
+    get_session_manager().invalidate(st.session_state.get("email"), IMAP_SERVER, folder)
 
 # --- Session Utilities ---
 def save_session(data: dict):
@@ -150,12 +210,108 @@ def load_session_state():
             data = json.load(f)
             for key, value in data.items():
                 st.session_state[key] = value
+    email = st.session_state.get("email")
+    password = st.session_state.get("app_password")
+    if st.session_state.get("logged_in") and email and password:
+        # Registers the user (and keeps them active), so this page's scans and deletes
+        # share their one connection instead of opening a pool of their own
+        get_session_manager().session(email, password, IMAP_SERVER)
 
 def clear_session():
     if os.path.exists(SESSION_FILE):
         os.remove(SESSION_FILE)
 
+def logout():
+    """Close the user's IMAP sessions, drop their cached results and forget the saved login."""
+    email = st.session_state.get("email")
+    if email:
+        get_session_manager().logout(email, IMAP_SERVER)
+    for key in ("logged_in", "email", "app_password", "scan_results", "usage_results", "subscriptions"):
+        st.session_state.pop(key, None)
+    clear_session()
+
 # --- Optional UI tools ---
+PAGE_SIZES = [25, 50, 100, 250]
+SORT_OPTIONS = {
+    "Date (Newest first)": "newest",
+    "Date (Oldest first)": "oldest",
+    "Sender": "sender",
+    "Subject": "subject",
+}
+
+def filter_emails(emails, key):
+    """
+    Search, filter and sort controls for one result list. Answered from the list's
+    EmailIndex (built once per scan), so typing in the box does not rescan every message.
+    """
+    index = emails.index
+    col1, col2 = st.columns([2, 1])
+    text = col1.text_input("🔍 Filter by sender or subject", key=f"{key}_filter")
+    sort_by = col2.selectbox("Sort by:", list(SORT_OPTIONS), key=f"{key}_sort")
+
+    with st.expander("More filters"):
+        col1, col2, col3 = st.columns(3)
+        match = col1.radio("Match", ["Anywhere", "Start of a word"], horizontal=True, key=f"{key}_match")
+        domain = col2.selectbox("Sender domain", [""] + sorted(d for d in index.domains if d), key=f"{key}_domain")
+        folders = sorted(f for f in index.folders if f)
+        folder = col3.selectbox("Folder", [""] + folders, key=f"{key}_folder") if len(folders) > 1 else ""
+        dates = st.date_input("Date range", value=(), key=f"{key}_dates")
+
+    return emails.search(
+        text=text.strip() or None,
+        domain=domain or None,
+        folder=folder or None,
+        since=dates[0] if len(dates) > 0 else None,
+        until=dates[1] if len(dates) > 1 else None,
+        sort=SORT_OPTIONS[sort_by],
+        prefix=match == "Start of a word",
+    )
+
+
+def render_email_table(emails, key):
+    """
+    One page of `emails` as a table, with details for the row the user selects. Only the
+    current page is turned into rows, so a rerun costs the same for 50 or 50,000 results.
+    Returns the selected email, or None.
+    """
+    total = len(emails)
+    if not total:
+        return None
+    col1, col2, col3 = st.columns([1, 1, 2], vertical_alignment="bottom")
+    page_size = col1.selectbox("Rows per page", PAGE_SIZES, key=f"{key}_page_size")
+    pages = (total + page_size - 1) // page_size
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages  # the result shrank (filter, delete) under the current page
+    page = col2.number_input("Page", min_value=1, max_value=pages, key=f"{key}_page")
+    start = (page - 1) * page_size
+    rows = emails[start:start + page_size]
+    col3.caption(f"Showing {start + 1:,}–{start + len(rows):,} of {total:,}")
+
+    table = {
+        "Date": [e['datetime'].strftime("%Y-%m-%d %H:%M") if e['datetime'] else e['date'] for e in rows],
+        "From": [e['sender'] for e in rows],
+        "Subject": [e['subject'] for e in rows],
+    }
+    event = st.dataframe(
+        table, key=f"{key}_table", on_select="rerun", selection_mode="single-row",
+        hide_index=True, width="stretch"
+    )
+    selected = event.selection.rows if event else []
+    if not selected or selected[0] >= len(rows):
+        return None
+    email = rows[selected[0]]
+    with st.container(border=True):
+        st.markdown(f"**Subject:** {email['subject']}")
+        st.markdown(f"**From:** {email['sender']}")
+        st.markdown(f"**Date:** {email['date']}")
+        st.markdown(f"**Message ID:** {email['message_id']}")
+        if email.get('size'):
+            st.markdown(f"**Size:** {email['size'] / 1024:,.1f} KB")
+        if email.get('labels'):
+            labels = ', '.join(label.lstrip('\\') for label in email['labels'])
+            st.markdown(f"**Labels:** {labels}")
+    return email
+
 def load_css(path):
     css_path = pathlib.Path(path)
     with open(css_path) as f:
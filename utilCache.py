@@ -0,0 +1,165 @@
+import os
+import threading
+from datetime import datetime
+
+from utilRecords import EmailRecord
+from utilStore import connect
+
+# --- Persistent header cache ---
+# Headers never change for a given (account, folder, UIDVALIDITY, UID), so once a message
+# has been fetched it never has to be fetched again. Scans ask the server which UIDs match
+# (cheap: just numbers) and only download headers for UIDs the cache has not seen, which in
+# steady state means the ones at or above the UIDNEXT recorded by the previous scan.
+
+CACHE_PATH = os.path.join("storage", "header_cache.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS folder_state (
+    account TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    uidvalidity INTEGER NOT NULL,
+    uidnext INTEGER,
+    highestmodseq INTEGER,  -- unused: flags are not cached, so CONDSTORE has nothing to re-sync
+    messages INTEGER,
+    PRIMARY KEY (account, folder)
+);
+CREATE TABLE IF NOT EXISTS headers (
+    account TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    uidvalidity INTEGER NOT NULL,
+    uid INTEGER NOT NULL,
+    subject TEXT,
+    sender TEXT,
+    date TEXT,
+    message_id TEXT,
+    datetime TEXT,
+    size INTEGER,
+    bulk INTEGER,
+    unsubscribe TEXT,
+    one_click INTEGER,
+    gm_msgid INTEGER,
+    PRIMARY KEY (account, folder, uidvalidity, uid)
+) WITHOUT ROWID;
+"""
+
+
+class HeaderCache:
+    def __init__(self, path=CACHE_PATH):
+        # WAL, like the state store: the pages and the scheduler can scan at the same time
+        self._db = connect(path)
+        self._db.executescript(SCHEMA)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(headers)")}
+        # Caches created before sizes and list headers were fetched
+        for column, kind in (('size', 'INTEGER'), ('bulk', 'INTEGER'), ('unsubscribe', 'TEXT'), ('one_click', 'INTEGER'),
+                             ('gm_msgid', 'INTEGER')):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE headers ADD COLUMN {column} {kind}")
+        self._lock = threading.Lock()
+
+    def sync_folder(self, account, folder, status):
+        """
+        Record the folder's current STATUS and return (uidvalidity, changed, stale_rows).
+        `changed` is False when UIDNEXT and MESSAGES match the previous scan, i.e. nothing was
+        added or expunged. A new UIDVALIDITY invalidates every cached header.
+        """
+        uidvalidity = status['uidvalidity']
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT uidvalidity, uidnext, highestmodseq, messages FROM folder_state WHERE account=? AND folder=?",
+                (account, folder)
+            ).fetchone()
+            if row and row[0] != uidvalidity:
+                self._db.execute("DELETE FROM headers WHERE account=? AND folder=?", (account, folder))
+                row = None
+            changed = not row or row[1] != status.get('uidnext') or row[3] != status.get('messages')
+            cached = self._db.execute(
+                "SELECT COUNT(*) FROM headers WHERE account=? AND folder=? AND uidvalidity=?",
+                (account, folder, uidvalidity)
+            ).fetchone()[0]
+            self._db.execute(
+                "INSERT OR REPLACE INTO folder_state VALUES (?, ?, ?, ?, ?, ?)",
+                (account, folder, uidvalidity, status.get('uidnext'), None, status.get('messages'))
+            )
+        stale = max(0, cached - status.get('messages', cached))
+        return uidvalidity, changed, stale
+
+    def get(self, account, folder, uidvalidity, uids):
+        """Cached records for the given UIDs, keyed by int UID."""
+        found = {}
+        for hits in self.iter_get(account, folder, uidvalidity, uids):
+            found.update(hits)
+        return found
+
+    def iter_get(self, account, folder, uidvalidity, uids):
+        """Like get, one dict per batch of 500 UIDs, for callers that do not keep the records."""
+        uids = [int(u) for u in uids]
+        for i in range(0, len(uids), 500):
+            batch = uids[i:i + 500]
+            found = {}
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT uid, subject, sender, date, message_id, datetime, size, bulk, unsubscribe, one_click, gm_msgid "
+                    "FROM headers "
+                    # Rows cached before sizes and list headers were fetched count as misses, so they get refetched once
+                    "WHERE account=? AND folder=? AND uidvalidity=? AND size IS NOT NULL AND bulk IS NOT NULL "
+                    "AND one_click IS NOT NULL "
+                    f"AND uid IN ({','.join('?' * len(batch))})",
+                    (account, folder, uidvalidity, *batch)
+                ).fetchall()
+            for uid, subject, sender, date, message_id, dt, size, bulk, unsubscribe, one_click, gm_msgid in rows:
+                found[uid] = EmailRecord(
+                    str(uid), subject, sender, date, message_id, datetime.fromisoformat(dt) if dt else None, size,
+                    bulk=bool(bulk), unsubscribe=unsubscribe, one_click=bool(one_click), gm_msgid=gm_msgid
+                )
+            yield found
+
+    def put(self, account, folder, uidvalidity, records):
+        rows = [
+            (account, folder, uidvalidity, int(r['uid']), r['subject'], r['sender'], r['date'],
+             r['message_id'], r['datetime'].isoformat() if r.get('datetime') else None, r.get('size'),
+             int(bool(r.get('bulk'))), r.get('unsubscribe'), int(bool(r.get('one_click'))), r.get('gm_msgid'))
+            for r in records if r.get('uid')
+        ]
+        if not rows:
+            return
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO headers "
+                "(account, folder, uidvalidity, uid, subject, sender, date, message_id, datetime, size, bulk, "
+                "unsubscribe, one_click, gm_msgid) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+
+    def prune(self, account, folder, uidvalidity, live_uids):
+        """Drop cached headers for messages that have been expunged on the server."""
+        live = {int(u) for u in live_uids}
+        with self._lock, self._db:
+            cached = [r[0] for r in self._db.execute(
+                "SELECT uid FROM headers WHERE account=? AND folder=? AND uidvalidity=?",
+                (account, folder, uidvalidity)
+            )]
+            gone = [(account, folder, uidvalidity, uid) for uid in cached if uid not in live]
+            self._db.executemany(
+                "DELETE FROM headers WHERE account=? AND folder=? AND uidvalidity=? AND uid=?", gone
+            )
+        return len(gone)
+
+    def clear(self, account=None):
+        with self._lock, self._db:
+            if account is None:
+                self._db.execute("DELETE FROM headers")
+                self._db.execute("DELETE FROM folder_state")
+            else:
+                self._db.execute("DELETE FROM headers WHERE account=?", (account,))
+                self._db.execute("DELETE FROM folder_state WHERE account=?", (account,))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_header_cache(path=CACHE_PATH):
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = HeaderCache(path)
+        return _cache
@@ -2,285 +2,843 @@ import imaplib
 import email
 from email.header import decode_header
 import concurrent.futures
+import threading
+import queue
 import time
+from collections import deque
 import ssl
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import re
+import sys
+import functools
+from email.utils import parsedate_tz
 import pytz
+from utilPool import get_pool, connection_budget, CONNECTION_ERRORS
+from utilImap import (
+    folder_status, build_search_criteria, compress_uids, uid_set_batches, AdaptiveBatcher, parse_server,
+    get_capabilities, quote_folder, quote_string, pipeline_uid, take_expunged, uid_set_size, has_gmail_extensions, gmail_query,
+    take_copyuids, GMAIL_EXTENSION
+)
+from utilCache import get_header_cache
+from utilRecords import AccountContext, EmailRecord, EmailList, empty_results, SCAN_GROUPS
+from utilSenders import SenderIndex, sender_address, sender_domain
 
 def create_connection(email_address, password, imap_server):
     try:
-        context = ssl.create_default_context()
-        mail = imaplib.IMAP4_SSL(imap_server, 993, ssl_context=context)
+        host, port, use_ssl = parse_server(imap_server)
+        if use_ssl:
+            context = ssl.create_default_context()
+            mail = imaplib.IMAP4_SSL(host, port, ssl_context=context)
+        else:
+            mail = imaplib.IMAP4(host, port)
         mail.login(email_address, password)
         return mail
     except Exception as e:
         print(f"Connection failed: {e}")
         return None
 
+@functools.lru_cache(maxsize=16384)
+def _decode_header_value(s):
+    decoded_string = ''.join(
+        part.decode(encoding or 'utf-8', errors='ignore') if isinstance(part, bytes) else part
+        for part, encoding in decode_header(s)
+    )
+    return sys.intern(decoded_string)
+
 def decode_mime_words(s):
+    """
+    Decode an RFC 2047 header value. Memoized (and thread-safe) because a few hundred
+    senders account for most From and Subject lines; results are interned, so every
+    record from the same sender shares one string.
+    """
     try:
-        decoded_parts = decode_header(s)
-        decoded_string = ""
-        for part, encoding in decoded_parts:
-            if isinstance(part, bytes):
-                decoded_string += part.decode(encoding or 'utf-8', errors='ignore')
-            else:
-                decoded_string += part
-        return decoded_string
+        return _decode_header_value(s)
     except:
         return str(s) if s else "Unknown"
 
+decode_mime_words.cache_info = _decode_header_value.cache_info
+decode_mime_words.cache_clear = _decode_header_value.cache_clear
+
+# --- Dates ---
+# INTERNALDATE (when the server received the message) comes in one fixed format and is
+# always present, so it is the primary timestamp. The Date header is only parsed when a
+# server leaves INTERNALDATE out; that parse is memoized because bulk senders repeat values.
+
+HEADER_FETCH = ('(UID INTERNALDATE RFC822.SIZE BODY.PEEK[HEADER.FIELDS '
+                '(FROM SUBJECT DATE MESSAGE-ID LIST-UNSUBSCRIBE LIST-UNSUBSCRIBE-POST LIST-ID PRECEDENCE)])')
+# Gmail (X-GM-EXT-1): also the message's account-wide id and its labels, in the same FETCH
+GMAIL_HEADER_FETCH = HEADER_FETCH[:-1] + ' X-GM-MSGID X-GM-LABELS)'
+
+
+INTERNALDATE_RE = re.compile(rb'INTERNALDATE "\s?(\d{1,2})-([A-Za-z]{3})-(\d{4}) (\d{2}):(\d{2}):(\d{2}) ([+-])(\d{2})(\d{2})"')
+MONTHS = {m.encode(): i for i, m in enumerate(
+    ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'], 1
+)}
+
+date_parse_stats = {'internaldate': 0, 'header': 0, 'failed': 0}
+_date_stats_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=64)
+def utc_offset(sign, hours, minutes):
+    offset = timedelta(hours=int(hours), minutes=int(minutes))
+    return timezone(-offset if sign == b'-' else offset)
+
+def parse_internaldate(raw):
+    m = INTERNALDATE_RE.search(raw) if raw else None
+    if not m:
+        return None
+    day, month, year, hour, minute, second, sign, off_h, off_m = m.groups()
+    try:
+        return datetime(int(year), MONTHS[month.capitalize()], int(day), int(hour), int(minute), int(second),
+                        tzinfo=utc_offset(sign, off_h, off_m))
+    except (KeyError, ValueError):
+        return None
+
+@functools.lru_cache(maxsize=4096)
 def parse_email_date(date_str):
+    """Date header -> datetime with email.utils' single-pass RFC 2822 tokenizer; naive if the header has no zone."""
     if not date_str or date_str == "Unknown Date":
         return None
     try:
-        date_str = re.sub(r'\([A-Za-z]+\)', '', date_str)
-        date_str = re.sub(r'\s+', ' ', date_str).strip()
-        for fmt in (
-            '%a, %d %b %Y %H:%M:%S %z',
-            '%d %b %Y %H:%M:%S %z',
-            '%a, %d %b %Y %H:%M:%S',
-            '%d %b %Y %H:%M:%S'
-        ):
-            try:
-                return datetime.strptime(date_str, fmt)
-            except ValueError:
-                continue
-        return None
-    except Exception:
+        parsed = parsedate_tz(date_str)
+        if not parsed:
+            return None
+        naive = datetime(*parsed[:6])
+        return naive if parsed[9] is None else naive.replace(tzinfo=timezone(timedelta(seconds=parsed[9])))
+    except (ValueError, OverflowError, TypeError):
         return None
 
-def get_email_info_batch(mail_conn, msg_ids, cutoff_date=None):
-    emails = []
-    try:
-        msg_set = ','.join(mid.decode() if isinstance(mid, bytes) else str(mid) for mid in msg_ids)
-        typ, msg_data = mail_conn.fetch(msg_set, '(UID BODY.PEEK[HEADER.FIELDS (FROM SUBJECT DATE MESSAGE-ID)])')
+def message_date(fetch_prefix, date_str):
+    """INTERNALDATE from the FETCH response if present, else the parsed Date header."""
+    email_date = parse_internaldate(fetch_prefix)
+    kind = 'internaldate'
+    if email_date is None:
+        email_date = parse_email_date(str(date_str))
+        kind = 'header' if email_date is not None else 'failed'
+    with _date_stats_lock:
+        date_parse_stats[kind] += 1
+    return email_date
+
+def get_date_parse_stats():
+    """Counts of timestamps taken from INTERNALDATE, the Date header, or neither, plus fallback cache use."""
+    with _date_stats_lock:
+        stats = dict(date_parse_stats)
+    info = parse_email_date.cache_info()
+    stats.update({'cache_hits': info.hits, 'cache_misses': info.misses, 'cache_size': info.currsize})
+    return stats
+
+def reset_date_parse_stats():
+    with _date_stats_lock:
+        for key in date_parse_stats:
+            date_parse_stats[key] = 0
+    parse_email_date.cache_clear()
+
+# --- Bulk / subscription mail ---
+# The list headers ride along in the same header FETCH, so every scanned message is
+# classified as it is parsed and the subscriptions group needs no second pass.
+
+BULK_PRECEDENCE = {'bulk', 'list', 'junk'}
+
+def parse_list_unsubscribe(value):
+    """
+    Pick a link out of a List-Unsubscribe header ("<https://...>, <mailto:...>").
+    Returns (type, link), preferring http over mailto.
+    """
+    if not value:
+        return None, None
+    links = re.findall(r'<([^>]+)>', str(value))
+    for link in links:
+        if link.lower().startswith('http'):
+            return 'http', link.strip()
+    for link in links:
+        if link.lower().startswith('mailto:'):
+            return 'mailto', link.strip()
+    return None, None
+
+def classify_bulk(headers):
+    """(is bulk/list mail, unsubscribe link or None) from List-Unsubscribe, List-Id and Precedence."""
+    _, link = parse_list_unsubscribe(headers.get('List-Unsubscribe'))
+    precedence = str(headers.get('Precedence') or '').strip().lower()
+    return bool(link or headers.get('List-Id') or precedence in BULK_PRECEDENCE), link
+
+def is_one_click(headers, link):
+    """RFC 8058: List-Unsubscribe-Post: List-Unsubscribe=One-Click makes the https link a one-click POST."""
+    post = str(headers.get('List-Unsubscribe-Post') or '').replace(' ', '').lower()
+    return bool(link) and link.lower().startswith('https:') and post == 'list-unsubscribe=one-click'
+
+# --- Gmail ---
+
+GM_MSGID_RE = re.compile(rb'X-GM-MSGID (\d+)')
+GM_LABELS_RE = re.compile(rb'X-GM-LABELS \(((?:[^()"]|"(?:[^"\\]|\\.)*")*)\)')
+GM_LABEL_TOKEN_RE = re.compile(rb'"((?:[^"\\]|\\.)*)"|([^\s"]+)')
+
+def parse_gmail_labels(raw):
+    """b'\\Inbox "Receipts 2024"' -> ('\\Inbox', 'Receipts 2024')"""
+    return tuple(
+        sys.intern((atom or quoted).decode('utf-8', 'replace').replace('\\"', '"'))
+        for quoted, atom in GM_LABEL_TOKEN_RE.findall(raw)
+    )
+
+def window_criteria(mail, cutoff_date, days_back, unseen=None, extra=None):
+    """
+    SEARCH criteria for a scan window. On Gmail the window is an exact X-GM-RAW newer_than
+    instead of SINCE, which compares whole days and has to be widened by one.
+    """
+    extra = list(extra or [])
+    if cutoff_date is not None and isinstance(days_back, int) and has_gmail_extensions(mail):
+        return build_search_criteria(unseen=unseen, extra=extra + [gmail_query(f'newer_than:{days_back}d')])
+    return build_search_criteria(since=cutoff_date, unseen=unseen, extra=extra)
+
+def drop_seen_msgids(emails, seen):
+    """Gmail shows one message in several folders (labels); keep only its first appearance."""
+    kept = []
+    for e in emails:
+        if e.gm_msgid is not None:
+            if e.gm_msgid in seen:
+                continue
+            seen.add(e.gm_msgid)
+        kept.append(e)
+    return kept
+
+def get_email_info_batch(mail_conn, uids, cutoff_date=None, stats=None):
+    """Header records for `uids`. Connection errors propagate so the caller can drop the session."""
+    msg_set = compress_uids(uids)
+    items = GMAIL_HEADER_FETCH if has_gmail_extensions(mail_conn) else HEADER_FETCH
+    typ, msg_data = mail_conn.uid('FETCH', msg_set, items)
+
+    if typ != 'OK' or not msg_data:
+        print(f"Fetch failed or empty: {typ}, {msg_data}")
+        return []
 
-        if typ != 'OK' or not msg_data:
-            print(f"Fetch failed or empty: {typ}, {msg_data}")
-            return []
+    if stats is not None:
+        stats['bytes'] = sum(len(item[1]) for item in msg_data if isinstance(item, tuple) and len(item) > 1)
 
-        for i in range(0, len(msg_data)):
-            item = msg_data[i]
-            if item is None or not isinstance(item, tuple) or len(item) < 2:
-                continue
+    return parse_header_items(msg_data, cutoff_date)
 
-            try:
-                raw_header = item[0].decode() if isinstance(item[0], bytes) else str(item[0])
-                uid_match = re.search(r'UID (\d+)', raw_header)
-                uid = uid_match.group(1) if uid_match else None
-
-                email_message = email.message_from_bytes(item[1])
-                subject = decode_mime_words(email_message.get("Subject", "No Subject"))
-                sender = decode_mime_words(email_message.get("From", "Unknown Sender"))
-                date_str = email_message.get("Date", "Unknown Date")
-                email_date = parse_email_date(date_str)
-
-                if cutoff_date and email_date and email_date < cutoff_date:
-                    continue
-
-                emails.append({
-                    'subject': subject[:200],
-                    'sender': sender[:200],
-                    'date': date_str,
-                    'message_id': email_message.get("Message-ID", "")[:100],
-                    'uid': uid,
-                    'datetime': email_date
-                })
-
-            except Exception as e:
-                print(f"Error processing item: {item} — {e}")
-                continue
+def parse_header_items(msg_data, cutoff_date=None):
+    """Turn an imaplib-shaped UID FETCH response of header fields into email records."""
+    emails = []
+    for index, item in enumerate(msg_data):
+        if item is None or not isinstance(item, tuple) or len(item) < 2:
+            continue
 
-    except Exception as e:
-        print(f"Batch processing error: {e}")
+        try:
+            raw_header = item[0] if isinstance(item[0], bytes) else str(item[0]).encode()
+            # Servers may put INTERNALDATE after the header literal instead of before it
+            trailer = msg_data[index + 1] if index + 1 < len(msg_data) else None
+            if isinstance(trailer, bytes):
+                raw_header += trailer
+            uid_match = re.search(rb'UID (\d+)', raw_header)
+            uid = uid_match.group(1).decode() if uid_match else None
+            size_match = re.search(rb'RFC822\.SIZE (\d+)', raw_header)
+            msgid_match = GM_MSGID_RE.search(raw_header)
+            labels_match = GM_LABELS_RE.search(raw_header)
+
+            email_message = email.message_from_bytes(item[1])
+            subject = decode_mime_words(email_message.get("Subject", "No Subject"))
+            sender = decode_mime_words(email_message.get("From", "Unknown Sender"))
+            date_str = email_message.get("Date", "Unknown Date")
+            email_date = message_date(raw_header, date_str)
+
+            if cutoff_date and email_date and email_date < cutoff_date:
+                continue
+            bulk, unsubscribe = classify_bulk(email_message)
+
+            emails.append(EmailRecord(
+                uid, subject[:200], sender[:200], date_str, email_message.get("Message-ID", "")[:100], email_date,
+                int(size_match.group(1)) if size_match else None, bulk=bulk, unsubscribe=unsubscribe and unsubscribe[:500],
+                one_click=is_one_click(email_message, unsubscribe),
+                gm_msgid=int(msgid_match.group(1)) if msgid_match else None,
+                labels=parse_gmail_labels(labels_match.group(1)) if labels_match else None
+            ))
+
+        except Exception as e:
+            print(f"Error processing item: {item} — {e}")
+            continue
     return emails
 
-def process_chunk(args):
-    chunk, folder, email_address, password, imap_server, cutoff_date = args
-    mail_conn = create_connection(email_address, password, imap_server)
-    if not mail_conn:
-        return []
+def get_connection_pool(email_address, password, imap_server, size=None):
+    """The account's session pool, sized from the provider's connection budget unless `size` is given."""
+    return get_pool(email_address, password, imap_server, create_connection,
+                    size=size or connection_budget(imap_server))
+
+def is_before_cutoff(email_date, cutoff_date):
+    if not cutoff_date or not email_date:
+        return False
+    if email_date.tzinfo is None:
+        email_date = email_date.replace(tzinfo=pytz.utc)
+    return email_date < cutoff_date
+
+class FolderJob:
+    """
+    One folder's share of a scan: the UIDs SEARCH matched, the cached records and what is left
+    to fetch. With keep=False records only go to `progress` (and the header cache) batch by
+    batch and are not collected, so aggregating scans use memory independent of folder size.
+    """
+
+    def __init__(self, group, folder, uids, cutoff_date=None, progress=None, keep=True):
+        self.group = group
+        self.folder = folder
+        self.total = len(uids)
+        self.cutoff_date = cutoff_date
+        self.progress = progress
+        # UIDs are handed out in ascending order so every batch compresses into a few a:b ranges
+        self.pending = deque(sorted(uids, key=int))
+        self.cached = []
+        self.fetched = []
+        self.done = 0
+        self.workers = 0
+        self.uidvalidity = None
+        self.keep = keep
+        self.cache = None
+        self.account = None
+
+    def use_cache(self, mail, cache, account):
+        status = folder_status(mail, self.folder)
+        if not status or 'uidvalidity' not in status:
+            return
+        self.uidvalidity, changed, stale = cache.sync_folder(account, self.folder, status)
+        if changed and stale:
+            _, data = mail.uid('SEARCH', None, 'ALL')
+            cache.prune(account, self.folder, self.uidvalidity, data[0].split() if data and data[0] else [])
+        self.cache, self.account = cache, account
+        if self.keep:
+            hits = cache.get(account, self.folder, self.uidvalidity, self.pending)
+            self.cached = list(hits.values())
+        else:
+            hits = set()
+            for batch in cache.iter_get(account, self.folder, self.uidvalidity, self.pending):
+                hits.update(batch)
+                self.report(list(batch.values()), len(batch))
+        self.pending = deque(uid for uid in self.pending if int(uid) not in hits)
+
+    def collect(self, emails):
+        """Keep a fetched batch, or (keep=False) write it to the header cache and let it go."""
+        if self.keep:
+            self.fetched.extend(emails)
+        elif self.cache is not None and self.uidvalidity is not None:
+            self.cache.put(self.account, self.folder, self.uidvalidity, emails)
+
+    def report(self, emails, count):
+        self.done += count
+        if self.progress:
+            self.progress([e for e in emails if not is_before_cutoff(e['datetime'], self.cutoff_date)],
+                          self.done, self.total)
+
+    def finish(self, cache=None, account=None):
+        if cache is not None and self.uidvalidity is not None:
+            cache.put(account, self.folder, self.uidvalidity, self.fetched)
+        emails = [e for e in self.cached + self.fetched if not is_before_cutoff(e['datetime'], self.cutoff_date)]
+        for e in emails:
+            e.folder = self.folder
+        return emails
+
+class FetchScheduler:
+    """
+    Hands out UID batches from several folders to one shared set of workers. A worker keeps
+    draining the folder it already has selected; when that runs dry it moves to the folder
+    with the most work left per worker, so all folders finish at about the same time.
+    """
+
+    def __init__(self, jobs, batcher=None):
+        self.jobs = jobs
+        self.batcher = batcher or AdaptiveBatcher()
+        self.lock = threading.Lock()
+
+    def remaining(self):
+        return sum(len(job.pending) for job in self.jobs)
+
+    def next_batch(self, current=None):
+        with self.lock:
+            job = current if current is not None and current.pending else None
+            if job is None:
+                if current is not None:
+                    current.workers -= 1
+                candidates = [j for j in self.jobs if j.pending]
+                if not candidates:
+                    return None, None
+                job = max(candidates, key=lambda j: len(j.pending) / (j.workers + 1))
+                job.workers += 1
+            size = min(self.batcher.next_size(), len(job.pending))
+            return job, [job.pending.popleft() for _ in range(size)]
+
+    def record(self, job, batch, emails, latency, nbytes):
+        self.batcher.record(len(batch), latency, nbytes)
+        with self.lock:
+            job.collect(emails)
+            job.report(emails, len(batch))
+
+def fetch_worker(scheduler, pool):
+    """Borrow one session and keep fetching batches until every folder is drained."""
+    session = pool.acquire()
+    if session is None:
+        return
+    broken = False
     try:
-        mail_conn.select(folder)
-        return get_email_info_batch(mail_conn, chunk, cutoff_date)
+        job = None
+        while True:
+            job, batch = scheduler.next_batch(job)
+            if job is None:
+                break
+            stats = {}
+            started = time.time()
+            try:
+                if session.select(job.folder)[0] != 'OK':
+                    raise imaplib.IMAP4.error(f"SELECT {job.folder} failed")
+                emails = get_email_info_batch(session.conn, batch, stats=stats)
+            except CONNECTION_ERRORS:
+                raise
+            except imaplib.IMAP4.error as e:
+                # NO/BAD for this folder or batch; the connection itself is fine
+                print(f"Skipping {len(batch)} messages in {job.folder}: {e}")
+                scheduler.record(job, batch, [], 0, 0)
+                continue
+            scheduler.record(job, batch, emails, time.time() - started, stats.get('bytes', 0))
+    except CONNECTION_ERRORS:
+        broken = True
+        raise
     finally:
-        try:
-            mail_conn.close()
-            mail_conn.logout()
-        except:
-            pass
-
-def scan_folder_fast(mail, folder_name, email_address, password, imap_server, days_back=None):
+        pool.release(session, broken=broken)
+
+def fetch_jobs(jobs, pool, max_workers=None):
+    """Fetch the pending UIDs of every job concurrently under one connection budget."""
+    for job in jobs:
+        job.report(job.cached, len(job.cached))
+    scheduler = FetchScheduler(jobs)
+    remaining = scheduler.remaining()
+    if not remaining:
+        return
+    workers = min(max_workers or pool.size, remaining // scheduler.batcher.next_size() + 1)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        for future in [executor.submit(fetch_worker, scheduler, pool) for _ in range(workers)]:
+            future.result()
+
+def search_uid_set(mail, criteria, what):
+    """UIDs a UID SEARCH on the selected folder returns, as strings; None if the server refused it."""
+    try:
+        typ, data = mail.uid('SEARCH', None, criteria)
+    except CONNECTION_ERRORS:
+        raise
+    except imaplib.IMAP4.error as e:
+        print(f"Could not search {what}: {e}")
+        return None
+    if typ != 'OK':
+        return None
+    return {uid.decode() for uid in data[0].split()} if data and data[0] else set()
+
+def plan_folder(mail, group, folder, criteria, cutoff_date=None, cache=None, account=None, progress=None,
+                keep=True):
+    """
+    SELECT + UID SEARCH on the control session; returns a FolderJob or None if the folder is
+    unusable (SELECT or SEARCH answered NO/BAD). Connection errors propagate.
+    """
     try:
-        status, _ = mail.select(folder_name)
+        status, _ = mail.select(folder)
         if status != 'OK':
-            return []
+            return None
+        typ, uids = mail.uid('SEARCH', None, criteria)
+        if typ != 'OK':
+            return None
+        job = FolderJob(group, folder, uids[0].split() if uids and uids[0] else [], cutoff_date, progress, keep)
+        if cache is not None and job.pending:
+            job.use_cache(mail, cache, account)
+        return job
+    except CONNECTION_ERRORS:
+        raise
+    except imaplib.IMAP4.error as e:
+        print(f"Skipping {folder}: {e}")
+        return None
 
-        cutoff_date = None
-        if days_back is not None and isinstance(days_back, int):
-            pst = pytz.timezone('Asia/Manila')
-            cutoff_date = datetime.now(pst) - timedelta(days=days_back)
+def parse_folder_list(folders):
+    return [folder.decode().split('"')[-2] for folder in folders if len(folder.decode().split('"')) >= 3]
 
-        _, msg_ids = mail.search(None, 'ALL')
-        msg_id_list = msg_ids[0].split()
-        if not msg_id_list:
-            return []
+def get_folder_list(mail):
+    typ, folders = mail.list()
+    if typ != 'OK':
+        raise imaplib.IMAP4.error(f"LIST failed: {folders}")
+    return parse_folder_list(folders)
 
-        chunk_size = 25
-        chunks = [msg_id_list[i:i + chunk_size] for i in range(0, len(msg_id_list), chunk_size)]
-        all_emails = []
+SPAM_FOLDERS = ['Spam', 'Junk', 'SPAM', 'JUNK', '[Gmail]/Spam', 'Bulk Mail']
+TRASH_FOLDERS = ['Trash', '[Gmail]/Trash', 'Deleted Items', 'Deleted Messages']
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-            args = [(chunk, folder_name, email_address, password, imap_server, cutoff_date) for chunk in chunks]
-            for future in concurrent.futures.as_completed([executor.submit(process_chunk, arg) for arg in args]):
-                all_emails.extend(future.result())
+def match_folders(folders, names):
+    return [folder for folder in folders if any(name.lower() == folder.lower() for name in names)]
 
-        for e in all_emails:
-            e["email_address"] = email_address
-            e["password"] = password
-            e["imap_server"] = imap_server
+def spam_group(folder):
+    return 'spam' if 'spam' in folder.lower() else 'junk'
 
-        return all_emails
-    except Exception as e:
-        print(f"Error scanning {folder_name}: {e}")
-        return []
+def get_cutoff_date(days_back):
+    if days_back is not None and isinstance(days_back, int):
+        pst = pytz.timezone('Asia/Manila')
+        return datetime.now(pst) - timedelta(days=days_back)
+    return None
 
-def scan_unread_fast(mail, email_address, password, imap_server, cutoff_date=None):
+def include_trash_setting():
+    # Read the setting from session_state
+    include_trash = False
     try:
-        mail.select('INBOX')
-        search_criteria = 'UNSEEN'
-        if cutoff_date:
-            date_str = cutoff_date.strftime('%d-%b-%Y')
-            search_criteria = f'(UNSEEN SINCE "{date_str}")'
-        _, msg_ids = mail.search(None, search_criteria)
-        if not msg_ids[0]:
-            return [], 0
-
-        msg_id_list = msg_ids[0].split()
-        total_unread = len(msg_id_list)
-
-        chunk_size = 25
-        chunks = [msg_id_list[i:i + chunk_size] for i in range(0, len(msg_id_list), chunk_size)]
-        all_emails = []
-
-        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
-            args = [(chunk, 'INBOX', email_address, password, imap_server, cutoff_date) for chunk in chunks]
-            for future in concurrent.futures.as_completed([executor.submit(process_chunk, arg) for arg in args]):
-                all_emails.extend(future.result())
-
-        for e in all_emails:
-            e["email_address"] = email_address
-            e["password"] = password
-            e["imap_server"] = imap_server
-
-        return all_emails, total_unread
-    except Exception as e:
-        print(f"Error scanning unread emails: {e}")
-        return [], 0
-
-def get_folder_list(mail):
-    try:
-        _, folders = mail.list()
-        return [folder.decode().split('"')[-2] for folder in folders if len(folder.decode().split('"')) >= 3]
-    except Exception as e:
-        print(f"Error getting folder list: {e}")
-        return []
+        import streamlit as st
+        include_trash = st.session_state.get("include_trash", True)
+    except:
+        pass
+    return include_trash
 
-def scan_all_fast(email_address, password, imap_server, days_back=None):
+def folder_progress(progress, group, folder):
+    """Adapt a scan-level progress callback to one FolderJob's callback."""
+    if not progress:
+        return None
+    return lambda emails, fetched, total: progress(group, folder, emails, fetched, total)
+
+def scan_all_fast(email_address, password, imap_server, days_back=None, use_cache=True, include_trash=None,
+                  progress=None, groups=None):
+    """
+    Scan unread, spam/junk and (optionally) trash folders. `progress(group, folder, emails,
+    fetched, total)` is called with every batch as it arrives; see scan_all_iter.
+    `groups` picks from 'unread', 'spam', 'junk', 'trash' and 'subscriptions' (default: all), so
+    one scan serves the Scan page, the Subscriptions page and the scheduler. Subscriptions need
+    all of INBOX in the window, not just unread mail; INBOX is then fetched once and unread mail
+    is picked out of it by a second, UIDs-only SEARCH UNSEEN. A third,
+    SEARCH BODY "unsubscribe", fills 'unsubscribe_mentions' with INBOX mail that has no list
+    headers but mentions unsubscribing, the senders the header pass cannot see.
+    """
+    groups = set(SCAN_GROUPS if groups is None else groups)
     start_time = time.time()
-    mail = create_connection(email_address, password, imap_server)
+    if include_trash is None:
+        include_trash = include_trash_setting()
+    cache = get_header_cache() if use_cache else None
+    # One control session for LIST/SEARCH, then fetch workers up to the account's connection budget
+    pool = get_connection_pool(email_address, password, imap_server)
+    mail = pool.acquire()
     if not mail:
         return None
 
+    broken = False
     try:
-        results = {
-            'unread': [], 'spam': [], 'junk': [], 'trash': [], 'folders': [],
-            'total_unread_count': 0, 'scan_time': 0
-        }
+        results = empty_results(email_address, password, imap_server)
+
+        cutoff_date = get_cutoff_date(days_back)
 
-        cutoff_date = None
-        if days_back is not None and isinstance(days_back, int):
-            pst = pytz.timezone('Asia/Manila')
-            cutoff_date = datetime.now(pst) - timedelta(days=days_back)
-
-        results['folders'] = get_folder_list(mail)
-        results['unread'], results['total_unread_count'] = scan_unread_fast(
-            mail, email_address, password, imap_server, cutoff_date
-        )
-
-        spam_folders = ['Spam', 'Junk', 'SPAM', 'JUNK', '[Gmail]/Spam', 'Bulk Mail']
-        for folder in results['folders']:
-            if any(spam_folder.lower() == folder.lower() for spam_folder in spam_folders):
-                emails = scan_folder_fast(mail, folder, email_address, password, imap_server, days_back)
-                if 'spam' in folder.lower():
-                    results['spam'].extend(emails)
-                else:
-                    results['junk'].extend(emails)
-
-        # Read the setting from session_state
-        include_trash = False
         try:
-            import streamlit as st
-            include_trash = st.session_state.get("include_trash", True)
-        except:
-            pass
-
-        if include_trash:
-            trash_folders = ['Trash', '[Gmail]/Trash', 'Deleted Items', 'Deleted Messages']
-            for folder in results['folders']:
-                if any(trash_folder.lower() == folder.lower() for trash_folder in trash_folders):
-                    emails = scan_folder_fast(mail, folder, email_address, password, imap_server, days_back)
-                    results['trash'].extend(emails)
+            results['folders'] = get_folder_list(mail)
+        except (imaplib.IMAP4.error, OSError) as e:
+            # Without the folder list there is nothing to scan; an empty result would look like a clean mailbox
+            print(f"Scan failed for {email_address}: {e}")
+            broken = isinstance(e, CONNECTION_ERRORS)
+            return None
+
+        targets = []
+        whole_inbox = 'subscriptions' in groups
+        window = window_criteria(mail, cutoff_date, days_back)
+        unseen_window = window_criteria(mail, cutoff_date, days_back, unseen=True)
+        if whole_inbox:
+            targets.append(('inbox', 'INBOX', window))
+        elif 'unread' in groups:
+            targets.append(('unread', 'INBOX', unseen_window))
+        targets += [(spam_group(f), f, window)
+                    for f in match_folders(results['folders'], SPAM_FOLDERS) if spam_group(f) in groups]
+        if include_trash and 'trash' in groups:
+            targets += [('trash', f, window) for f in match_folders(results['folders'], TRASH_FOLDERS)]
+
+        # SEARCH every folder on the control session, then fetch all of them at once
+        jobs = []
+        unseen = None
+        mentions = None
+
+        def inbox_progress(emails, fetched, total):
+            # Batches arrive after planning, so SEARCH UNSEEN has answered: report them as unread mail
+            progress('unread', 'INBOX', [e for e in emails if unseen and e.uid in unseen], fetched, total)
+
+        for group, folder, criteria in targets:
+            report = inbox_progress if group == 'inbox' and progress else folder_progress(progress, group, folder)
+            job = plan_folder(mail, group, folder, criteria, cutoff_date, cache, email_address, report)
+            if job is not None:
+                jobs.append(job)
+            if job is not None and group == 'inbox':
+                if 'unread' in groups:
+                    unseen = search_uid_set(mail, unseen_window, 'unread mail in INBOX')
+                mentions = search_uid_set(
+                    mail, window_criteria(mail, cutoff_date, days_back, extra=['BODY "unsubscribe"']),
+                    'INBOX for unsubscribe links'
+                )
+        # Hand the control session to the fetch workers; it is logged in and has a folder selected
+        pool.release(mail)
+        mail = None
+        fetch_jobs(jobs, pool)
+
+        msgids = set()
+        for job in jobs:
+            emails = drop_seen_msgids(job.finish(cache, email_address), msgids)
+            if job.group == 'inbox':
+                if unseen is not None:
+                    unread = [e for e in emails if e.uid in unseen]
+                    results['unread'].extend(unread)
+                    results['total_unread_count'] = len(unread) if cutoff_date else len(unseen)
+                results['subscriptions'].extend(e for e in emails if e.bulk)
+                if mentions:
+                    results['unsubscribe_mentions'].extend(e for e in emails if not e.bulk and e.uid in mentions)
+                continue
+            results[job.group].extend(emails)
+            if job.group == 'unread':
+                results['total_unread_count'] = len(emails) if cutoff_date else job.total
 
         results['scan_time'] = time.time() - start_time
         return results
+    except CONNECTION_ERRORS:
+        broken = True
+        raise
     finally:
+        if mail is not None:
+            pool.release(mail, broken=broken)
+
+def scan_all_iter(email_address, password, imap_server, days_back=None, use_cache=True, include_trash=None):
+    """
+    Streaming variant of scan_all_fast. Yields one event per fetched batch:
+        {'group', 'folder', 'emails', 'fetched', 'total'}
+    and finally {'done': True, 'results': <scan_all_fast result or None>}.
+    """
+    if include_trash is None:
+        include_trash = include_trash_setting()  # session_state is only readable from the script thread
+    events = queue.Queue()
+
+    def progress(group, folder, emails, fetched, total):
+        events.put({'group': group, 'folder': folder, 'emails': emails, 'fetched': fetched, 'total': total})
+
+    def run():
+        results = None
         try:
-            mail.close()
-            mail.logout()
-        except:
-            pass
-
-def delete_emails(folder_type, emails, all_folders, permanent=False):
+            results = scan_all_fast(email_address, password, imap_server, days_back, use_cache, include_trash, progress)
+        except CONNECTION_ERRORS as e:
+            print(f"Scan failed for {email_address}: {e}")
+        finally:
+            events.put({'done': True, 'results': results})
+
+    threading.Thread(target=run, daemon=True).start()
+    while True:
+        event = events.get()
+        yield event
+        if event.get('done'):
+            return
+
+def delete_emails(folder_type, emails, all_folders, permanent=False, account=None):
+    """
+    Delete `emails` (an EmailList from a scan, or any sequence of records) from the folder
+    matching `folder_type`, on one pooled connection with pipelined, range-compressed UID sets:
+    - move to Trash: UID MOVE when the server has MOVE, else UID COPY + \\Deleted (+ UID EXPUNGE)
+    - permanent, or already in Trash: \\Deleted + UID EXPUNGE (plain EXPUNGE without UIDPLUS)
+    Returns the number of messages the server confirmed, not the number requested.
+    """
     if not emails:
         return 0
 
     mail = None
+    broken = False
     try:
         target_folder = next((f for f in all_folders if folder_type.lower() in f.lower()), None)
         if not target_folder:
             return 0
 
-        uids = [email['uid'] for email in emails if email.get('uid')]
+        account = account or getattr(emails, 'account', None)
+        if account is None:
+            print("No account context for these emails; nothing deleted")
+            return 0
+
+        uids = emails.uids() if isinstance(emails, EmailList) else [e['uid'] for e in emails if e.get('uid')]
         if not uids:
             return 0
 
-        mail = create_connection(
-            emails[0].get('email_address'),
-            emails[0].get('password'),
-            emails[0].get('imap_server')
-        )
+        pool = get_connection_pool(account.email_address, account.password, account.imap_server)
+        mail = pool.acquire(target_folder)
         if not mail:
             return 0
 
-        mail.select(target_folder)
-        for i in range(0, len(uids), 50):
-            batch = uids[i:i+50]
-            mail.uid('STORE', ','.join(batch), '+FLAGS', '\\Deleted')
-
-        if permanent:
-            mail.expunge()
-
-        return len(uids)
+        return delete_uids(mail, target_folder, uids, all_folders, permanent)
     except Exception as e:
         print(f"Error deleting emails: {e}")
+        broken = isinstance(e, CONNECTION_ERRORS)
         return 0
     finally:
         if mail:
-            try:
-                mail.close()
-                mail.logout()
-            except:
-                pass
+            # CLOSE so the pooled session does not keep \Deleted messages selected
+            mail.close_folder()
+            pool.release(mail, broken=broken)
+
+def delete_uids(mail, target_folder, uids, all_folders, permanent=False):
+    """Bulk-delete UIDs from `target_folder`, which `mail` has selected; returns the confirmed count."""
+    caps = get_capabilities(mail)
+    trash_folders = match_folders(all_folders, TRASH_FOLDERS)
+    uid_sets = list(uid_set_batches(uids))
+    take_expunged(mail)  # drop EXPUNGEs left over from earlier use of this session
+
+    if not permanent and trash_folders and target_folder not in trash_folders:
+        confirmed = move_uid_sets(mail, uid_sets, trash_folders[0], caps)
+    elif (permanent and trash_folders and GMAIL_EXTENSION in caps
+          and target_folder not in trash_folders + match_folders(all_folders, SPAM_FOLDERS)):
+        confirmed = purge_gmail_uid_sets(mail, uid_sets, trash_folders[0], caps)
+    else:
+        confirmed = expunge_uid_sets(mail, uid_sets, caps)
+
+    if confirmed < len(uids):
+        print(f"Deleted {confirmed} of {len(uids)} emails from {target_folder}")
+    return confirmed
+
+def purge_gmail_uid_sets(mail, uid_sets, trash, caps):
+    """
+    On Gmail, expunging from a label folder such as INBOX only removes the label; the
+    message stays in All Mail. A permanent delete moves it to Trash and expunges it there,
+    using the Trash UIDs the MOVE reported (COPYUID). Leaves Trash selected.
+    """
+    if 'MOVE' not in caps or 'UIDPLUS' not in caps:
+        return expunge_uid_sets(mail, uid_sets, caps)
+    mail.response('COPYUID')  # drop codes left over from earlier use of this session
+    confirmed = move_uid_sets(mail, uid_sets, trash, caps)
+    trash_uids = take_copyuids(mail)
+    if trash_uids and mail.select(trash)[0] == 'OK':
+        expunge_uid_sets(mail, list(uid_set_batches(trash_uids)), caps)
+    return confirmed
+
+def flag_deleted(mail, uid_sets):
+    statuses = pipeline_uid(mail, [('STORE', uid_set, '+FLAGS.SILENT', '(\\Deleted)') for uid_set in uid_sets])
+    return [uid_set for uid_set, status in zip(uid_sets, statuses) if status == 'OK']
+
+def expunge_uid_sets(mail, uid_sets, caps):
+    flagged = flag_deleted(mail, uid_sets)
+    if not flagged:
+        return 0
+    if 'UIDPLUS' not in caps:
+        _, data = mail.expunge()
+        return len([d for d in data if d is not None])
+    pipeline_uid(mail, [('EXPUNGE', uid_set) for uid_set in flagged])
+    return take_expunged(mail)
+
+def move_uid_sets(mail, uid_sets, trash, caps):
+    if 'MOVE' in caps:
+        # The server answers a MOVE with one EXPUNGE per message it actually moved
+        pipeline_uid(mail, [('MOVE', uid_set, quote_folder(trash)) for uid_set in uid_sets])
+        return take_expunged(mail)
+
+    statuses = pipeline_uid(mail, [('COPY', uid_set, quote_folder(trash)) for uid_set in uid_sets])
+    copied = [uid_set for uid_set, status in zip(uid_sets, statuses) if status == 'OK']
+    if not copied:
+        return 0
+    if 'UIDPLUS' in caps:
+        return expunge_uid_sets(mail, copied, caps)
+    # Without UIDPLUS the originals are left flagged; CLOSE on release expunges them
+    return sum(uid_set_size(uid_set) for uid_set in flag_deleted(mail, copied))
+
+# --- Top offenders ---
+
+def usage_folders(all_folders, include_spam_trash=True):
+    folders = ['INBOX']
+    if include_spam_trash:
+        folders += match_folders(all_folders, SPAM_FOLDERS) + match_folders(all_folders, TRASH_FOLDERS)
+    return folders
+
+def scan_mailbox_usage(email_address, password, imap_server, days_back=None, folders=None, use_cache=True,
+                       progress=None):
+    """
+    Every message's headers and RFC822.SIZE in `folders` (default: INBOX, spam and trash),
+    aggregated per sender address and domain. Returns {'index': SenderIndex, 'folders',
+    'scanned': {folder: count}, 'days_back', 'account', 'scan_time'} or None if the login failed.
+    """
+    start_time = time.time()
+    cache = get_header_cache() if use_cache else None
+    pool = get_connection_pool(email_address, password, imap_server)
+    mail = pool.acquire()
+    if not mail:
+        return None
+
+    broken = False
+    try:
+        try:
+            all_folders = get_folder_list(mail)
+        except (imaplib.IMAP4.error, OSError) as e:
+            print(f"Usage scan failed for {email_address}: {e}")
+            broken = isinstance(e, CONNECTION_ERRORS)
+            return None
+        cutoff_date = get_cutoff_date(days_back)
+        criteria = window_criteria(mail, cutoff_date, days_back)
+        # Batches go straight into the index as they arrive (FolderJob keep=False); batches
+        # are reported one at a time, under the fetch scheduler's lock
+        index = SenderIndex()
+        scanned = {}
+        msgids = set()
+
+        def feed(folder):
+            report = folder_progress(progress, 'usage', folder)
+
+            def add_batch(emails, fetched, total):
+                records = drop_seen_msgids(emails, msgids)
+                index.add_all(records)
+                scanned[folder] += len(records)
+                if report:
+                    report(records, fetched, total)
+            return add_batch
+
+        jobs = []
+        for folder in folders or usage_folders(all_folders):
+            scanned[folder] = 0
+            job = plan_folder(mail, 'usage', folder, criteria, cutoff_date, cache, email_address, feed(folder),
+                              keep=False)
+            if job is None:
+                del scanned[folder]
+                continue
+            jobs.append(job)
+        pool.release(mail)
+        mail = None
+        fetch_jobs(jobs, pool)
+        return {
+            'index': index, 'folders': all_folders, 'scanned': scanned, 'days_back': days_back,
+            'account': AccountContext(email_address, password, imap_server),
+            'scan_time': time.time() - start_time,
+        }
+    except CONNECTION_ERRORS:
+        broken = True
+        raise
+    finally:
+        if mail is not None:
+            pool.release(mail, broken=broken)
+
+SENDER_CHECK_BATCH = 1000  # candidates whose From header one FETCH checks
+
+def from_sender(records, sender):
+    """Records whose From address is exactly `sender`, or whose domain is exactly `@domain`."""
+    target = sender.lower()
+    if target.startswith('@'):
+        return [r for r in records if '@' + sender_domain(sender_address(r.sender)) == target]
+    return [r for r in records if sender_address(r.sender) == target]
+
+def delete_from_sender(account, sender, all_folders, folders=('INBOX',), permanent=False, days_back=None):
+    """
+    Delete everything from `sender` (an address, or '@domain' for a whole domain) received in
+    the last `days_back` days. SEARCH FROM is a substring match (@shop.com also finds
+    @shop.company.com), so the candidates' From headers are checked before the bulk delete.
+    Moving to Trash leaves trash folders alone: their mail is already there, and deleting
+    it would also expunge what was just moved in. Returns the confirmed count.
+    """
+    if not permanent:
+        folders = [f for f in folders if f not in match_folders(all_folders, TRASH_FOLDERS)]
+    cutoff_date = get_cutoff_date(days_back)
+    pool = get_connection_pool(account.email_address, account.password, account.imap_server)
+    deleted = 0
+    for folder in folders:
+        mail = pool.acquire(folder)
+        if not mail:
+            continue
+        broken = False
+        try:
+            criteria = window_criteria(mail, cutoff_date, days_back, extra=[f'FROM {quote_string(sender)}'])
+            typ, data = mail.uid('SEARCH', None, criteria)
+            candidates = data[0].split() if typ == 'OK' and data and data[0] else []
+            uids = []
+            for start in range(0, len(candidates), SENDER_CHECK_BATCH):
+                records = get_email_info_batch(mail, candidates[start:start + SENDER_CHECK_BATCH], cutoff_date)
+                uids += [r.uid for r in from_sender(records, sender)]
+            if uids:
+                deleted += delete_uids(mail, folder, uids, all_folders, permanent)
+        except Exception as e:
+            print(f"Error deleting mail from {sender} in {folder}: {e}")
+            broken = isinstance(e, CONNECTION_ERRORS)
+        finally:
+            mail.close_folder()
+            pool.release(mail, broken=broken)
+    return deleted
@@ -0,0 +1,301 @@
+import re
+import threading
+from collections import deque
+from datetime import timedelta
+
+# --- Low-level IMAP helpers shared by the scanners ---
+
+def quote_string(text):
+    """IMAP quoted string for any argument (login, search value); always escapes."""
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def quote_folder(folder):
+    """Folder name as a quoted string; names LIST already returned quoted pass through."""
+    if folder.startswith('"'):
+        return folder
+    return quote_string(folder)
+
+def get_capabilities(mail):
+    """
+    Post-login CAPABILITY set. imaplib only records the pre-login list, which on Gmail
+    is missing MOVE and UIDPLUS, so ask once and remember it on the connection.
+    """
+    caps = getattr(mail, 'server_capabilities', None)
+    if caps is not None:
+        return caps
+    try:
+        typ, data = mail.capability()
+        caps = set(data[0].decode().upper().split()) if typ == 'OK' and data and data[0] else set()
+    except Exception:
+        caps = set(c.upper() for c in getattr(mail, 'capabilities', ()))
+    try:
+        target = getattr(mail, 'conn', mail)
+        target.server_capabilities = caps
+    except Exception:
+        pass
+    return caps
+
+GMAIL_EXTENSION = 'X-GM-EXT-1'
+
+def has_gmail_extensions(mail):
+    """Whether the server speaks Gmail's X-GM-RAW / X-GM-MSGID / X-GM-LABELS."""
+    return GMAIL_EXTENSION in get_capabilities(mail)
+
+def gmail_query(*terms):
+    """SEARCH key running a Gmail web-search query server-side: X-GM-RAW "is:unread older_than:7d"."""
+    return 'X-GM-RAW ' + quote_string(' '.join(term for term in terms if term))
+
+def folder_status(mail, folder):
+    """STATUS values for a folder: UIDVALIDITY, UIDNEXT and MESSAGES."""
+    try:
+        typ, data = mail.status(quote_folder(folder), '(MESSAGES UIDNEXT UIDVALIDITY)')
+        if typ != 'OK' or not data or not data[0]:
+            return None
+        raw = data[0].decode() if isinstance(data[0], bytes) else str(data[0])
+        return {k.lower(): int(v) for k, v in re.findall(r'([A-Z]+) (\d+)', raw.split('(', 1)[-1])}
+    except Exception as e:
+        print(f"STATUS failed for {folder}: {e}")
+        return None
+
+def imap_date(d):
+    return d.strftime('%d-%b-%Y')
+
+def build_search_criteria(since=None, before=None, unseen=None, extra=None):
+    """
+    Compile scan filters into a UID SEARCH string. SINCE/BEFORE compare the server's
+    INTERNALDATE at day granularity, so `since` is widened by a day to cover timezone
+    differences; callers trim the edge with the exact cutoff on the client.
+    """
+    terms = []
+    if unseen is True:
+        terms.append('UNSEEN')
+    elif unseen is False:
+        terms.append('SEEN')
+    if since is not None:
+        terms.append(f'SINCE {imap_date(since - timedelta(days=1))}')
+    if before is not None:
+        terms.append(f'BEFORE {imap_date(before)}')
+    if extra:
+        terms.extend(extra)
+    if not terms:
+        return 'ALL'
+    return '(' + ' '.join(terms) + ')' if len(terms) > 1 else terms[0]
+
+# --- UID sets and batch sizing ---
+
+def uid_ranges(uids):
+    """Sorted, de-duplicated UIDs collapsed into (first, last) runs."""
+    ranges = []
+    for uid in sorted({int(u.decode() if isinstance(u, bytes) else u) for u in uids}):
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    return ranges
+
+def compress_uids(uids):
+    """[1, 2, 3, 7, 9, 10] -> '1:3,7,9:10'"""
+    return ','.join(f'{a}:{b}' if a != b else str(a) for a, b in uid_ranges(uids))
+
+def uid_set_batches(uids, max_count=5000, max_length=1000):
+    """
+    Split UIDs into compressed sets small enough for one command line. Contiguous
+    UIDs cost a few bytes per run, so a whole folder usually fits in one batch.
+    """
+    parts, count, length = [], 0, 0
+    for a, b in uid_ranges(uids):
+        while a <= b:
+            take = min(b - a + 1, max_count - count)
+            end = a + take - 1
+            part = f'{a}:{end}' if a != end else str(a)
+            if parts and length + len(part) + 1 > max_length:
+                yield ','.join(parts)
+                parts, count, length = [], 0, 0
+                continue
+            parts.append(part)
+            count += take
+            length += len(part) + 1
+            a = end + 1
+            if count >= max_count:
+                yield ','.join(parts)
+                parts, count, length = [], 0, 0
+    if parts:
+        yield ','.join(parts)
+
+def uid_set_size(uid_set):
+    """Number of UIDs in a compressed set such as '1:3,7,9:10'."""
+    total = 0
+    for part in uid_set.split(','):
+        first, _, last = part.partition(':')
+        total += int(last) - int(first) + 1 if last else 1
+    return total
+
+def expand_uid_set(uid_set):
+    """'1:3,7' -> ['1', '2', '3', '7']"""
+    uids = []
+    for part in uid_set.split(','):
+        first, _, last = part.partition(':')
+        low, high = sorted((int(first), int(last or first)))
+        uids.extend(str(uid) for uid in range(low, high + 1))
+    return uids
+
+# --- Pipelining ---
+
+PIPELINE_DEPTH = 8  # UID commands in flight at once
+
+def pipeline_uid(mail, commands, depth=PIPELINE_DEPTH):
+    """
+    Send UID commands without waiting for each reply; imaplib on its own is strictly one
+    command per round trip. `commands` are argument tuples as for mail.uid(), e.g.
+    ('MOVE', '1:500', '"Trash"'). Returns one status ('OK', 'NO' or 'BAD') per command, in
+    order. Untagged responses such as EXPUNGE pile up on the connection as usual.
+    """
+    conn = getattr(mail, 'conn', mail)
+    statuses = []
+    in_flight = deque()
+
+    def complete():
+        tag = in_flight.popleft()
+        try:
+            typ, _ = conn._command_complete('UID', tag)
+        except conn.abort:
+            raise
+        except conn.error:
+            typ = 'BAD'
+        statuses.append(typ)
+
+    for args in commands:
+        in_flight.append(conn._command('UID', *args))
+        if len(in_flight) >= depth:
+            complete()
+    while in_flight:
+        complete()
+    return statuses
+
+def take_expunged(mail):
+    """Pop the untagged EXPUNGE responses collected so far and return how many there were."""
+    _, data = mail.response('EXPUNGE')
+    return len([d for d in data if d is not None])
+
+def take_copyuids(mail):
+    """
+    Pop the COPYUID codes (UIDPLUS) MOVE has reported so far and return the UIDs the
+    messages got in the destination folder.
+    """
+    _, data = mail.response('COPYUID')
+    uids = []
+    for item in data or []:
+        parts = (item.decode() if isinstance(item, bytes) else str(item or '')).split()
+        if len(parts) >= 3:
+            uids.extend(expand_uid_set(parts[2]))
+    return uids
+
+
+class AdaptiveBatcher:
+    """
+    Picks the next FETCH batch size from how the previous ones went: grow while round trips
+    stay under `target_latency` and responses stay small, halve when the server slows down.
+    Shared by all workers of one fetch, so the size converges on what the server tolerates.
+    """
+
+    def __init__(self, initial=25, minimum=10, maximum=500, target_latency=1.0, max_bytes=2000000):
+        self.size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def next_size(self):
+        return self.size
+
+    def record(self, count, latency, nbytes):
+        with self._lock:
+            if count < self.size:
+                return  # a short tail batch says nothing about the server
+            if latency > self.target_latency * 2 or nbytes > self.max_bytes:
+                self.size = max(self.minimum, self.size // 2)
+            elif latency < self.target_latency and nbytes < self.max_bytes // 2:
+                self.size = min(self.maximum, self.size * 2)
+
+def parse_server(imap_server):
+    """
+    'imap.gmail.com' -> (host, 993, TLS); 'host:port' -> TLS on that port;
+    'imap://host:port' -> plaintext, for local test servers only.
+    """
+    use_ssl = True
+    server = imap_server
+    if server.startswith('imaps://'):
+        server = server[len('imaps://'):]
+    elif server.startswith('imap://'):
+        server = server[len('imap://'):]
+        use_ssl = False
+    host, _, port = server.partition(':')
+    return host, int(port) if port else (993 if use_ssl else 143), use_ssl
+
+# --- BODYSTRUCTURE ---
+
+_SEXP_TOKEN = re.compile(rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"]+))')
+
+def flatten_response(msg_data):
+    """Join an imaplib FETCH response back into one byte string, turning literals into quoted strings."""
+    out = b''
+    for item in msg_data:
+        if isinstance(item, tuple):
+            prefix = re.sub(rb'\{\d+\}$', b'', item[0])
+            out += prefix + b'"' + item[1].replace(b'\\', b'\\\\').replace(b'"', b'\\"') + b'"'
+        elif isinstance(item, bytes):
+            out += item
+    return out
+
+def parse_sexp(data):
+    """Parse an IMAP parenthesized list into nested Python lists of str (NIL -> None)."""
+    stack = [[]]
+    for m in _SEXP_TOKEN.finditer(data):
+        opener, closer, quoted, atom = m.groups()
+        if opener:
+            stack.append([])
+        elif closer:
+            if len(stack) > 1:
+                done = stack.pop()
+                stack[-1].append(done)
+        elif quoted is not None:
+            stack[-1].append(re.sub(rb'\\(.)', rb'\1', quoted).decode('utf-8', 'replace'))
+        elif atom is not None:
+            stack[-1].append(None if atom.upper() == b'NIL' else atom.decode('utf-8', 'replace'))
+    return stack[0]
+
+def body_parts(structure, prefix=''):
+    """Leaf parts of a parsed BODYSTRUCTURE as dicts with the section number to fetch them by."""
+    if not structure:
+        return []
+    if isinstance(structure[0], list):
+        # Child parts come first, then the subtype and extension fields
+        parts = []
+        for index, child in enumerate(structure):
+            if not isinstance(child, list):
+                break
+            parts.extend(body_parts(child, f'{prefix}.{index + 1}' if prefix else str(index + 1)))
+        return parts
+    params = structure[2] if len(structure) > 2 and isinstance(structure[2], list) else []
+    params = {str(params[i]).lower(): params[i + 1] for i in range(0, len(params) - 1, 2)}
+    try:
+        size = int(structure[6])
+    except (IndexError, TypeError, ValueError):
+        size = 0
+    return [{
+        'section': prefix or '1',
+        'type': f'{structure[0]}/{structure[1]}'.lower(),
+        'charset': params.get('charset') or 'utf-8',
+        'encoding': (structure[5] if len(structure) > 5 and structure[5] else '7bit').lower(),
+        'size': size,
+    }]
+
+def find_bodystructure(msg_data):
+    """Pull the BODYSTRUCTURE list out of a FETCH response."""
+    flat = flatten_response(msg_data)
+    index = flat.upper().find(b'BODYSTRUCTURE')
+    if index < 0:
+        return None
+    parsed = parse_sexp(flat[index + len(b'BODYSTRUCTURE'):])
+    return parsed[0] if parsed and isinstance(parsed[0], list) else None
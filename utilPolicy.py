@@ -0,0 +1,152 @@
+from datetime import datetime, timedelta
+
+import pytz
+
+from utilImap import build_search_criteria, quote_string, gmail_query, has_gmail_extensions
+from utilRecords import AccountContext, EmailList
+from utilClean import (
+    SPAM_FOLDERS, TRASH_FOLDERS, match_folders, get_folder_list, get_connection_pool, get_email_info_batch,
+    SENDER_CHECK_BATCH, delete_uids
+)
+
+# --- Cleanup policies ---
+# Each scheduled delete option is a list of rules (which folders, which messages in them),
+# and each rule compiles to UID SEARCH criteria. A cleanup is then one SELECT + SEARCH per
+# folder and a bulk delete of the UIDs the server returns; headers are only fetched when
+# the user asks for a preview.
+
+# List mail: a List-Unsubscribe or List-Id header, or Precedence: bulk/list. The same on every
+# provider (Gmail too: its Promotions tab is neither all of nor only list mail)
+SUBSCRIPTION_CRITERIA = (
+    'OR OR HEADER List-Unsubscribe "" HEADER List-Id "" OR HEADER Precedence "bulk" HEADER Precedence "list"'
+)
+PREVIEW_LIMIT = 50  # newest messages per option whose headers a preview fetches
+
+
+class Rule:
+    """Messages in `folders` (names as in SPAM_FOLDERS) matching every condition given."""
+    __slots__ = ('folders', 'seen', 'older_than', 'sender', 'subscription')
+
+    def __init__(self, folders, seen=None, older_than=None, sender=None, subscription=False):
+        self.folders = folders
+        self.seen = seen                  # True: read only, False: unread only
+        self.older_than = older_than      # days
+        self.sender = sender              # address, or '@domain'
+        self.subscription = subscription
+
+
+POLICIES = {
+    "Unread Emails": [Rule(['INBOX'], seen=False, older_than=7)],
+    "Old Emails": [Rule(['INBOX'], seen=True, older_than=30)],
+    "Subscription Emails": [Rule(['INBOX'], subscription=True)],
+    "Spam": [Rule(SPAM_FOLDERS)],
+    "Trash": [Rule(TRASH_FOLDERS)],
+}
+
+
+def compile_gmail_rule(rule):
+    """
+    The same rule with its read state, age and sender as one Gmail search, e.g.
+    'X-GM-RAW "is:read older_than:30d"'; list mail is still matched on its headers.
+    """
+    terms = []
+    if rule.seen is not None:
+        terms.append('is:read' if rule.seen else 'is:unread')
+    if rule.older_than is not None:
+        terms.append(f'older_than:{rule.older_than}d')
+    if rule.sender:
+        terms.append(f'from:{rule.sender.lstrip("@")}')
+    extra = [gmail_query(*terms)] if terms else []
+    if rule.subscription:
+        extra.append(SUBSCRIPTION_CRITERIA)
+    return build_search_criteria(extra=extra)
+
+
+def compile_rule(rule, now=None, gmail=False):
+    """UID SEARCH criteria for a rule, e.g. 'SEEN BEFORE 18-Sep-2026'."""
+    if gmail:
+        return compile_gmail_rule(rule)
+    now = now or datetime.now(pytz.timezone('Asia/Manila'))
+    extra = []
+    if rule.sender:
+        extra.append(f'FROM {quote_string(rule.sender)}')
+    if rule.subscription:
+        extra.append(SUBSCRIPTION_CRITERIA)
+    before = now - timedelta(days=rule.older_than) if rule.older_than is not None else None
+    unseen = None if rule.seen is None else not rule.seen
+    return build_search_criteria(before=before, unseen=unseen, extra=extra)
+
+
+def plan_cleanup(delete_options, all_folders, now=None, gmail=False):
+    """(option, folder, criteria, rule) for every folder the selected options touch."""
+    plan = []
+    for option in delete_options:
+        for rule in POLICIES.get(option, ()):
+            criteria = compile_rule(rule, now, gmail)
+            plan.extend((option, folder, criteria, rule) for folder in match_folders(all_folders, rule.folders))
+    return plan
+
+
+def search_rule(mail, folder, criteria, rule):
+    """UIDs matching one compiled rule in the selected folder."""
+    typ, data = mail.uid('SEARCH', None, criteria)
+    if typ == 'OK':
+        return [uid.decode() for uid in data[0].split()] if data and data[0] else []
+    if not rule.subscription:
+        print(f"SEARCH {criteria} failed in {folder}: {data}")
+        return []
+    # Servers that cannot SEARCH on arbitrary headers: classify the folder from its headers
+    # instead, on this connection (a UI user's pool has no second one to scan with)
+    typ, data = mail.uid('SEARCH', None, 'ALL')
+    uids = data[0].split() if typ == 'OK' and data and data[0] else []
+    matches = []
+    for start in range(0, len(uids), SENDER_CHECK_BATCH):
+        records = get_email_info_batch(mail, [uid.decode() for uid in uids[start:start + SENDER_CHECK_BATCH]])
+        matches.extend(record.uid for record in records if record.bulk)
+    return matches
+
+
+def run_cleanup(email_address, password, imap_server, delete_options, permanent=True, preview=False, now=None):
+    """
+    Run the selected delete options server-side. Returns {option: deleted count}; with
+    preview=True nothing is deleted and it returns {option: {'count', 'sample'}}, where
+    sample is an EmailList of the newest PREVIEW_LIMIT matches.
+    """
+    account = AccountContext(email_address, password, imap_server)
+    pool = get_connection_pool(email_address, password, imap_server)
+    mail = pool.acquire()
+    if not mail:
+        return None
+
+    report = {option: ({'count': 0, 'sample': EmailList(account=account)} if preview else 0)
+              for option in delete_options}
+    done = {}  # folder -> UIDs an earlier option already deleted (or previewed)
+    broken = False
+    try:
+        all_folders = get_folder_list(mail)
+        gmail = has_gmail_extensions(mail) and now is None  # Gmail searches are relative to today
+        for option, folder, criteria, rule in plan_cleanup(delete_options, all_folders, now, gmail):
+            if mail.select(folder, readonly=preview)[0] != 'OK':
+                continue
+            seen = done.setdefault(folder, set())
+            uids = [uid for uid in search_rule(mail, folder, criteria, rule) if uid not in seen]
+            seen.update(uids)
+            if not uids:
+                continue
+            if preview:
+                report[option]['count'] += len(uids)
+                sample = get_email_info_batch(mail, sorted(uids, key=int)[-PREVIEW_LIMIT:])
+                for record in sample:
+                    record.folder = folder
+                report[option]['sample'].extend(sample)
+            else:
+                report[option] += delete_uids(mail, folder, uids, all_folders, permanent)
+                mail.close_folder()
+        return report
+    except Exception as e:
+        print(f"Cleanup failed for {email_address}: {e}")
+        broken = True
+        return None
+    finally:
+        mail.close_folder()
+        pool.release(mail, broken=broken)
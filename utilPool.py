@@ -0,0 +1,354 @@
+import imaplib
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from utilImap import parse_server, quote_folder
+
+# --- Pooled IMAP sessions ---
+# One pool per (account, server). Sessions stay logged in between chunks and
+# remember which folder they have selected, so workers only pay for LOGIN and
+# SELECT once instead of once per chunk.
+
+DEFAULT_POOL_SIZE = 4
+NOOP_AFTER = 30       # seconds idle before a session is health-checked
+MAX_IDLE = 300        # seconds idle before a session is logged out
+
+# Errors after which a connection is unusable: imaplib raises abort for socket errors and
+# BYE, OSError escapes from a few paths that do not wrap it. A plain IMAP4.error (NO/BAD)
+# leaves the connection usable.
+CONNECTION_ERRORS = (imaplib.IMAP4.abort, OSError)
+
+# --- Connection budgets ---
+# Providers cap simultaneous IMAP connections per account (Gmail: 15) and drop logins past
+# the cap, so each pool is sized from its provider's limit minus a few connections left for
+# the user's own mail clients. A process-wide cap bounds the total when many accounts are
+# cleaned at once; a pool's first connection waits for a free slot, extra ones are skipped.
+
+PROVIDER_CONNECTION_LIMITS = {
+    'imap.gmail.com': 15,
+}
+DEFAULT_PROVIDER_LIMIT = 8
+RESERVED_CONNECTIONS = 3
+GLOBAL_CONNECTION_LIMIT = 60
+GLOBAL_WAIT = 600     # seconds a pool's first connection waits for a global slot
+
+_global_slots = threading.BoundedSemaphore(GLOBAL_CONNECTION_LIMIT)
+
+
+def connection_budget(imap_server):
+    """How many connections one account on this server may use at once."""
+    host = parse_server(imap_server)[0].lower()
+    limit = PROVIDER_CONNECTION_LIMITS.get(host, DEFAULT_PROVIDER_LIMIT)
+    return max(2, limit - RESERVED_CONNECTIONS)
+
+
+class IMAPSession:
+    """
+    An authenticated connection plus the folder it currently has selected.
+    Anything that is not session bookkeeping is forwarded to the imaplib connection,
+    so a session can be passed wherever a plain `mail` object is expected.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.folder = None
+        self.readonly = False
+        self.last_used = time.time()
+
+    def __getattr__(self, name):
+        attr = getattr(self.conn, name)
+        if not callable(attr):
+            return attr
+
+        def command(*args, **kwargs):
+            try:
+                return attr(*args, **kwargs)
+            except (imaplib.IMAP4.error, OSError):
+                # The server's idea of the selected folder is unknown now; SELECT again next time
+                self.folder = None
+                raise
+        return command
+
+    def select(self, folder='INBOX', readonly=False):
+        if self.folder == folder and self.readonly == readonly:
+            return 'OK', [b'']
+        try:
+            typ, data = self.conn.select(quote_folder(folder), readonly=readonly)
+        except (imaplib.IMAP4.error, OSError):
+            self.folder = None
+            raise
+        if typ != 'OK':
+            self.folder = None
+            return typ, data
+        self.folder = folder
+        self.readonly = readonly
+        return typ, data
+
+    def close_folder(self):
+        """CLOSE the selected folder (expunges \\Deleted messages on writable selects)."""
+        if self.folder is None:
+            return
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+        self.folder = None
+
+    def is_alive(self):
+        try:
+            typ, _ = self.conn.noop()
+            return typ == 'OK'
+        except Exception:
+            return False
+
+    def logout(self):
+        try:
+            if self.folder is not None:
+                self.conn.close()
+        except Exception:
+            pass
+        try:
+            self.conn.logout()
+        except Exception:
+            pass
+        self.folder = None
+
+
+class IMAPPool:
+    def __init__(self, email_address, password, imap_server, connect, size=DEFAULT_POOL_SIZE):
+        self.email_address = email_address
+        self.password = password
+        self.imap_server = imap_server
+        self.size = size
+        self._connect = connect
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self.logins = 0
+        self.open_count = 0
+        self.closed = False
+        # Idle sessions last used before this are NOOPed before reuse: when one connection
+        # turns out dead (network change, server restart) its idle siblings usually are too
+        self._verify_before = 0.0
+
+    def _take_idle(self, folder):
+        with self._lock:
+            if not self._idle:
+                return None
+            # Prefer a session that already has the folder selected
+            for session in self._idle:
+                if folder is not None and session.folder == folder:
+                    self._idle.remove(session)
+                    return session
+            return self._idle.pop()
+
+    def _open(self):
+        with self._lock:
+            first = self.open_count == 0
+        if first:
+            acquired = _global_slots.acquire(timeout=GLOBAL_WAIT)
+        else:
+            acquired = _global_slots.acquire(blocking=False)
+        if not acquired:
+            return None
+        try:
+            conn = self._connect(self.email_address, self.password, self.imap_server)
+        except Exception:
+            conn = None
+        if not conn:
+            _global_slots.release()
+            return None
+        with self._lock:
+            self.logins += 1
+            self.open_count += 1
+        return IMAPSession(conn)
+
+    def _discard(self, session):
+        session.logout()
+        with self._lock:
+            self.open_count -= 1
+        _global_slots.release()
+
+    def acquire(self, folder=None, readonly=False, timeout=None):
+        acquired = self._slots.acquire(timeout=timeout) if timeout is not None else self._slots.acquire()
+        if not acquired:
+            return None
+        session = None
+        try:
+            while True:
+                session = self._take_idle(folder)
+                if session is None:
+                    break
+                idle_for = time.time() - session.last_used
+                suspect = idle_for > NOOP_AFTER or session.last_used < self._verify_before
+                if idle_for > MAX_IDLE or (suspect and not session.is_alive()):
+                    self._discard(session)
+                    session = None
+                    continue
+                break
+
+            if session is None:
+                session = self._open()
+                if session is None:
+                    self._slots.release()
+                    return None
+
+            if folder is not None and session.select(folder, readonly=readonly)[0] != 'OK':
+                self.release(session, broken=True)
+                return None
+            return session
+        except Exception as e:
+            print(f"Pool acquire failed: {e}")
+            if session is not None:
+                # Logged in but unusable: give back its global slot and open_count too
+                self._discard(session)
+            self._slots.release()
+            return None
+
+    def adopt(self, conn):
+        """
+        Keep a connection that is already logged in (the login page's) as an idle session.
+        Logs it out instead if the pool is full or closed, or no global slot is free.
+        """
+        session = IMAPSession(conn)
+        with self._lock:
+            keep = not self.closed and self.open_count < self.size and _global_slots.acquire(blocking=False)
+            if keep:
+                self.logins += 1
+                self.open_count += 1
+                self._idle.append(session)
+        if not keep:
+            session.logout()
+        return keep
+
+    @property
+    def in_use(self):
+        """Sessions checked out right now."""
+        with self._lock:
+            return self.open_count - len(self._idle)
+
+    def release(self, session, broken=False):
+        try:
+            if broken or self.closed:
+                # A closed pool keeps no sessions: log out the ones that come back late
+                if broken:
+                    self._verify_before = time.time()
+                self._discard(session)
+            else:
+                session.last_used = time.time()
+                with self._lock:
+                    self._idle.append(session)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def session(self, folder=None, readonly=False):
+        session = self.acquire(folder, readonly=readonly)
+        broken = False
+        try:
+            yield session
+        except Exception:
+            broken = True
+            raise
+        finally:
+            if session is not None:
+                self.release(session, broken=broken)
+
+    def prune(self, max_idle=MAX_IDLE):
+        """Log out idle sessions unused for `max_idle` seconds; returns how many were closed."""
+        cutoff = time.time() - max_idle
+        with self._lock:
+            stale = [s for s in self._idle if s.last_used < cutoff]
+            for session in stale:
+                self._idle.remove(session)
+        for session in stale:
+            self._discard(session)
+        return len(stale)
+
+    def keepalive(self, every=NOOP_AFTER):
+        """NOOP idle sessions quiet for `every` seconds so the server keeps them; log out dead ones."""
+        cutoff = time.time() - every
+        with self._lock:
+            quiet = [s for s in self._idle if s.last_used < cutoff]
+        for session in quiet:
+            # Check the session out while it is NOOPed, so nobody else picks it up meanwhile
+            if not self._slots.acquire(blocking=False):
+                return
+            with self._lock:
+                taken = session in self._idle
+                if taken:
+                    self._idle.remove(session)
+            if not taken:
+                self._slots.release()
+                continue
+            self.release(session, broken=not session.is_alive())
+
+    def close(self):
+        """Log out idle sessions now and checked-out ones as they are released."""
+        with self._lock:
+            self.closed = True
+            sessions = list(self._idle)
+            self._idle.clear()
+        for session in sessions:
+            self._discard(session)
+
+
+_pools = {}
+_size_caps = {}  # (email, server) -> most sessions the account's pool may hold
+_pools_lock = threading.Lock()
+
+
+def cap_pool(email_address, imap_server, size):
+    """Hold the account's pool to at most `size` sessions from now on (None lifts the cap)."""
+    with _pools_lock:
+        if size is None:
+            _size_caps.pop((email_address, imap_server), None)
+        else:
+            _size_caps[(email_address, imap_server)] = size
+
+
+def get_pool(email_address, password, imap_server, connect, size=DEFAULT_POOL_SIZE):
+    """
+    The account's pool, at most its cap (see cap_pool) in size. A new password or a different
+    size replaces it, but only once nothing is checked out of it: until then callers share the
+    old one, so the account never holds the old pool's sessions and a new pool's at once.
+    """
+    key = (email_address, imap_server)
+    with _pools_lock:
+        cap = _size_caps.get(key)
+        if cap is not None:
+            size = min(size, cap)
+        pool = _pools.get(key)
+        if pool is not None and pool.password == password and size <= pool.size <= (cap or pool.size):
+            return pool
+        if pool is not None and pool.in_use:
+            return pool
+        if pool is not None:
+            pool.close()
+        pool = IMAPPool(email_address, password, imap_server, connect, size=size)
+        _pools[key] = pool
+        return pool
+
+
+def close_pool(email_address, imap_server):
+    with _pools_lock:
+        pool = _pools.pop((email_address, imap_server), None)
+    if pool is not None:
+        pool.close()
+
+
+def close_all_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def prune_pools(max_idle=MAX_IDLE):
+    """Close sessions that idled past `max_idle` in every pool, so finished scans release their logins."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return sum(pool.prune(max_idle) for pool in pools)
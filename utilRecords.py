@@ -0,0 +1,132 @@
+import sys
+from collections.abc import Sequence
+
+from utilSearch import EmailIndex
+
+# --- Compact scan results ---
+# A scan can return hundreds of thousands of messages and the whole result is kept in
+# st.session_state. Records are __slots__ objects instead of dicts, sender strings are
+# interned so a newsletter that sent 5,000 messages stores its From once, and the account
+# a result belongs to lives on the container instead of being copied into every record.
+
+class AccountContext:
+    """The one mailbox a set of records came from; what delete_emails needs to reconnect."""
+    __slots__ = ('email_address', 'password', 'imap_server')
+
+    def __init__(self, email_address, password, imap_server):
+        self.email_address = email_address
+        self.password = password
+        self.imap_server = imap_server
+
+    def __repr__(self):
+        return f'AccountContext({self.email_address!r}, {self.imap_server!r})'
+
+
+class EmailRecord:
+    FIELDS = ('uid', 'subject', 'sender', 'date', 'message_id', 'datetime', 'size', 'folder', 'bulk', 'unsubscribe',
+              'one_click', 'gm_msgid', 'labels')
+    __slots__ = FIELDS
+
+    def __init__(self, uid, subject, sender, date, message_id, datetime, size=None, folder=None,
+                 bulk=False, unsubscribe=None, one_click=False, gm_msgid=None, labels=None):
+        self.uid = uid
+        self.subject = subject
+        self.sender = sys.intern(sender) if sender else sender
+        self.date = date
+        self.message_id = message_id
+        self.datetime = datetime
+        self.size = size  # RFC822.SIZE in bytes
+        self.folder = folder
+        self.bulk = bulk                # List-Unsubscribe, List-Id or Precedence: bulk/list/junk
+        self.unsubscribe = unsubscribe  # List-Unsubscribe link (http preferred), if any
+        self.one_click = one_click      # List-Unsubscribe-Post: the link takes a one-click POST (RFC 8058)
+        self.gm_msgid = gm_msgid        # Gmail's X-GM-MSGID, the same in every folder the message is in
+        self.labels = labels            # Gmail X-GM-LABELS at fetch time (not cached: labels change)
+
+    # Mapping-style access so code written against the old dict records keeps working
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.FIELDS else default
+
+    def keys(self):
+        return self.FIELDS
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __repr__(self):
+        return f'EmailRecord(uid={self.uid!r}, sender={self.sender!r}, subject={self.subject!r})'
+
+
+class EmailList(Sequence):
+    """A list of EmailRecords plus the AccountContext they belong to."""
+
+    def __init__(self, records=(), account=None):
+        self._records = list(records)
+        self.account = account
+        self._index = None
+
+    def __len__(self):
+        return len(self._records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return EmailList(self._records[index], self.account)
+        return self._records[index]
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __add__(self, other):
+        return EmailList(self._records + list(other), self.account or getattr(other, 'account', None))
+
+    def __repr__(self):
+        return f'EmailList({len(self._records)} records, account={self.account!r})'
+
+    def append(self, record):
+        self._records.append(record)
+        self._index = None
+
+    def extend(self, records):
+        self._records.extend(records)
+        self._index = None
+
+    @property
+    def index(self):
+        """EmailIndex over these records, built on first use and kept until the list changes."""
+        if self._index is None:
+            self._index = EmailIndex(self._records)
+        return self._index
+
+    def search(self, **filters):
+        """Matching records as a new EmailList, sorted; see EmailIndex.search for the filters."""
+        records = self._records
+        return EmailList((records[p] for p in self.index.search(**filters)), self.account)
+
+    def copy(self):
+        return EmailList(self._records, self.account)
+
+    def sort(self, key=None, reverse=False):
+        self._records.sort(key=key, reverse=reverse)
+        self._index = None
+
+    def filter(self, predicate):
+        return EmailList((r for r in self._records if predicate(r)), self.account)
+
+    def uids(self):
+        return [r.uid for r in self._records if r.uid]
+
+
+RESULT_GROUPS = ('unread', 'spam', 'junk', 'trash', 'subscriptions', 'unsubscribe_mentions')
+SCAN_GROUPS = ('unread', 'spam', 'junk', 'trash', 'subscriptions')  # what a scan covers by default
+
+def empty_results(email_address, password, imap_server):
+    """The scan result dict, with every group sharing one AccountContext."""
+    account = AccountContext(email_address, password, imap_server)
+    results = {group: EmailList(account=account) for group in RESULT_GROUPS}
+    results.update({'folders': [], 'total_unread_count': 0, 'scan_time': 0, 'account': account})
+    return results
@@ -0,0 +1,133 @@
+import heapq
+import random
+from datetime import datetime, timedelta
+
+import pytz
+
+from utilStore import get_state_store
+
+# --- Schedule bookkeeping for the cleanup daemon ---
+# Configs are loaded once from the state store and re-read only when their version
+# changes (every save that changes a config gives it a new one). Every enabled config
+# has its next fire time in a heap, so the daemon sleeps until the earliest one instead
+# of waking every minute to compare HH:MM strings.
+
+TIMEZONE = pytz.timezone("Asia/Manila")
+JITTER_SECONDS = 60       # spread jobs that share a fire time over this many seconds
+
+def parse_schedule_time(value):
+    try:
+        hour, minute = (int(part) for part in str(value).strip().split(":"))
+        if 0 <= hour < 24 and 0 <= minute < 60:
+            return hour, minute
+    except (TypeError, ValueError):
+        pass
+    return None
+
+def runs_on(config, day):
+    """Whether the config's `frequency` (and `custom_days`) selects this date."""
+    freq = config.get("frequency")
+    return (
+        freq == "Every day"
+        or (freq == "Every Monday" and day.strftime("%A") == "Monday")
+        or (freq == "Every 1st of the Month" and day.day == 1)
+        or (freq == "Custom" and day.strftime("%A") in config.get("custom_days", []))
+    )
+
+def run_once_at(config):
+    """The config's one-off run (tz-aware), or None. It replaces the regular run on its day."""
+    if not (config.get("run_once") and config.get("run_date")):
+        return None
+    try:
+        return TIMEZONE.localize(datetime.strptime(config["run_date"], "%Y-%m-%d %H:%M"))
+    except ValueError:
+        print(f"⚠️ Bad run_date for {config.get('email')}: {config['run_date']}")
+        return None
+
+def next_fire_time(config, after):
+    """Earliest time strictly after `after` (tz-aware) at which the config is due, or None."""
+    if not config.get("enabled", False):
+        return None
+    candidates = []
+
+    once = run_once_at(config)
+    if once is not None and once > after:
+        candidates.append(once)
+
+    hhmm = parse_schedule_time(config.get("time"))
+    if hhmm:
+        local = after.astimezone(TIMEZONE)
+        for offset in range(0, 63):  # far enough to reach the next 1st of the month
+            day = (local + timedelta(days=offset)).date()
+            if once is not None and day == once.date():
+                continue
+            fire = TIMEZONE.localize(datetime(day.year, day.month, day.day, *hhmm))
+            if fire > after and runs_on(config, day):
+                candidates.append(fire)
+                break
+
+    return min(candidates) if candidates else None
+
+
+class ScheduleStore:
+    """Schedule configs by account, as of the last refresh from the state store."""
+
+    def __init__(self, store=None):
+        self.store = store or get_state_store()
+        self.configs = {}
+        self._version = 0
+
+    def refresh(self):
+        """Return {account: config or None (removed)} for everything that changed since the last call."""
+        self._version, changed = self.store.schedules_since(self._version)
+        for account, config in changed.items():
+            if config is None:
+                self.configs.pop(account, None)
+            else:
+                self.configs[account] = config
+        return changed
+
+
+class FireQueue:
+    """
+    Min-heap of (fire time, key). Rescheduling a key gives it a new generation instead of
+    searching the heap; entries from older generations are dropped when they surface.
+    """
+
+    def __init__(self, jitter=JITTER_SECONDS):
+        self.jitter = jitter
+        self._heap = []
+        self._generation = {}
+        self._seq = 0
+
+    def __len__(self):
+        return len(self._generation)
+
+    def schedule(self, key, config, after):
+        """(Re)compute the next fire for `key`; a None config or no future fire unschedules it."""
+        fire = next_fire_time(config, after) if config else None
+        if fire is None:
+            self._generation.pop(key, None)
+            return None
+        self._seq += 1
+        self._generation[key] = self._seq
+        due = fire + timedelta(seconds=random.uniform(0, self.jitter)) if self.jitter else fire
+        heapq.heappush(self._heap, (due, self._seq, key, fire))
+        return due
+
+    def _drop_stale(self):
+        while self._heap and self._generation.get(self._heap[0][2]) != self._heap[0][1]:
+            heapq.heappop(self._heap)
+
+    def next_due(self):
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        """(key, nominal fire time) of the earliest job due by `now`, or None."""
+        self._drop_stale()
+        if not self._heap or self._heap[0][0] > now:
+            return None
+        _, _, key, fire = heapq.heappop(self._heap)
+        self._generation.pop(key, None)
+        return key, fire
@@ -0,0 +1,205 @@
+import bisect
+import re
+from array import array
+from datetime import date, datetime, time as dtime
+
+import pytz
+
+from utilSenders import sender_address, sender_domain
+
+# --- Search over scan results ---
+# Built once per result list (EmailList.index) and reused by every rerun. Senders and
+# subjects repeat a lot, so each distinct string is lower-cased and indexed once: word
+# tokens (sorted, for prefix search) and trigrams (for substring search) point at string
+# ids, and each string id points at the records that carry it. Sort orders are
+# precomputed permutations, so filtering and sorting never touch every record's text.
+
+TOKEN_RE = re.compile(r'\w+')
+SCAN_BELOW = 2000   # with fewer distinct strings a plain substring scan beats building trigrams
+SORT_ORDERS = ('newest', 'oldest', 'sender', 'subject')
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TextIndex:
+    """Distinct values of one field with token and trigram postings (arrays of string ids)."""
+
+    def __init__(self):
+        self.ids = {}
+        self.lowered = []
+        self.records = []  # string id -> record positions
+        self.tokens = {}
+        self.vocabulary = []
+        self._grams = None
+
+    def add(self, text, position):
+        text = text or ''
+        string_id = self.ids.get(text)
+        if string_id is None:
+            string_id = self.ids[text] = len(self.lowered)
+            lowered = text.lower()
+            self.lowered.append(lowered)
+            self.records.append(array('I'))
+            for token in set(TOKEN_RE.findall(lowered)):
+                self.tokens.setdefault(token, array('I')).append(string_id)
+        self.records[string_id].append(position)
+        return string_id
+
+    def freeze(self):
+        self.vocabulary = sorted(self.tokens)
+
+    @property
+    def grams(self):
+        """Trigram postings, built on the first substring search since they are the costly part."""
+        if self._grams is None:
+            grams = {}
+            for string_id, text in enumerate(self.lowered):
+                for gram in trigrams(text):
+                    grams.setdefault(gram, array('I')).append(string_id)
+            self._grams = grams
+        return self._grams
+
+    def match(self, query, prefix=False):
+        """String ids whose text contains `query` (or has a word starting with it, if `prefix`)."""
+        query = query.lower().strip()
+        if not query:
+            return set(range(len(self.lowered)))
+        if prefix:
+            found = set()
+            start = bisect.bisect_left(self.vocabulary, query)
+            for token in self.vocabulary[start:]:
+                if not token.startswith(query):
+                    break
+                found.update(self.tokens[token])
+            return found
+        if len(query) < 3 or len(self.lowered) < SCAN_BELOW:
+            return {i for i, text in enumerate(self.lowered) if query in text}
+        # The rarest trigram gives the candidates; a substring test on each confirms it
+        grams = self.grams
+        postings = [grams.get(gram) for gram in trigrams(query)]
+        if not all(postings):
+            return set()
+        candidates = min(postings, key=len)
+        return {i for i in candidates if query in self.lowered[i]}
+
+    def positions(self, string_ids):
+        found = set()
+        for string_id in string_ids:
+            found.update(self.records[string_id])
+        return found
+
+    def ranks(self):
+        """Alphabetical rank of every string id, for sorting records by this field."""
+        ranks = array('I', bytes(4 * len(self.lowered)))
+        for rank, string_id in enumerate(sorted(range(len(self.lowered)), key=self.lowered.__getitem__)):
+            ranks[string_id] = rank
+        return ranks
+
+
+def timestamp(value, end=False):
+    """
+    Epoch seconds for a datetime (naive ones taken as UTC), or for the start (end=True: end)
+    of a date on the app's local calendar, like the cutoff in get_cutoff_date.
+    """
+    if isinstance(value, datetime):
+        return (value if value.tzinfo else pytz.utc.localize(value)).timestamp()
+    if isinstance(value, date):
+        local = pytz.timezone('Asia/Manila')
+        return local.localize(datetime.combine(value, dtime.max if end else dtime.min)).timestamp()
+    return float(value)
+
+
+class EmailIndex:
+    def __init__(self, records):
+        self.records = records
+        self.senders = TextIndex()
+        self.subjects = TextIndex()
+        self.domains = {}
+        self.folders = {}
+        self.sender_ids = array('I')
+        self.subject_ids = array('I')
+        self.timestamps = array('d')
+        for position, record in enumerate(records):
+            self.sender_ids.append(self.senders.add(record.sender, position))
+            self.subject_ids.append(self.subjects.add(record.subject, position))
+            domain = sender_domain(sender_address(record.sender))
+            self.domains.setdefault(domain, array('I')).append(position)
+            self.folders.setdefault(record.folder, array('I')).append(position)
+            self.timestamps.append(record.datetime.timestamp() if record.datetime else float('-inf'))
+        self.senders.freeze()
+        self.subjects.freeze()
+        self._orders = {}
+        self._ranks = {}
+        self._dates = None
+
+    def __len__(self):
+        return len(self.records)
+
+    def order(self, sort='newest'):
+        """Record positions in the given sort order, computed on first use."""
+        positions = self._orders.get(sort)
+        if positions is None:
+            everything = range(len(self.records))
+            if sort == 'newest':
+                key, reverse = self.timestamps.__getitem__, True
+            elif sort == 'oldest':
+                key, reverse = self.timestamps.__getitem__, False
+            elif sort == 'sender':
+                ranks = self.senders.ranks()
+                key, reverse = (lambda p: ranks[self.sender_ids[p]]), False
+            elif sort == 'subject':
+                ranks = self.subjects.ranks()
+                key, reverse = (lambda p: ranks[self.subject_ids[p]]), False
+            else:
+                raise ValueError(f"Unknown sort order: {sort}")
+            positions = self._orders[sort] = array('I', sorted(everything, key=key, reverse=reverse))
+        return positions
+
+    def rank(self, sort):
+        """Inverse of order(sort): where each record lands in that order."""
+        ranks = self._ranks.get(sort)
+        if ranks is None:
+            ranks = array('I', bytes(4 * len(self.records)))
+            for index, position in enumerate(self.order(sort)):
+                ranks[position] = index
+            self._ranks[sort] = ranks
+        return ranks
+
+    def in_date_range(self, since=None, until=None):
+        if self._dates is None:
+            oldest = self.order('oldest')
+            self._dates = (oldest, [self.timestamps[p] for p in oldest])
+        oldest, stamps = self._dates
+        lo = bisect.bisect_left(stamps, timestamp(since)) if since is not None else 0
+        hi = bisect.bisect_right(stamps, timestamp(until, end=True)) if until is not None else len(stamps)
+        return set(oldest[lo:hi])
+
+    def search(self, text=None, sender=None, domain=None, since=None, until=None, folder=None,
+               sort='newest', prefix=False):
+        """
+        Positions of the matching records in `sort` order. `text` matches sender or subject,
+        `sender` the sender only; both are substring matches, or word-prefix matches with
+        `prefix`. `domain` and `folder` are exact, `since`/`until` inclusive dates or datetimes.
+        """
+        matches = []
+        if text:
+            matches.append(self.senders.positions(self.senders.match(text, prefix))
+                           | self.subjects.positions(self.subjects.match(text, prefix)))
+        if sender:
+            matches.append(self.senders.positions(self.senders.match(sender, prefix)))
+        if domain:
+            matches.append(set(self.domains.get(domain.lower().lstrip('@'), ())))
+        if folder:
+            matches.append(set(self.folders.get(folder, ())))
+        if since is not None or until is not None:
+            matches.append(self.in_date_range(since, until))
+
+        if not matches:
+            return self.order(sort)
+        matches.sort(key=len)
+        found = matches[0].intersection(*matches[1:])
+        if len(found) * 8 > len(self.records):
+            return [p for p in self.order(sort) if p in found]
+        return sorted(found, key=self.rank(sort).__getitem__)
@@ -0,0 +1,124 @@
+import functools
+import heapq
+from email.utils import parseaddr
+
+# --- Sender / domain usage index ---
+# Streaming "top offenders" aggregation over scan records: message count, total bytes
+# (RFC822.SIZE) and oldest/newest message per sender address and per domain. Each table
+# tracks at most `capacity` keys with the Space-Saving scheme: when it is full, a new key
+# takes over the entry that is smallest by the table's metric (a min-heap finds it) and
+# inherits that value as an error bound. Ranking by count and by size needs different
+# survivors (one 40 MB attachment vs. a thousand tiny alerts), so there is one table per
+# metric. Heavy senders are never evicted, so memory stays bounded on any mailbox.
+
+ADDRESS_CAPACITY = 5000
+DOMAIN_CAPACITY = 2000
+
+@functools.lru_cache(maxsize=16384)
+def sender_address(sender):
+    """'Shopee <news@shopee.example>' -> 'news@shopee.example' (lower-cased; '' if none)."""
+    return parseaddr(sender or '')[1].strip().lower()
+
+def sender_domain(address):
+    return address.rpartition('@')[2] if '@' in address else ''
+
+
+class SenderStats:
+    __slots__ = ('key', 'count', 'bytes', 'oldest', 'newest', 'error', 'name')
+
+    def __init__(self, key):
+        self.key = key
+        self.count = 0
+        self.bytes = 0
+        self.oldest = None
+        self.newest = None
+        self.error = 0  # count (or bytes) that may have belonged to an evicted key
+        self.name = None
+
+    def add(self, record):
+        self.count += 1
+        self.bytes += record.size or 0
+        when = record.datetime
+        if when is not None:
+            if self.oldest is None or when < self.oldest:
+                self.oldest = when
+            if self.newest is None or when > self.newest:
+                self.newest = when
+
+    def to_dict(self):
+        return {
+            'key': self.key, 'name': self.name, 'count': self.count, 'bytes': self.bytes,
+            'oldest': self.oldest, 'newest': self.newest, 'error': self.error,
+        }
+
+
+class TopK:
+    """Space-Saving table of SenderStats keyed by address or domain, evicting by `by` ('count' or 'bytes')."""
+
+    def __init__(self, capacity, by='count'):
+        self.capacity = capacity
+        self.by = by
+        self.entries = {}
+        self._heap = []  # (value, key); stale entries are skipped lazily
+
+    def add(self, key, record):
+        stats = self.entries.get(key)
+        if stats is None:
+            stats = SenderStats(key)
+            if len(self.entries) >= self.capacity:
+                stats.error = self._evict()
+                setattr(stats, self.by, stats.error)
+            self.entries[key] = stats
+        stats.add(record)
+        heapq.heappush(self._heap, (getattr(stats, self.by), key))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(getattr(s, self.by), k) for k, s in self.entries.items()]
+            heapq.heapify(self._heap)
+        return stats
+
+    def _evict(self):
+        while self._heap:
+            value, key = heapq.heappop(self._heap)
+            stats = self.entries.get(key)
+            if stats is not None and getattr(stats, self.by) == value:
+                del self.entries[key]
+                return value
+        return 0
+
+    def top(self, k=20):
+        return heapq.nlargest(k, self.entries.values(), key=lambda s: getattr(s, self.by))
+
+
+class SenderIndex:
+    """Per-address and per-domain usage, fed one scan record at a time."""
+
+    METRICS = ('count', 'bytes')
+
+    def __init__(self, address_capacity=ADDRESS_CAPACITY, domain_capacity=DOMAIN_CAPACITY):
+        self.addresses = {by: TopK(address_capacity, by) for by in self.METRICS}
+        self.domains = {by: TopK(domain_capacity, by) for by in self.METRICS}
+        self.messages = 0
+        self.bytes = 0
+
+    def add(self, record):
+        address = sender_address(record.sender)
+        if not address:
+            return
+        self.messages += 1
+        self.bytes += record.size or 0
+        domain = sender_domain(address)
+        for by in self.METRICS:
+            stats = self.addresses[by].add(address, record)
+            if stats.name is None:
+                stats.name = record.sender
+            self.domains[by].add(domain, record)
+
+    def add_all(self, records):
+        for record in records:
+            self.add(record)
+
+    def top_senders(self, k=20, by='bytes'):
+        return self.addresses[by].top(k)
+
+    def top_domains(self, k=20, by='bytes'):
+        return self.domains[by].top(k)
@@ -0,0 +1,166 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from utilPool import cap_pool, close_pool, get_pool, prune_pools
+
+# --- Long-lived sessions for the Streamlit pages ---
+# Streamlit re-runs a page script on every click, so anything opened in the script is
+# opened again on the next rerun. The pages get their IMAP connection and their scan
+# results from one SessionManager instead (kept by util.get_session_manager, which is a
+# st.cache_resource): one logged-in connection per account, shared with its scans, NOOPed while the user is
+# around and logged out once they are gone, and results kept for a few minutes under
+# (account, folder, window) so moving between pages does not log in or scan again.
+
+KEEPALIVE_EVERY = 240       # seconds between NOOPs on an idle connection
+SESSION_IDLE_EXPIRY = 1800  # seconds without use before a connection is logged out
+RESULT_TTL = 600            # seconds a cached scan result stays valid
+SWEEP_EVERY = 60            # how often the background sweep runs
+PAGE_POOL_SIZE = 1          # connections a UI user's scans and deletes may hold at once
+
+
+class UserSession:
+    """
+    One account's connection: the single session of the account's pool, capped at
+    PAGE_POOL_SIZE, so the pages' scans and deletes (which go through the pool) share it
+    instead of logging in again. Several tabs of the same user wait for each other.
+    """
+
+    def __init__(self, email_address, password, imap_server, connect):
+        self.email_address = email_address
+        self.password = password
+        self.imap_server = imap_server
+        self.last_active = time.time()
+        cap_pool(email_address, imap_server, PAGE_POOL_SIZE)
+        self.pool = get_pool(email_address, password, imap_server, connect, size=PAGE_POOL_SIZE)
+
+    def attach(self, conn):
+        """Adopt a connection that is already logged in (the one the login page just opened)."""
+        self.last_active = time.time()
+        self.pool.adopt(conn)
+
+    @contextmanager
+    def connection(self):
+        """`with user.connection() as mail:` the live connection, logging in again if the server dropped it."""
+        self.last_active = time.time()
+        with self.pool.session() as mail:
+            yield mail
+
+    def keepalive(self):
+        """NOOP the connection if it has been quiet for KEEPALIVE_EVERY; drop it if that fails."""
+        self.pool.keepalive(KEEPALIVE_EVERY)
+
+    def logout(self):
+        cap_pool(self.email_address, self.imap_server, None)
+        close_pool(self.email_address, self.imap_server)
+
+
+class SessionManager:
+    def __init__(self, connect, idle_expiry=SESSION_IDLE_EXPIRY, result_ttl=RESULT_TTL, sweep_every=SWEEP_EVERY):
+        self.idle_expiry = idle_expiry
+        self.result_ttl = result_ttl
+        self.sweep_every = sweep_every
+        self._connect = connect
+        self._sessions = {}
+        self._results = {}  # (email, server, folder, window) -> (stored_at, value)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # Sessions
+
+    def session(self, email_address, password, imap_server):
+        key = (email_address, imap_server)
+        with self._lock:
+            self._start()
+            user = self._sessions.get(key)
+            if user is not None and user.password != password:
+                # The new UserSession's get_pool replaces the old password's pool once it is free
+                user = None
+            if user is None:
+                user = self._sessions[key] = UserSession(email_address, password, imap_server, self._connect)
+            user.last_active = time.time()
+            return user
+
+    def adopt(self, email_address, password, imap_server, conn):
+        self.session(email_address, password, imap_server).attach(conn)
+
+    @contextmanager
+    def connection(self, email_address, password, imap_server):
+        """`with manager.connection(...) as mail:` holds the account's connection for the block."""
+        with self.session(email_address, password, imap_server).connection() as mail:
+            yield mail
+
+    def logout(self, email_address, imap_server):
+        """Log the account out everywhere: its page connection, scan pool and cached results."""
+        with self._lock:
+            # Under the lock, so a login racing this one cannot get a pool that is then closed
+            user = self._sessions.pop((email_address, imap_server), None)
+            if user is not None:
+                user.logout()
+            else:
+                close_pool(email_address, imap_server)
+        self.invalidate(email_address, imap_server)
+
+    # Cached results
+
+    def get_result(self, email_address, imap_server, folder, window):
+        """(value, age in seconds) for a result stored within the TTL, else (None, None)."""
+        key = (email_address, imap_server, folder, window)
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is None:
+                return None, None
+            age = time.time() - entry[0]
+            if age > self.result_ttl:
+                del self._results[key]
+                return None, None
+            return entry[1], age
+
+    def put_result(self, email_address, imap_server, folder, window, value):
+        with self._lock:
+            self._results[(email_address, imap_server, folder, window)] = (time.time(), value)
+
+    def invalidate(self, email_address, imap_server, folder=None):
+        """Forget the account's cached results (only those for `folder` if given), e.g. after a delete."""
+        with self._lock:
+            for key in [k for k in self._results if k[:2] == (email_address, imap_server)
+                        and (folder is None or k[2] == folder)]:
+                del self._results[key]
+
+    # Upkeep
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="imap-session-sweeper", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.sweep_every):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Session sweep failed: {e}")
+
+    def sweep(self, now=None):
+        """Keep active connections alive, log out idle ones, drop expired results and idle pool sessions."""
+        now = now if now is not None else time.time()
+        with self._lock:
+            expired = [k for k, user in self._sessions.items() if now - user.last_active > self.idle_expiry]
+            for key in expired:
+                self._sessions.pop(key).logout()
+            active = list(self._sessions.values())
+            for key in [k for k, (stored, _) in self._results.items() if now - stored > self.result_ttl]:
+                del self._results[key]
+        for user in active:
+            user.keepalive()
+        prune_pools()
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            users = list(self._sessions.values())
+            self._sessions.clear()
+            self._results.clear()
+        for user in users:
+            user.logout()
@@ -0,0 +1,164 @@
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# --- Local state store ---
+# Unsubscribed senders and schedule configs live in one SQLite database in WAL mode instead
+# of one JSON file per user. Readers (the pages, the scheduler daemon) never block the writer
+# and see only committed data, so concurrent sessions cannot lose each other's writes; a save
+# is one small transaction instead of a read-modify-rewrite of the whole file, and lookups
+# go through the primary-key indexes. Every schedule change gets a new version number, so
+# the daemon asks for "changed since version N" instead of re-reading every config.
+
+STORE_PATH = os.path.join("storage", "state.sqlite")
+BUSY_TIMEOUT = 10  # seconds to wait for another process's write transaction
+
+# Files written by earlier versions; imported once, then left alone
+LEGACY_UNSUB_DIR = os.path.join("storage", "unsubscribed")
+LEGACY_CONFIG_DIR = "config"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS unsubscribed (
+    account TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    added_at REAL NOT NULL,
+    PRIMARY KEY (account, sender)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS schedules (
+    account TEXT PRIMARY KEY,
+    config TEXT,
+    version INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS schedules_by_version ON schedules (version);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def connect(path):
+    """A WAL-mode connection shared by this process's threads (callers serialize with a lock)."""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    db = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")  # durable at checkpoints; a crash loses at most the last commits
+    return db
+
+
+class StateStore:
+    def __init__(self, path=STORE_PATH):
+        self._db = connect(path)
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._import_legacy()
+
+    # Unsubscribed senders
+
+    def unsubscribed(self, account):
+        with self._lock:
+            return {row[0] for row in self._db.execute("SELECT sender FROM unsubscribed WHERE account=?", (account,))}
+
+    def is_unsubscribed(self, account, sender):
+        with self._lock:
+            return self._db.execute(
+                "SELECT 1 FROM unsubscribed WHERE account=? AND sender=?", (account, sender)
+            ).fetchone() is not None
+
+    def add_unsubscribed(self, account, senders):
+        """Record several senders in one transaction."""
+        now = time.time()
+        rows = [(account, sender, now) for sender in senders if sender]
+        if not rows:
+            return
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR IGNORE INTO unsubscribed VALUES (?, ?, ?)", rows)
+
+    # Schedule configs
+
+    def get_schedule(self, account):
+        with self._lock:
+            row = self._db.execute("SELECT config FROM schedules WHERE account=?", (account,)).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def put_schedule(self, account, config):
+        """
+        Save the account's schedule; returns whether it changed. Saving the same config again
+        (the Schedule page does on every rerun) writes nothing and keeps the version.
+        """
+        text = json.dumps(config, sort_keys=True) if config is not None else None
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "INSERT INTO schedules (account, config, version) "
+                "VALUES (?, ?, (SELECT COALESCE(MAX(version), 0) + 1 FROM schedules)) "
+                "ON CONFLICT (account) DO UPDATE SET config=excluded.config, version=excluded.version "
+                "WHERE schedules.config IS NOT excluded.config",
+                (account, text)
+            )
+            return cursor.rowcount > 0
+
+    def delete_schedule(self, account):
+        """Kept as an empty row with a new version, so the daemon sees the removal."""
+        return self.put_schedule(account, None)
+
+    def schedules(self):
+        """{account: config} for every saved schedule."""
+        with self._lock:
+            rows = self._db.execute("SELECT account, config FROM schedules WHERE config IS NOT NULL").fetchall()
+        return {account: json.loads(config) for account, config in rows}
+
+    def schedules_since(self, version):
+        """(latest version, {account: config or None if removed}) for schedules changed after `version`."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT account, config, version FROM schedules WHERE version > ? ORDER BY version", (version,)
+            ).fetchall()
+        changed = {account: json.loads(config) if config else None for account, config, _ in rows}
+        return (rows[-1][2] if rows else version), changed
+
+    # Migration
+
+    def _import_legacy(self):
+        """Copy the JSON files earlier versions wrote, once per database."""
+        with self._lock, self._db:
+            if self._db.execute("SELECT 1 FROM meta WHERE key='legacy_imported'").fetchone():
+                return
+            now = time.time()
+            for path in glob.glob(os.path.join(LEGACY_UNSUB_DIR, "*.json")):
+                account = os.path.basename(path)[:-len(".json")].replace("_at_", "@").replace("_dot_", ".")
+                senders = read_json(path) or []
+                self._db.executemany("INSERT OR IGNORE INTO unsubscribed VALUES (?, ?, ?)",
+                                     [(account, sender, now) for sender in senders])
+            for path in sorted(glob.glob(os.path.join(LEGACY_CONFIG_DIR, "schedule_*.json"))):
+                config = read_json(path)
+                if isinstance(config, dict) and config.get("email"):
+                    self._db.execute(
+                        "INSERT OR IGNORE INTO schedules VALUES (?, ?, (SELECT COALESCE(MAX(version), 0) + 1 FROM schedules))",
+                        (config["email"], json.dumps(config, sort_keys=True))
+                    )
+            self._db.execute("INSERT INTO meta VALUES ('legacy_imported', ?)", (str(now),))
+
+
+def read_json(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Could not read {path}: {e}")
+        return None
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_state_store(path=STORE_PATH):
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = StateStore(path)
+        return _store